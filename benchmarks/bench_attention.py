@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+
+"""
+Бенчмарк режимов внимания и кодирования страницы
+(create_usability_model(attention=..., page_encoder=...)).
+
+1. Качество: MAE на отложенных синтетических страницах. Целевая оценка -
+   детерминированная функция признаков страницы (доля элементов с контрастом
+   ниже 4.5 и средняя глубина), поэтому сравнение показывает, насколько
+   приближенное внимание сохраняет способность модели ее выучить.
+2. Задержка прямого прохода и пиковый RSS в зависимости от N;
+   каждый замер - в отдельном процессе.
+
+Запуск: USE_ENCODER_SOURCE=hashing python benchmarks/bench_attention.py
+"""
+
+import json
+import os
+import subprocess
+import sys
+
+import numpy as np
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRC_DIR = os.path.join(PROJECT_ROOT, 'src')
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [SRC_DIR, PROJECT_ROOT]
+
+# Режим -> аргументы create_usability_model
+MODES = {
+    "dense": {"attention": "dense"},
+    "windowed": {"attention": "windowed"},
+    "linear": {"attention": "linear"},
+    "hierarchical": {"attention": "dense", "page_encoder": "hierarchical"},
+}
+
+_CHILD_SCRIPT = """
+import json, resource, sys, time
+sys.path[:0] = [{src_dir!r}, {bench_dir!r}, {project_root!r}]
+import numpy as np
+from synthetic_dom import generate_page
+from feature_extractor.dom_flattener import flatten_dom
+from models import create_usability_model, DEPTH_FEATURE_INDEX, TEXT_VECTOR_SIZE
+from scoring_service import make_predict_fn
+
+model_kwargs, num_elements = json.loads(sys.argv[1]), int(sys.argv[2])
+rng = np.random.default_rng(0)
+x_batch = {{
+    "text_input": rng.standard_normal((1, num_elements, TEXT_VECTOR_SIZE), dtype=np.float32),
+    "numeric_input": rng.random((1, num_elements, 12), dtype=np.float32) + 0.1,
+    "color_input": rng.random((1, num_elements, 6), dtype=np.float32),
+    **{{f"{{name}}_input": rng.integers(0, 5, (1, num_elements, 1)).astype(np.int32)
+       for name in ("tag", "position", "display", "textAlign")}},
+}}
+# Глубины реальной формы дерева: от них зависит число секций иерархического режима
+depth = flatten_dom(generate_page(num_elements, max_depth=32, nest_rate=0.99))["depth"]
+x_batch["numeric_input"][0, :, DEPTH_FEATURE_INDEX] = depth
+predict_fn = make_predict_fn(create_usability_model(**model_kwargs))
+predict_fn({{name: array[:, :8] for name, array in x_batch.items()}})
+before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+timings = []
+for _ in range(3):
+    start = time.perf_counter()
+    predict_fn(x_batch)
+    timings.append(time.perf_counter() - start)
+after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({{"latency_ms": 1000 * float(np.median(timings)), "peak_rss_mb": after / 1024,
+                  "peak_rss_delta_mb": (after - before) / 1024}}))
+"""
+
+
+def measure_cost(mode, num_elements):
+    script = _CHILD_SCRIPT.format(src_dir=SRC_DIR, bench_dir=BENCH_DIR, project_root=PROJECT_ROOT)
+    result = subprocess.run([sys.executable, '-c', script, json.dumps(MODES[mode]), str(num_elements)],
+                            capture_output=True, text=True)
+    if result.returncode != 0:
+        return {"latency_ms": None, "peak_rss_mb": None, "peak_rss_delta_mb": None,
+                "error": f"код возврата {result.returncode}"}
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def _synthetic_corpus(num_pages, seed):
+    sys.path.insert(0, BENCH_DIR)
+    from synthetic_dom import generate_page
+    from data_loader import _extract_page_features
+    from feature_extractor.dom_flattener import flatten_dom
+    from feature_extractor.text_feature_extractor import extract_text_features_batch
+    from models import DEPTH_FEATURE_INDEX
+
+    rng = np.random.default_rng(seed)
+    flat_pages = [flatten_dom(generate_page(int(n), seed=seed + i))
+                  for i, n in enumerate(rng.integers(30, 200, num_pages))]
+    text_matrices = extract_text_features_batch(flat_pages)
+
+    pages, targets = [], []
+    for flat_page, text_vectors in zip(flat_pages, text_matrices):
+        page = {"text_input": text_vectors, **_extract_page_features(flat_page)}
+        numeric = page["numeric_input"]
+        targets.append(50.0 * np.mean(numeric[:, -1] < 4.5) + 5.0 * np.mean(numeric[:, DEPTH_FEATURE_INDEX]))
+        pages.append(page)
+    return pages, np.array(targets, dtype=np.float32)
+
+
+def measure_quality(modes=MODES, num_pages=240, held_out=40, epochs=20, batch_size=8, seed=0):
+    from batching import pad_batch, make_bucketed_batches
+    from models import create_usability_model, NUMERIC_VECTOR_SIZE
+    from normalization import fit_normalizer
+
+    pages, targets = _synthetic_corpus(num_pages, seed)
+    train_pages, train_targets = pages[held_out:], targets[held_out:]
+    test_pages, test_targets = pages[:held_out], targets[:held_out]
+    lengths = np.array([len(page["text_input"]) for page in train_pages])
+    normalizer = fit_normalizer((page["numeric_input"] for page in train_pages), NUMERIC_VECTOR_SIZE)
+
+    results = {}
+    for mode in modes:
+        model = create_usability_model(numeric_normalizer=normalizer, **MODES[mode])
+        model.optimizer.learning_rate = 1e-3
+        rng = np.random.default_rng(seed)
+        for _ in range(epochs):
+            for batch in make_bucketed_batches(lengths, batch_size, rng=rng):
+                model.train_on_batch(pad_batch([train_pages[i] for i in batch]), train_targets[batch])
+
+        predictions = np.concatenate([
+            np.asarray(model.predict_on_batch(pad_batch(test_pages[i:i + batch_size]))).reshape(-1)
+            for i in range(0, held_out, batch_size)
+        ])
+        results[mode] = float(np.mean(np.abs(predictions - test_targets)))
+    results["baseline_mean"] = float(np.mean(np.abs(train_targets.mean() - test_targets)))
+    return results
+
+
+if __name__ == '__main__':
+    quality = measure_quality()
+    print(f"MAE на отложенных страницах (предсказание средним: {quality.pop('baseline_mean'):.2f}):")
+    for mode, mae in quality.items():
+        print(f"  {mode:>12}: {mae:.2f}")
+
+    print("Задержка и память прямого прохода:")
+    for num_elements in (500, 1000, 2000, 4000, 8000):
+        for mode in MODES:
+            row = measure_cost(mode, num_elements)
+            if row["latency_ms"] is None:
+                print(f"  N={num_elements:>5} {mode:>12}: ошибка ({row['error']})")
+                continue
+            print(f"  N={num_elements:>5} {mode:>12}: {row['latency_ms']:8.1f} мс, "
+                  f"пиковый RSS {row['peak_rss_mb']:7.1f} МБ (прирост на проходе {row['peak_rss_delta_mb']:.1f} МБ)")
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+
+"""
+Бенчмарк категориальных признаков: стоимость на элемент для прежней
+индексации (нормализация и поиск в словаре на каждый элемент) и для словаря
+с кэшем поиска (categorical_vocabulary.py), а также доля элементов,
+попадающих в UNK: со словарями из config.py и со словарем, обученным
+на корпусе с хеш-корзинами для длинного хвоста.
+
+Запуск: python benchmarks/bench_categorical.py
+"""
+
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(PROJECT_ROOT, 'src'))
+
+from synthetic_dom import generate_page
+from config import FEATURE_MAPPING, CATEGORICAL_VOCABULARIES
+from feature_extractor.dom_flattener import flatten_dom
+from feature_extractor.categorical_vocabulary import VocabularyCounter, PAD_INDEX
+
+LEGACY_VOCAB_MAPS = {
+    key: {value: i + 1 for i, value in enumerate(CATEGORICAL_VOCABULARIES[key])}
+    for key in FEATURE_MAPPING["categorical"]
+}
+
+
+def legacy_categorical_features(flat_page):
+    """Прежняя реализация: нормализация и поиск на каждый элемент."""
+    features = {}
+    for key, vocab_map in LEGACY_VOCAB_MAPS.items():
+        indices = np.empty((flat_page["num_elements"], 1), dtype=np.int32)
+        indices[:, 0] = [
+            vocab_map.get("" if value is None else str(value).lower().strip(), 0)
+            for value in flat_page["columns"][key]
+        ]
+        features[key] = indices
+    return features
+
+
+def vocabulary_categorical_features(flat_page, vocabulary):
+    return {key: vocabulary.lookup(key, flat_page["columns"][key]) for key in FEATURE_MAPPING["categorical"]}
+
+
+def _with_custom_tags(flat_page, rate, num_custom_tags, seed):
+    """Часть тегов заменяется пользовательскими элементами (x-widget-k) - длинный хвост."""
+    rng = random.Random(seed)
+    tags = flat_page["columns"]["tag"].copy()
+    for i in range(len(tags)):
+        if rng.random() < rate:
+            tags[i] = f"x-widget-{int(rng.paretovariate(1.2)) % num_custom_tags}"
+    return {**flat_page, "columns": {**flat_page["columns"], "tag": tags}}
+
+
+def _best_time(func, repeats):
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def _unk_share(features, flat_page):
+    """Доля непустых значений тега, получивших индекс UNK."""
+    tags = flat_page["columns"]["tag"]
+    non_empty = np.array([bool(value) for value in tags])
+    return float(np.mean(features["tag"][non_empty, 0] == PAD_INDEX))
+
+
+def run(sizes=(100, 1000, 10000), repeats=5, custom_tag_rate=0.1, num_custom_tags=200):
+    corpus = [
+        _with_custom_tags(flatten_dom(generate_page(1000, seed=seed)), custom_tag_rate, num_custom_tags, seed)
+        for seed in range(20)
+    ]
+    counter = VocabularyCounter(FEATURE_MAPPING["categorical"])
+    for flat_page in corpus:
+        counter.update(flat_page)
+    vocabulary = counter.to_vocabulary()
+
+    results = []
+    for num_elements in sizes:
+        flat_page = _with_custom_tags(flatten_dom(generate_page(num_elements, seed=1000 + num_elements)),
+                                      custom_tag_rate, num_custom_tags, seed=num_elements)
+        legacy = _best_time(lambda: legacy_categorical_features(flat_page), repeats)
+        current = _best_time(lambda: vocabulary_categorical_features(flat_page, vocabulary), repeats)
+        results.append({
+            "num_elements": num_elements,
+            "legacy_us_per_element": legacy / num_elements * 1e6,
+            "vocabulary_us_per_element": current / num_elements * 1e6,
+            "speedup": legacy / current,
+            "legacy_unk_share": _unk_share(legacy_categorical_features(flat_page), flat_page),
+            "vocabulary_unk_share": _unk_share(vocabulary_categorical_features(flat_page, vocabulary), flat_page),
+            "tag_vocabulary_size": vocabulary.size("tag"),
+        })
+    return results
+
+
+if __name__ == '__main__':
+    for row in run():
+        print(f"N={row['num_elements']:>6}: до {row['legacy_us_per_element']:.2f} мкс/эл, "
+              f"после {row['vocabulary_us_per_element']:.2f} мкс/эл, ускорение x{row['speedup']:.1f}; "
+              f"тегов в UNK: {row['legacy_unk_share']:.1%} -> {row['vocabulary_unk_share']:.1%} "
+              f"(индексов тега: {row['tag_vocabulary_size']})")
@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+
+"""
+Бенчмарк цветовых признаков: стоимость на элемент для прежней
+поэлементной реализации (regex + numpy на 3 числа) и векторизованной.
+Перед замером разбор цветов сверяется с набором контрольных значений.
+
+Запуск: python benchmarks/bench_color.py
+"""
+
+import os
+import re
+import sys
+import time
+
+import numpy as np
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(PROJECT_ROOT, 'src'))
+
+from synthetic_dom import generate_page
+from feature_extractor.dom_flattener import flatten_dom
+from feature_extractor.color_feature_extractor import (
+    _parse_color_column, _composite_colors, _get_contrast_ratio, DEFAULT_RGBA
+)
+
+# Контрольные значения разбора: строка цвета -> (r, g, b, a)
+SANITY_COLORS = {
+    "rgb(255, 0, 0)": (255.0, 0.0, 0.0, 1.0),
+    "rgba(10, 20.5, 30, .5)": (10.0, 20.5, 30.0, 0.5),
+    "rgb(10% 50% 100% / 50%)": (25.5, 127.5, 255.0, 0.5),
+    "#fff": (255.0, 255.0, 255.0, 1.0),
+    "#00000080": (0.0, 0.0, 0.0, 128 / 255.0),
+    "transparent": (0.0, 0.0, 0.0, 0.0),
+    "Navy": (0.0, 0.0, 128.0, 1.0),
+    # Некорректные числа и нераспознанные строки - цвет по умолчанию, а не ошибка страницы
+    "rgb(1..2,3,4)": DEFAULT_RGBA,
+    "rgba(1,2,3,.)": DEFAULT_RGBA,
+    "rgb(.,.,.)": DEFAULT_RGBA,
+    "not-a-color": DEFAULT_RGBA,
+}
+
+
+def _legacy_parse_rgb(color_str):
+    if not isinstance(color_str, str):
+        return [0, 0, 0]
+    match = re.search(r'rgb\((\d+),\s*(\d+),\s*(\d+)\)', color_str.lower())
+    if match:
+        return [int(c) for c in match.groups()]
+    match_rgba = re.search(r'rgba\((\d+),\s*(\d+),\s*(\d+),.*?\)', color_str.lower())
+    if match_rgba:
+        return [int(c) for c in match_rgba.groups()]
+    return [0, 0, 0]
+
+
+def _legacy_luminance(r, g, b):
+    rgb = np.array([r, g, b]) / 255.0
+    rgb = np.where(rgb <= 0.03928, rgb / 12.92, ((rgb + 0.055) / 1.055) ** 2.4)
+    return 0.2126 * rgb[0] + 0.7152 * rgb[1] + 0.0722 * rgb[2]
+
+
+def legacy_color_features(flat_page):
+    """Прежняя поэлементная реализация (до векторизации)."""
+    colors, contrasts = [], []
+    for color_str, bg_str in zip(flat_page["columns"]["color"], flat_page["columns"]["backgroundColor"]):
+        rgb, bg = _legacy_parse_rgb(color_str), _legacy_parse_rgb(bg_str)
+        colors.append((np.array(rgb + bg) / 255.0).tolist())
+        lum1, lum2 = _legacy_luminance(*rgb), _legacy_luminance(*bg)
+        contrasts.append([(max(lum1, lum2) + 0.05) / (min(lum1, lum2) + 0.05)])
+    return np.array(colors, dtype=np.float32), np.array(contrasts, dtype=np.float32)
+
+
+def vectorized_color_features(flat_page):
+    """Текущая реализация без печати (повторяет extract_color_features)."""
+    fg_rgba = _parse_color_column(flat_page["columns"]["color"])
+    bg_rgba = _parse_color_column(flat_page["columns"]["backgroundColor"])
+    color_matrix = np.concatenate([fg_rgba[:, :3], bg_rgba[:, :3]], axis=1) / 255.0
+    fg_rgb, bg_rgb = _composite_colors(fg_rgba, bg_rgba)
+    return color_matrix, _get_contrast_ratio(fg_rgb, bg_rgb).reshape(-1, 1)
+
+
+def check_parser():
+    """Сверяет разбор цветов с SANITY_COLORS (AssertionError при расхождении)."""
+    parsed = _parse_color_column(np.array(list(SANITY_COLORS), dtype=object))
+    for (color, expected), actual in zip(SANITY_COLORS.items(), parsed):
+        assert np.allclose(actual, expected, atol=1e-5), f"{color!r}: {actual.tolist()} вместо {expected}"
+
+
+def _best_time(func, arg, repeats):
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func(arg)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def run(sizes=(100, 1000, 10000), repeats=5):
+    check_parser()
+    results = []
+    for num_elements in sizes:
+        flat_page = flatten_dom(generate_page(num_elements, seed=num_elements))
+        legacy = _best_time(legacy_color_features, flat_page, repeats)
+        vectorized = _best_time(vectorized_color_features, flat_page, repeats)
+        results.append({
+            "num_elements": num_elements,
+            "legacy_us_per_element": legacy / num_elements * 1e6,
+            "vectorized_us_per_element": vectorized / num_elements * 1e6,
+            "speedup": legacy / vectorized,
+        })
+    return results
+
+
+if __name__ == '__main__':
+    for row in run():
+        print(f"N={row['num_elements']:>6}: до {row['legacy_us_per_element']:.2f} мкс/эл, "
+              f"после {row['vectorized_us_per_element']:.2f} мкс/эл, ускорение x{row['speedup']:.1f}")
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+
+"""
+Бенчмарк времени импорта (python -X importtime).
+
+Каждая цель импортируется в чистом процессе; по отчету -X importtime
+считается суммарное время и разбивка по пакетам верхнего уровня (собственное
+время модулей пакета). Для легких целей - экстракторов признаков, загрузчика,
+сервиса оценки и `run.py --help` - проверяется, что тяжелые зависимости
+(TensorFlow, Keras, sklearn, tensorflow_hub) не импортируются и время
+укладывается в бюджет; при нарушении скрипт завершается с кодом 1.
+
+Запуск: python benchmarks/bench_import_time.py [--json]
+"""
+
+import json
+import os
+import subprocess
+import sys
+from collections import defaultdict
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRC_DIR = os.path.join(PROJECT_ROOT, 'src')
+
+# Цель -> (модуль или скрипт с аргументами, легкая ли цель)
+TARGETS = {
+    "dom_stream": ("feature_extractor.dom_stream", True),
+    "numeric_feature_extractor": ("feature_extractor.numeric_feature_extractor", True),
+    "color_feature_extractor": ("feature_extractor.color_feature_extractor", True),
+    "categorical_feature_extractor": ("feature_extractor.categorical_feature_extractor", True),
+    "text_feature_extractor": ("feature_extractor.text_feature_extractor", True),
+    "data_loader": ("data_loader", True),
+    "scoring_service": ("scoring_service", True),
+    "run.py --help": ([os.path.join(PROJECT_ROOT, 'run.py'), '--help'], True),
+    # Для сравнения: модель тянет TensorFlow по определению
+    "models": ("models", False),
+}
+HEAVY_PACKAGES = ("tensorflow", "keras", "sklearn", "tensorflow_hub")
+# Бюджет времени импорта легкой цели, мс
+LIGHT_BUDGET_MS = 1000
+TOP_PACKAGES = 5
+
+_PROBE = """
+import sys
+sys.path[:0] = [{src_dir!r}]
+import {module}
+"""
+
+
+def _parse_importtime(stderr):
+    """Строки 'import time: self | cumulative | name' -> список (self_us, cumulative_us, name, уровень)."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        # После разделителя идет пробел, затем по два пробела на уровень вложенности
+        level = (len(name) - len(name.lstrip()) - 1) // 2
+        rows.append((int(self_us), int(cumulative_us), name.strip(), level))
+    return rows
+
+
+def measure(target):
+    spec, light = TARGETS[target]
+    if isinstance(spec, list):
+        command = [sys.executable, '-X', 'importtime'] + spec
+    else:
+        command = [sys.executable, '-X', 'importtime', '-c', _PROBE.format(src_dir=SRC_DIR, module=spec)]
+    result = subprocess.run(command, capture_output=True, text=True, cwd=PROJECT_ROOT)
+    if result.returncode != 0:
+        return {"light": light, "error": result.stderr.strip().splitlines()[-1:]}
+
+    rows = _parse_importtime(result.stderr)
+    by_package = defaultdict(int)
+    for self_us, _, name, _ in rows:
+        by_package[name.split(".")[0]] += self_us
+    imported = {name.split(".")[0] for _, _, name, _ in rows}
+
+    total_ms = sum(cumulative_us for _, cumulative_us, _, level in rows if level == 0) / 1000
+    heavy = sorted(package for package in HEAVY_PACKAGES if package in imported)
+    return {
+        "light": light,
+        "total_ms": total_ms,
+        "top_packages_ms": {
+            package: self_us / 1000
+            for package, self_us in sorted(by_package.items(), key=lambda item: -item[1])[:TOP_PACKAGES]
+        },
+        "heavy_imports": heavy,
+        "ok": not light or (not heavy and total_ms <= LIGHT_BUDGET_MS),
+    }
+
+
+def run(targets=TARGETS):
+    return {target: measure(target) for target in targets}
+
+
+if __name__ == '__main__':
+    results = run()
+    if '--json' in sys.argv[1:]:
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+    else:
+        for target, row in results.items():
+            if "error" in row:
+                print(f"{target:>30}: ошибка ({row['error']})")
+                continue
+            status = "" if row["ok"] else "  <-- РЕГРЕССИЯ"
+            heavy = f", тяжелые: {', '.join(row['heavy_imports'])}" if row["heavy_imports"] else ""
+            print(f"{target:>30}: {row['total_ms']:8.1f} мс{heavy}{status}")
+            print(" " * 32 + ", ".join(f"{package} {ms:.1f}" for package, ms in row["top_packages_ms"].items()))
+
+    failed = [target for target, row in results.items() if "error" in row or not row["ok"]]
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+
+"""
+Бенчмарк инкрементальной повторной оценки (incremental_features.py).
+
+Страница из N элементов оценивается один раз, затем в ней меняются тексты
+и цвета k элементов и в начало документа вставляется новый элемент
+(все последующие сдвигаются). Сравнивается время извлечения признаков нового
+снимка с нуля (extract_documents) и через PageFeatureCache, а также совпадение
+массивов признаков. Прямой проход модели в замер не входит: он одинаков
+в обоих режимах.
+
+Запуск: USE_ENCODER_SOURCE=hashing python benchmarks/bench_incremental.py
+"""
+
+import copy
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(PROJECT_ROOT, 'src'))
+
+from synthetic_dom import generate_page
+
+
+def _iter_elements(document):
+    stack = list(reversed(document["elements"]))
+    while stack:
+        element = stack.pop()
+        yield element
+        stack.extend(reversed(element.get("children") or []))
+
+
+def mutate(document, num_changed, seed=0):
+    """Копия документа с измененными k элементами и одним вставленным в начало."""
+    rng = random.Random(seed)
+    document = copy.deepcopy(document)
+    elements = list(_iter_elements(document))
+    for i, element in enumerate(rng.sample(elements, min(num_changed, len(elements)))):
+        element["text"] = f"Измененный текст {i}"
+        element["color"] = f"rgb({rng.randrange(256)}, {rng.randrange(256)}, {rng.randrange(256)})"
+    document["elements"].insert(0, copy.deepcopy(elements[0]) | {"text": "Новый баннер", "children": [],
+                                                                 "num_children": 0, "depth": 0})
+    return document
+
+
+def _median_ms(fn, repeats):
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return 1000 * float(np.median(timings))
+
+
+def run(sizes=(1000, 10000), changed=(1, 10, 100), repeats=5):
+    from incremental_features import PageFeatureCache
+    from scoring_service import extract_documents
+
+    results = []
+    for num_elements in sizes:
+        document = generate_page(num_elements, seed=num_elements)
+        for num_changed in changed:
+            updated = mutate(document, num_changed, seed=num_changed)
+            full_ms = _median_ms(lambda: extract_documents([updated]), repeats)
+
+            def incremental():
+                # Каждый повтор - заново: прошлый снимок в кэше, затем новый
+                cache = PageFeatureCache()
+                cache.extract([document], ["page"])
+                before = cache.stats()
+                start = time.perf_counter()
+                pages = cache.extract([updated], ["page"])
+                elapsed = time.perf_counter() - start
+                after = cache.stats()
+                reused = after["reused_elements"] - before["reused_elements"]
+                return elapsed, pages[0], reused / (after["elements"] - before["elements"])
+
+            timings = [incremental() for _ in range(repeats)]
+            _, page, reused_share = timings[-1]
+            reference = extract_documents([updated])[0]
+            results.append({
+                "num_elements": num_elements,
+                "changed": num_changed,
+                "full_ms": full_ms,
+                "incremental_ms": 1000 * float(np.median([elapsed for elapsed, _, _ in timings])),
+                "reused_share": reused_share,
+                "identical": all(np.allclose(page[name], reference[name], rtol=1e-6) for name in reference),
+            })
+    return results
+
+
+if __name__ == '__main__':
+    for row in run():
+        print(f"N={row['num_elements']:>6}, изменено {row['changed']:>4} (+1 вставка): "
+              f"с нуля {row['full_ms']:7.1f} мс, инкрементально {row['incremental_ms']:6.1f} мс "
+              f"(x{row['full_ms'] / row['incremental_ms']:.1f}), "
+              f"из кэша {row['reused_share']:.1%} строк, признаки совпадают: {row['identical']}")
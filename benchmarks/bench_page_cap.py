@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+
+"""
+Бенчмарк политики длины страницы: задержка прямого прохода модели
+и прирост пикового RSS в зависимости от числа элементов N,
+без лимита и с лимитом MAX_PAGE_ELEMENTS (element_selection).
+
+Каждый замер выполняется в отдельном процессе; модель необученная.
+Запуск: USE_ENCODER_SOURCE=hashing python benchmarks/bench_page_cap.py
+"""
+
+import json
+import os
+import subprocess
+import sys
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRC_DIR = os.path.join(PROJECT_ROOT, 'src')
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+
+_CHILD_SCRIPT = """
+import json, resource, sys, time
+sys.path[:0] = [{src_dir!r}, {bench_dir!r}, {project_root!r}]
+import numpy as np
+from synthetic_dom import generate_page
+from models import create_usability_model
+from feature_extractor.dom_flattener import flatten_dom
+from feature_extractor.element_selection import apply_length_policy
+from scoring_service import make_predict_fn
+from data_loader import _extract_page_features
+from feature_extractor.text_feature_extractor import extract_text_features
+
+num_elements, max_elements = int(sys.argv[1]), int(sys.argv[2])
+flat_page = apply_length_policy(flatten_dom(generate_page(num_elements, seed=1)), max_elements or None)
+features = {{"text_input": extract_text_features(None, flat_page=flat_page), **_extract_page_features(flat_page)}}
+x_batch = {{name: array[np.newaxis] for name, array in features.items()}}
+
+predict_fn = make_predict_fn(create_usability_model())
+predict_fn({{name: array[:, :8] for name, array in x_batch.items()}})
+before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+timings = []
+for _ in range(3):
+    start = time.perf_counter()
+    predict_fn(x_batch)
+    timings.append(time.perf_counter() - start)
+after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({{"model_elements": flat_page["num_elements"], "latency_ms": 1000 * float(np.median(timings)),
+                  "peak_rss_delta_mb": (after - before) / 1024}}))
+"""
+
+
+def _measure(num_elements, max_elements):
+    script = _CHILD_SCRIPT.format(src_dir=SRC_DIR, bench_dir=BENCH_DIR, project_root=PROJECT_ROOT)
+    result = subprocess.run([sys.executable, '-c', script, str(num_elements), str(max_elements or 0)],
+                            capture_output=True, text=True)
+    if result.returncode != 0:
+        # Например, нехватка памяти на внимании N x N
+        return {"model_elements": None, "latency_ms": None, "peak_rss_delta_mb": None,
+                "error": f"код возврата {result.returncode}"}
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def run(sizes=(500, 1000, 2000, 4000, 8000), max_elements=1000):
+    results = []
+    for num_elements in sizes:
+        for cap in (None, max_elements):
+            row = _measure(num_elements, cap)
+            row.update({"num_elements": num_elements, "max_elements": cap})
+            results.append(row)
+    return results
+
+
+if __name__ == '__main__':
+    for row in run():
+        cap = row["max_elements"] or "нет"
+        if row["latency_ms"] is None:
+            print(f"N={row['num_elements']:>6}, лимит {cap:>5}: ошибка ({row['error']})")
+            continue
+        print(f"N={row['num_elements']:>6}, лимит {cap:>5}: в модели {row['model_elements']:>5} элементов, "
+              f"{row['latency_ms']:8.1f} мс, прирост RSS {row['peak_rss_delta_mb']:7.1f} МБ")
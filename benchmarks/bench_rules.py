@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+
+"""
+Бенчмарк правил WCAG (wcag_rules.py): стоимость проверки страницы по сравнению
+с извлечением признаков для модели (extract_documents, включая текстовый
+энкодер) и пропускная способность prepare_documents с отсечением по правилам
+и без него. Прямой проход модели в замер не входит: отсеченные страницы
+экономят еще и его.
+
+Запуск: USE_ENCODER_SOURCE=hashing python benchmarks/bench_rules.py
+"""
+
+import os
+import sys
+import time
+
+import numpy as np
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(PROJECT_ROOT, 'src'))
+
+from synthetic_dom import generate_page
+
+
+def _median_ms(fn, repeats):
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return 1000 * float(np.median(timings))
+
+
+def run(sizes=(100, 1000, 10000), num_pages=50, page_elements=500, repeats=5):
+    from feature_extractor.dom_flattener import flatten_dom
+    from scoring_service import extract_documents, prepare_documents
+    from wcag_rules import evaluate_rules, RuleGate
+
+    per_page = []
+    for num_elements in sizes:
+        document = generate_page(num_elements, seed=num_elements)
+        flat_page = flatten_dom(document)
+        result = evaluate_rules(flat_page)
+        per_page.append({
+            "num_elements": num_elements,
+            "rules_ms": _median_ms(lambda: evaluate_rules(flat_page), repeats),
+            "extract_ms": _median_ms(lambda: extract_documents([document]), repeats),
+            "rule_score": result["rule_score"],
+        })
+
+    documents = [generate_page(page_elements, seed=seed) for seed in range(num_pages)]
+    gate = RuleGate()
+    _, rule_scores = prepare_documents(documents, rule_gate=gate)
+    throughput = {
+        "num_pages": num_pages,
+        "page_elements": page_elements,
+        "gated_share": sum(score is not None for score in rule_scores) / num_pages,
+        "plain_pages_per_sec": num_pages / _median_ms(lambda: prepare_documents(documents), repeats) * 1000,
+        "gated_pages_per_sec": num_pages / _median_ms(lambda: prepare_documents(documents, rule_gate=gate),
+                                                      repeats) * 1000,
+    }
+    return per_page, throughput
+
+
+if __name__ == '__main__':
+    per_page, throughput = run()
+    for row in per_page:
+        print(f"N={row['num_elements']:>6}: правила {row['rules_ms']:7.2f} мс, "
+              f"признаки {row['extract_ms']:8.2f} мс (x{row['extract_ms'] / row['rules_ms']:.0f}), "
+              f"оценка правил {row['rule_score']:.1f}")
+    print(f"{throughput['num_pages']} страниц по {throughput['page_elements']} элементов: "
+          f"без отсечения {throughput['plain_pages_per_sec']:.0f} стр/с, "
+          f"с отсечением {throughput['gated_pages_per_sec']:.0f} стр/с "
+          f"(решено правилами {throughput['gated_share']:.0%})")
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+
+"""
+Бенчмарк сервиса оценки: пропускная способность (страниц/с) и задержки
+p50/p99 при одновременных клиентах, с микро-батчингом и без него.
+
+Модель создается необученной: важна стоимость прохода, а не качество.
+Запуск: USE_ENCODER_SOURCE=hashing python benchmarks/bench_scoring.py
+"""
+
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from synthetic_dom import generate_page
+from models import create_usability_model
+from scoring_service import MicroBatcher
+
+
+def run_clients(batcher, pages, num_clients, pages_per_request):
+    latencies = []
+    lock = threading.Lock()
+    requests = [pages[i:i + pages_per_request] for i in range(0, len(pages), pages_per_request)]
+    request_iter = iter(requests)
+
+    def client():
+        while True:
+            with lock:
+                request = next(request_iter, None)
+            if request is None:
+                return
+            start = time.perf_counter()
+            batcher.score(request)
+            with lock:
+                latencies.append(time.perf_counter() - start)
+
+    threads = [threading.Thread(target=client) for _ in range(num_clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    latencies_ms = np.array(latencies) * 1000
+    return {
+        "pages_per_sec": len(pages) / elapsed,
+        "p50_ms": float(np.percentile(latencies_ms, 50)),
+        "p99_ms": float(np.percentile(latencies_ms, 99)),
+    }
+
+
+def run(num_pages=256, num_clients=16, pages_per_request=1, seed=0):
+    rng = np.random.default_rng(seed)
+    pages = [generate_page(int(n), seed=seed + i) for i, n in enumerate(rng.integers(20, 400, num_pages))]
+    model = create_usability_model()
+
+    settings = {
+        "без батчинга": {"max_batch_pages": 1, "max_latency": 0.0},
+        "батч 64 / 5 мс": {"max_batch_pages": 64, "max_latency": 0.005},
+        "батч 64 / 20 мс": {"max_batch_pages": 64, "max_latency": 0.02},
+    }
+    results = {}
+    for name, kwargs in settings.items():
+        batcher = MicroBatcher(model, **kwargs)
+        # Прогрев: трассировка модели для типичных длин
+        run_clients(batcher, pages[:32], num_clients, pages_per_request)
+        results[name] = run_clients(batcher, pages, num_clients, pages_per_request)
+        batcher.close()
+    return results
+
+
+if __name__ == '__main__':
+    for name, row in run().items():
+        print(f"{name:>16}: {row['pages_per_sec']:.1f} стр/с, p50 {row['p50_ms']:.1f} мс, p99 {row['p99_ms']:.1f} мс")
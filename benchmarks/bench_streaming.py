@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+
+"""
+Бенчмарк пиковой памяти при чтении больших DOM-снимков.
+
+Каждый режим запускается в отдельном процессе, который сообщает свой
+пиковый RSS (ru_maxrss) до и после разбора:
+  json    - json.load + flatten_dom (прежний путь);
+  orjson  - orjson.loads + flatten_dom (если orjson установлен);
+  stream  - потоковый разбор load_flat_page(streaming=True).
+
+Запуск: python benchmarks/bench_streaming.py [число_элементов]
+"""
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRC_DIR = os.path.join(PROJECT_ROOT, 'src')
+sys.path.insert(0, SRC_DIR)
+
+from synthetic_dom import generate_page
+
+_CHILD_SCRIPT = """
+import json, resource, sys, time
+sys.path.insert(0, {src_dir!r})
+from feature_extractor.dom_flattener import flatten_dom
+from feature_extractor import dom_stream
+
+mode, path = sys.argv[1], sys.argv[2]
+before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+start = time.perf_counter()
+if mode == 'json':
+    with open(path, 'r', encoding='utf-8') as f:
+        flat_page = flatten_dom(json.load(f))
+elif mode == 'orjson':
+    with open(path, 'rb') as f:
+        flat_page = flatten_dom(dom_stream.orjson.loads(f.read()))
+else:
+    flat_page = dom_stream.load_flat_page(path, streaming=True)
+elapsed = time.perf_counter() - start
+after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({{"mode": mode, "num_elements": flat_page["num_elements"],
+                  "seconds": elapsed, "baseline_rss_kb": before, "peak_rss_kb": after}}))
+"""
+
+
+def _measure(mode, path):
+    script = _CHILD_SCRIPT.format(src_dir=SRC_DIR)
+    output = subprocess.run([sys.executable, '-c', script, mode, path],
+                            check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def run(num_elements=200000, modes=('json', 'orjson', 'stream')):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, 'page.json')
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(generate_page(num_elements, max_depth=32), f, ensure_ascii=False)
+        file_mb = os.path.getsize(path) / 2 ** 20
+
+        results = []
+        for mode in modes:
+            if mode == 'orjson':
+                try:
+                    import orjson
+                except ImportError:
+                    continue
+            row = _measure(mode, path)
+            row["file_mb"] = file_mb
+            row["parse_peak_mb"] = (row["peak_rss_kb"] - row["baseline_rss_kb"]) / 1024
+            results.append(row)
+    return results
+
+
+if __name__ == '__main__':
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    for row in run(size):
+        print(f"{row['mode']:>7}: файл {row['file_mb']:.0f} МБ, прирост пикового RSS "
+              f"{row['parse_peak_mb']:.0f} МБ, {row['seconds']:.2f} с, элементов {row['num_elements']}")
@@ -0,0 +1,400 @@
+# -*- coding: utf-8 -*-
+
+"""
+Сводный бенчмарк конвейера на синтетических страницах (synthetic_dom).
+
+Каждый случай выполняется в отдельном процессе, чтобы пиковый RSS
+одного замера не смешивался с другими:
+  extractors   - разбор JSON с диска, отбор элементов и каждый экстрактор
+                 на странице из N элементов: медиана времени и пик выделений
+                 Python/numpy (tracemalloc, отдельным проходом);
+  load_dataset - полный load_dataset по датасету, записанному на диск:
+                 стр/с, элементов/с, МБ/с, прирост RSS и время по стадиям
+                 (instrumentation);
+  train        - пропускная способность эпохи train_on_batch без первой эпохи
+                 (в нее входит трассировка графа);
+  inference    - оценка одной страницы из N элементов (извлечение + модель
+                 и только модель), пропускная способность батча и прирост RSS.
+
+Текстовый энкодер - офлайн-заглушка (USE_ENCODER_SOURCE=hashing), кэш
+эмбеддингов выключен, модель необученная. Результаты вместе с окружением
+запуска пишутся в JSON (--output); --compare сравнивает их с прошлым файлом
+и завершает скрипт с кодом 1, если метрика ухудшилась больше чем на --threshold.
+
+Запуск: python benchmarks/bench_suite.py [--quick] [--sizes 100 1000 ...]
+        [--output файл.json] [--compare прошлый.json] [--threshold 0.2]
+"""
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRC_DIR = os.path.join(PROJECT_ROOT, 'src')
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [SRC_DIR, BENCH_DIR, PROJECT_ROOT]
+
+from synthetic_dom import generate_page, write_dataset
+
+SIZES = (100, 1000, 10000, 50000)
+QUICK_SIZES = (100, 1000)
+REPEATS = 5
+# Датасет для load_dataset и обучения: число страниц и диапазон их длины
+DATASET_PAGES = 64
+DATASET_ELEMENTS = (50, 400)
+TRAIN_PAGES = 128
+TRAIN_EPOCHS = 3
+TRAIN_BATCH_SIZE = 8
+INFERENCE_BATCH_PAGES = 8
+DEFAULT_RESULTS_DIR = os.path.join(BENCH_DIR, 'results')
+# Допустимое относительное ухудшение метрики при сравнении с прошлым запуском
+REGRESSION_THRESHOLD = 0.2
+# Изменения меньше этих значений считаются шумом (мс и МБ)
+NOISE_FLOOR = {"_ms": 0.5, "_mb": 1.0}
+
+
+def _peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _median_ms(fn, repeats):
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return 1000 * float(np.median(timings))
+
+
+def _traced_peak_mb(fn):
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak / 2**20
+
+
+def case_extractors(num_elements, repeats=REPEATS, seed=0):
+    from feature_extractor.dom_stream import load_flat_page
+    from feature_extractor.element_selection import apply_length_policy
+    from feature_extractor.numeric_feature_extractor import extract_numeric_features
+    from feature_extractor.color_feature_extractor import extract_color_features
+    from feature_extractor.categorical_feature_extractor import extract_categorical_features
+    from feature_extractor.text_feature_extractor import extract_text_features
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, 'page.json')
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(generate_page(num_elements, seed=seed), f, ensure_ascii=False)
+
+        flat_page = load_flat_page(path)
+        # Экстракторы замеряются на полной странице, без лимита длины
+        stages = {
+            "parse": lambda: load_flat_page(path),
+            "select": lambda: apply_length_policy(flat_page),
+            "numeric": lambda: extract_numeric_features(None, flat_page=flat_page),
+            "color": lambda: extract_color_features(None, flat_page=flat_page),
+            "categorical": lambda: extract_categorical_features(None, flat_page=flat_page),
+            "text": lambda: extract_text_features(None, flat_page=flat_page),
+        }
+        results = {
+            name: {"median_ms": _median_ms(fn, repeats), "alloc_peak_mb": _traced_peak_mb(fn)}
+            for name, fn in stages.items()
+        }
+        file_mb = os.path.getsize(path) / 2**20
+
+    return {"num_elements": flat_page["num_elements"], "file_mb": file_mb,
+            "stages": results, "peak_rss_mb": _peak_rss_mb()}
+
+
+def case_load_dataset(num_pages=DATASET_PAGES, elements=DATASET_ELEMENTS, seed=0):
+    from data_loader import load_dataset
+    from instrumentation import enable_profiling, report
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        total_bytes = write_dataset(tmp_dir, num_pages, tuple(elements), seed=seed)
+        enable_profiling()
+        before = _peak_rss_mb()
+        start = time.perf_counter()
+        pages, _ = load_dataset(tmp_dir)
+        elapsed = time.perf_counter() - start
+
+    num_elements = int(sum(len(page["text_input"]) for page in pages))
+    return {
+        "num_pages": len(pages),
+        "num_elements": num_elements,
+        "total_sec": elapsed,
+        "pages_per_sec": len(pages) / elapsed,
+        "elements_per_sec": num_elements / elapsed,
+        "input_mb_per_sec": total_bytes / 2**20 / elapsed,
+        "peak_rss_delta_mb": _peak_rss_mb() - before,
+        "stages_total_sec": {name: stats["total_sec"] for name, stats in report()["stages"].items()},
+    }
+
+
+def case_train(num_pages=TRAIN_PAGES, elements=DATASET_ELEMENTS, epochs=TRAIN_EPOCHS,
+               batch_size=TRAIN_BATCH_SIZE, seed=0):
+    from batching import pad_batch, make_bucketed_batches
+    from models import create_usability_model, NUMERIC_VECTOR_SIZE
+    from normalization import fit_normalizer
+    from scoring_service import extract_documents
+
+    rng = np.random.default_rng(seed)
+    documents = [generate_page(int(n), seed=seed + i) for i, n in enumerate(rng.integers(*elements, num_pages))]
+    pages = [page for page in extract_documents(documents) if page is not None]
+    targets = rng.uniform(0, 100, len(pages)).astype(np.float32)
+    lengths = np.array([len(page["text_input"]) for page in pages])
+
+    normalizer = fit_normalizer((page["numeric_input"] for page in pages), NUMERIC_VECTOR_SIZE)
+    model = create_usability_model(numeric_normalizer=normalizer)
+    before = _peak_rss_mb()
+
+    epoch_times = []
+    for _ in range(epochs):
+        start = time.perf_counter()
+        for batch in make_bucketed_batches(lengths, batch_size, rng=rng):
+            model.train_on_batch(pad_batch([pages[i] for i in batch]), targets[batch])
+        epoch_times.append(time.perf_counter() - start)
+
+    epoch_sec = float(np.median(epoch_times[1:] or epoch_times))
+    return {
+        "num_pages": len(pages),
+        "num_elements": int(lengths.sum()),
+        "first_epoch_sec": epoch_times[0],
+        "epoch_sec": epoch_sec,
+        "pages_per_sec": len(pages) / epoch_sec,
+        "peak_rss_delta_mb": _peak_rss_mb() - before,
+    }
+
+
+def case_inference(num_elements, repeats=REPEATS, batch_pages=INFERENCE_BATCH_PAGES, seed=0):
+    from batching import pad_batch
+    from models import create_usability_model
+    from scoring_service import extract_documents, make_predict_fn, predict_pages
+
+    documents = [generate_page(num_elements, seed=seed + i) for i in range(batch_pages)]
+    predict_fn = make_predict_fn(create_usability_model())
+    page = extract_documents(documents[:1])[0]
+    pages = extract_documents(documents)
+    # Трассировка графа в замеры не входит
+    predict_pages(predict_fn, pages, batch_pages)
+    before = _peak_rss_mb()
+
+    single_ms = _median_ms(lambda: predict_pages(predict_fn, extract_documents(documents[:1])), repeats)
+    model_ms = _median_ms(lambda: predict_fn(pad_batch([page])), repeats)
+    batch_ms = _median_ms(lambda: predict_pages(predict_fn, pages, batch_pages), repeats)
+    return {
+        "num_elements": num_elements,
+        "model_elements": len(page["text_input"]),
+        "single_page_ms": single_ms,
+        "single_page_model_ms": model_ms,
+        "batch_pages": batch_pages,
+        "batch_pages_per_sec": 1000 * batch_pages / batch_ms,
+        "peak_rss_mb": _peak_rss_mb(),
+        "peak_rss_delta_mb": _peak_rss_mb() - before,
+    }
+
+
+CASES = {
+    "extractors": case_extractors,
+    "load_dataset": case_load_dataset,
+    "train": case_train,
+    "inference": case_inference,
+}
+
+
+def _run_case(case, **params):
+    """Запускает случай в отдельном процессе с офлайн-энкодером."""
+    env = dict(os.environ, USE_ENCODER_SOURCE='hashing')
+    env.pop('USE_EMBEDDING_CACHE_DIR', None)
+    env.pop('UI_UX_PROFILE', None)
+    result = subprocess.run([sys.executable, os.path.abspath(__file__), '--child', case, json.dumps(params)],
+                            capture_output=True, text=True, env=env, cwd=PROJECT_ROOT)
+    if result.returncode != 0:
+        return {"error": f"код возврата {result.returncode}: {result.stderr.strip().splitlines()[-1:]}"}
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def _environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=PROJECT_ROOT).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        "timestamp": datetime.datetime.now().isoformat(timespec='seconds'),
+        "git_commit": commit,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def run(sizes=SIZES, repeats=REPEATS, dataset_pages=DATASET_PAGES, train_pages=TRAIN_PAGES,
+        train_epochs=TRAIN_EPOCHS, seed=0, log=None):
+    """
+    Прогоняет все случаи.
+
+    Returns:
+        dict: {"environment", "params", "extractors": {N: ...}, "load_dataset",
+               "train", "inference": {N: ...}}.
+    """
+    log = log or (lambda message: None)
+    results = {
+        "environment": _environment(),
+        "params": {"sizes": list(sizes), "repeats": repeats, "dataset_pages": dataset_pages,
+                   "dataset_elements": list(DATASET_ELEMENTS), "train_pages": train_pages,
+                   "train_epochs": train_epochs, "inference_batch_pages": INFERENCE_BATCH_PAGES, "seed": seed},
+        "extractors": {},
+        "inference": {},
+    }
+    for num_elements in sizes:
+        log(f"extractors N={num_elements}")
+        results["extractors"][str(num_elements)] = _run_case("extractors", num_elements=num_elements,
+                                                             repeats=repeats, seed=seed)
+    log("load_dataset")
+    results["load_dataset"] = _run_case("load_dataset", num_pages=dataset_pages, seed=seed)
+    log("train")
+    results["train"] = _run_case("train", num_pages=train_pages, epochs=train_epochs, seed=seed)
+    for num_elements in sizes:
+        log(f"inference N={num_elements}")
+        results["inference"][str(num_elements)] = _run_case("inference", num_elements=num_elements,
+                                                            repeats=repeats, seed=seed)
+    return results
+
+
+def _flatten_metrics(node, prefix=''):
+    if isinstance(node, dict):
+        for key, value in node.items():
+            yield from _flatten_metrics(value, f"{prefix}.{key}" if prefix else key)
+    elif isinstance(node, (int, float)) and not isinstance(node, bool):
+        yield prefix, float(node)
+
+
+def _direction(path):
+    """+1 - больше лучше, -1 - меньше лучше, 0 - метрика не сравнивается."""
+    name = path.rsplit('.', 1)[-1]
+    if name.endswith('_per_sec'):
+        return 1
+    if name.endswith(('_ms', '_sec', '_mb')):
+        return -1
+    return 0
+
+
+def compare(current, baseline, threshold=REGRESSION_THRESHOLD):
+    """
+    Метрики, ухудшившиеся относительно baseline больше чем на threshold.
+
+    Returns:
+        list: [{"metric", "baseline", "current", "change"}], change - относительное ухудшение.
+    """
+    baseline_metrics = dict(_flatten_metrics({k: v for k, v in baseline.items() if k not in ("environment", "params")}))
+    regressions = []
+    for path, value in _flatten_metrics({k: v for k, v in current.items() if k not in ("environment", "params")}):
+        direction = _direction(path)
+        old = baseline_metrics.get(path)
+        if not direction or old is None or old <= 0:
+            continue
+        floor = next((floor for suffix, floor in NOISE_FLOOR.items() if path.endswith(suffix)), 0.0)
+        if abs(value - old) < floor:
+            continue
+        change = (old - value) / old if direction > 0 else (value - old) / old
+        if change > threshold:
+            regressions.append({"metric": path, "baseline": old, "current": value, "change": change})
+    return regressions
+
+
+def _print_summary(results):
+    print("Экстракторы (медиана, мс / пик выделений, МБ):")
+    for num_elements, row in results["extractors"].items():
+        if "error" in row:
+            print(f"  N={num_elements:>6}: ошибка ({row['error']})")
+            continue
+        print(f"  N={num_elements:>6}: " + ", ".join(
+            f"{name} {stats['median_ms']:.1f}/{stats['alloc_peak_mb']:.1f}" for name, stats in row["stages"].items()))
+
+    row = results["load_dataset"]
+    if "error" in row:
+        print(f"load_dataset: ошибка ({row['error']})")
+    else:
+        print(f"load_dataset: {row['num_pages']} стр, {row['pages_per_sec']:.1f} стр/с, "
+              f"{row['elements_per_sec']:.0f} элементов/с, прирост RSS {row['peak_rss_delta_mb']:.1f} МБ")
+
+    row = results["train"]
+    if "error" in row:
+        print(f"обучение: ошибка ({row['error']})")
+    else:
+        print(f"обучение: эпоха {row['epoch_sec']:.2f} с, {row['pages_per_sec']:.1f} стр/с "
+              f"(первая эпоха {row['first_epoch_sec']:.2f} с)")
+
+    print("Инференс:")
+    for num_elements, row in results["inference"].items():
+        if "error" in row:
+            print(f"  N={num_elements:>6}: ошибка ({row['error']})")
+            continue
+        print(f"  N={num_elements:>6}: в модели {row['model_elements']:>5}, страница {row['single_page_ms']:.1f} мс "
+              f"(модель {row['single_page_model_ms']:.1f} мс), батч {row['batch_pages_per_sec']:.1f} стр/с, "
+              f"пиковый RSS {row['peak_rss_mb']:.0f} МБ (+{row['peak_rss_delta_mb']:.1f})")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Сводный бенчмарк конвейера на синтетических страницах")
+    parser.add_argument('--sizes', type=int, nargs='+', default=None, help="Число элементов страницы")
+    parser.add_argument('--quick', action='store_true', help=f"Размеры {QUICK_SIZES} и меньше повторов")
+    parser.add_argument('--repeats', type=int, default=None)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default=None, help="JSON с результатами (по умолчанию benchmarks/results/)")
+    parser.add_argument('--compare', default=None, help="JSON прошлого запуска для поиска регрессий")
+    parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD)
+    parser.add_argument('--child', nargs=2, metavar=('CASE', 'PARAMS'), help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        case, params = args.child
+        print(json.dumps(CASES[case](**json.loads(params))))
+        return 0
+
+    sizes = args.sizes or (QUICK_SIZES if args.quick else SIZES)
+    repeats = args.repeats or (2 if args.quick else REPEATS)
+    run_kwargs = {"sizes": sizes, "repeats": repeats, "seed": args.seed}
+    if args.quick:
+        run_kwargs.update(dataset_pages=16, train_pages=32, train_epochs=2)
+    results = run(log=lambda message: print(f"... {message}", file=sys.stderr), **run_kwargs)
+
+    output = args.output or os.path.join(
+        DEFAULT_RESULTS_DIR, f"suite_{datetime.datetime.now():%Y%m%d_%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    _print_summary(results)
+    print(f"Результаты: {output}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline.get("params") != results["params"]:
+            print("Внимание: параметры запусков различаются, сравнение может быть некорректным")
+        regressions = compare(results, baseline, args.threshold)
+        for row in regressions:
+            print(f"РЕГРЕССИЯ {row['metric']}: {row['baseline']:.4g} -> {row['current']:.4g} "
+                  f"(хуже на {row['change']:.0%})")
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
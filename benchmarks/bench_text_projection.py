@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+
+"""
+Бенчмарк проекции текстовых эмбеддингов (TEXT_PROJECTION_SIZE): для каждой
+размерности - объем text_input и всех входов страницы, байт на строку кэша
+эмбеддингов, доля сохраненной дисперсии, скорость обучения (стр/с)
+и MAE на отложенных синтетических страницах.
+
+Целевая оценка зависит от текста (доля элементов с призывом к действию)
+и от контраста, поэтому сравнение показывает, сколько полезной информации
+о тексте теряет проекция. PCA обучается только на обучающих страницах.
+
+Запуск: USE_ENCODER_SOURCE=hashing python benchmarks/bench_text_projection.py
+"""
+
+import os
+import sys
+import time
+
+import numpy as np
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [os.path.join(PROJECT_ROOT, 'src'), BENCH_DIR, PROJECT_ROOT]
+
+from synthetic_dom import generate_page
+
+# None - полные эмбеддинги без проекции
+SIZES = (None, 128, 64)
+CALL_TO_ACTION = {"Купить", "Отправить", "Войти", "Корзина"}
+
+
+def _synthetic_corpus(num_pages, seed):
+    """Страницы с сырыми 512-мерными эмбеддингами текстов и целевые оценки."""
+    from data_loader import _extract_page_features
+    from feature_extractor.dom_flattener import flatten_dom
+    from feature_extractor.text_feature_extractor import concatenate_texts, embed_texts
+
+    rng = np.random.default_rng(seed)
+    pages, targets = [], []
+    for i, n in enumerate(rng.integers(30, 200, num_pages)):
+        # Доля повторяющихся подписей разная у разных страниц, чтобы оценка от нее зависела
+        flat_page = flatten_dom(generate_page(int(n), text_repeat_rate=rng.uniform(0.1, 0.9), seed=seed + i))
+        texts = concatenate_texts(flat_page)
+        page = {"text_input": embed_texts(texts, project=False), **_extract_page_features(flat_page)}
+        call_to_action = np.mean([text in CALL_TO_ACTION for text in texts])
+        targets.append(100.0 * call_to_action + 20.0 * np.mean(page["numeric_input"][:, -1] < 4.5))
+        pages.append(page)
+    return pages, np.array(targets, dtype=np.float32)
+
+
+def _project_pages(pages, projection):
+    """Проецирует text_input страниц; пустые тексты (нулевые строки) остаются нулевыми."""
+    projected = []
+    for page in pages:
+        text_vectors = page["text_input"]
+        rows = np.any(text_vectors != 0, axis=1)
+        text_features = np.zeros((len(text_vectors), projection.size), dtype=np.float16)
+        text_features[rows] = projection.transform(text_vectors[rows])
+        projected.append({**page, "text_input": text_features})
+    return projected
+
+
+def _unique_text_vectors(pages):
+    vectors = np.concatenate([page["text_input"] for page in pages])
+    vectors = vectors[np.any(vectors != 0, axis=1)]
+    return np.unique(vectors, axis=0)
+
+
+def measure(sizes=SIZES, num_pages=240, held_out=40, epochs=30, batch_size=8, seed=0):
+    from batching import pad_batch, make_bucketed_batches
+    from models import create_usability_model, NUMERIC_VECTOR_SIZE
+    from normalization import fit_normalizer
+    from feature_extractor.text_feature_extractor import VECTOR_SIZE
+    from feature_extractor.text_projection import fit_projection
+
+    pages, targets = _synthetic_corpus(num_pages, seed)
+    train_pages, train_targets = pages[held_out:], targets[held_out:]
+    test_targets = targets[:held_out]
+    lengths = np.array([len(page["text_input"]) for page in train_pages])
+    normalizer = fit_normalizer((page["numeric_input"] for page in train_pages), NUMERIC_VECTOR_SIZE)
+    train_vectors = _unique_text_vectors(train_pages)
+
+    results = {}
+    for size in sizes:
+        explained = 1.0
+        size_pages = pages
+        if size is not None:
+            projection = fit_projection([train_vectors], size, VECTOR_SIZE)
+            explained = projection.explained_variance_ratio
+            size_pages = _project_pages(pages, projection)
+        train_set, test_set = size_pages[held_out:], size_pages[:held_out]
+        text_size = size or VECTOR_SIZE
+
+        model = create_usability_model(numeric_normalizer=normalizer, text_vector_size=text_size)
+        model.optimizer.learning_rate = 1e-3
+        rng = np.random.default_rng(seed)
+        # Первая эпоха включает трассировку графа и в скорость не входит
+        train_time = 0.0
+        for epoch in range(epochs):
+            start = time.perf_counter()
+            for batch in make_bucketed_batches(lengths, batch_size, rng=rng):
+                model.train_on_batch(pad_batch([train_set[i] for i in batch]), train_targets[batch])
+            if epoch > 0:
+                train_time += time.perf_counter() - start
+
+        predictions = np.concatenate([
+            np.asarray(model.predict_on_batch(pad_batch(test_set[i:i + batch_size]))).reshape(-1)
+            for i in range(0, held_out, batch_size)
+        ])
+        results[text_size] = {
+            "text_bytes": sum(page["text_input"].nbytes for page in size_pages),
+            "page_bytes": sum(array.nbytes for page in size_pages for array in page.values()),
+            "cache_bytes_per_text": text_size * size_pages[0]["text_input"].itemsize,
+            "explained_variance": explained,
+            "train_pages_per_sec": len(train_set) * (epochs - 1) / train_time,
+            "mae": float(np.mean(np.abs(predictions - test_targets))),
+        }
+    baseline = float(np.mean(np.abs(train_targets.mean() - test_targets)))
+    return results, baseline
+
+
+if __name__ == '__main__':
+    results, baseline = measure()
+    print(f"MAE предсказания средним: {baseline:.2f}")
+    for size, row in results.items():
+        print(f"  {size:>4}: text_input {row['text_bytes'] / 2**20:6.2f} МБ "
+              f"(все входы {row['page_bytes'] / 2**20:6.2f} МБ), кэш {row['cache_bytes_per_text']:5d} Б/строка, "
+              f"дисперсия {row['explained_variance']:6.1%}, "
+              f"обучение {row['train_pages_per_sec']:6.1f} стр/с, MAE {row['mae']:.2f}")
@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+
+"""
+Бенчмарк экспорта в TFLite (tflite_export.py) против загрузки .keras в TensorFlow.
+
+Для каждого артефакта (keras, TFLite dynamic int8, TFLite float16) в отдельном
+процессе замеряются:
+1. Холодный старт: импорт, загрузка модели и первая оценка страницы.
+2. Задержка оценки одной страницы в зависимости от числа элементов N.
+3. Пропускная способность на батчах по 16 страниц.
+Плюс размер файла и расхождение оценок с keras-моделью.
+
+Модель необученная (веса случайные): на скорость и размер это не влияет.
+Запуск: USE_ENCODER_SOURCE=hashing python benchmarks/bench_tflite.py
+"""
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+import numpy as np
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRC_DIR = os.path.join(PROJECT_ROOT, 'src')
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [SRC_DIR, BENCH_DIR, PROJECT_ROOT]
+
+SIZES = (100, 500, 1000, 2000)
+THROUGHPUT_BATCH = 16
+THROUGHPUT_ELEMENTS = 200
+
+_CHILD_SCRIPT = """
+import time
+_process_start = time.perf_counter()
+import json, sys
+sys.path[:0] = [{src_dir!r}, {bench_dir!r}, {project_root!r}]
+import numpy as np
+from synthetic_dom import generate_page
+from batching import pad_batch
+from scoring_service import load_scoring_model, make_predict_fn, extract_documents
+imports_time = time.perf_counter() - _process_start
+
+model_path, sizes = sys.argv[1], json.loads(sys.argv[2])
+pages = {{n: extract_documents([generate_page(n, seed=n)])[0] for n in sizes + [{throughput_elements}]}}
+
+# Холодный старт без извлечения признаков: импорты, загрузка модели, первая оценка
+start = time.perf_counter()
+predict_fn = make_predict_fn(load_scoring_model(model_path))
+predict_fn(pad_batch([pages[sizes[0]]]))
+cold_start = imports_time + time.perf_counter() - start
+
+latency = {{}}
+for n in sizes:
+    x_batch = pad_batch([pages[n]])
+    predict_fn(x_batch)
+    timings = []
+    for _ in range(5):
+        start = time.perf_counter()
+        predict_fn(x_batch)
+        timings.append(time.perf_counter() - start)
+    latency[n] = 1000 * float(np.median(timings))
+
+x_batch = pad_batch([pages[{throughput_elements}]] * {throughput_batch})
+predict_fn(x_batch)
+start = time.perf_counter()
+for _ in range(5):
+    predict_fn(x_batch)
+throughput = 5 * {throughput_batch} / (time.perf_counter() - start)
+print(json.dumps({{"cold_start_sec": cold_start, "latency_ms": latency, "pages_per_sec": throughput}}))
+"""
+
+
+def _measure(model_path, sizes):
+    script = _CHILD_SCRIPT.format(src_dir=SRC_DIR, bench_dir=BENCH_DIR, project_root=PROJECT_ROOT,
+                                  throughput_elements=THROUGHPUT_ELEMENTS, throughput_batch=THROUGHPUT_BATCH)
+    result = subprocess.run([sys.executable, '-c', script, model_path, json.dumps(list(sizes))],
+                            capture_output=True, text=True)
+    if result.returncode != 0:
+        return {"error": f"код возврата {result.returncode}: {result.stderr.strip().splitlines()[-1:]}"}
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def _parity(model, tflite_path, num_pages=32, seed=0):
+    from synthetic_dom import generate_page
+    from scoring_service import extract_documents
+    from tflite_export import TFLiteScorer, check_parity
+
+    rng = np.random.default_rng(seed)
+    pages = extract_documents([generate_page(int(n), seed=seed + i)
+                               for i, n in enumerate(rng.integers(20, 400, num_pages))])
+    return check_parity(model, TFLiteScorer(tflite_path), pages)
+
+
+def run(sizes=SIZES):
+    from models import create_usability_model
+    from tflite_export import export_tflite
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        model = create_usability_model()
+        keras_path = os.path.join(tmp_dir, 'model.keras')
+        model.save(keras_path)
+        results["keras"] = {"file_mb": os.path.getsize(keras_path) / 2**20, **_measure(keras_path, sizes)}
+
+        for quantization in ("dynamic", "float16"):
+            tflite_path = os.path.join(tmp_dir, f'model_{quantization}.tflite')
+            size = export_tflite(model, tflite_path, quantization)
+            results[f"tflite-{quantization}"] = {
+                "file_mb": size / 2**20,
+                "parity": _parity(model, tflite_path),
+                **_measure(tflite_path, sizes),
+            }
+    return results
+
+
+if __name__ == '__main__':
+    for name, row in run().items():
+        if "error" in row:
+            print(f"{name:>16}: ошибка ({row['error']})")
+            continue
+        parity = row.get("parity")
+        parity_text = f", расхождение с keras до {parity['max_abs_diff']:.4f}" if parity else ""
+        print(f"{name:>16}: файл {row['file_mb']:.2f} МБ, холодный старт {row['cold_start_sec']:.2f} с, "
+              f"{row['pages_per_sec']:.1f} стр/с (батч {THROUGHPUT_BATCH} x {THROUGHPUT_ELEMENTS}){parity_text}")
+        print("                  задержка страницы: " + ", ".join(
+            f"N={n} {ms:.1f} мс" for n, ms in row["latency_ms"].items()))
@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+
+"""
+Генератор синтетических DOM-страниц в схеме dataset/full_feature_element_example.json.
+Используется бенчмарками; результат детерминирован при фиксированном seed.
+write_dataset раскладывает страницы в каталог в формате dataset/ (файлы + labels.json).
+"""
+
+import json
+import os
+import random
+
+TAGS = ["div", "p", "a", "span", "li", "ul", "button", "input", "img", "h1", "h2", "h3",
+        "label", "form", "section", "nav"]
+POSITIONS = ["static", "relative", "absolute", "fixed", "sticky"]
+DISPLAYS = ["block", "inline", "inline-block", "flex", "grid", "none"]
+TEXT_ALIGNS = ["left", "right", "center", "justify", "start", "end"]
+FONT_SIZES = ["12px", "14px", "16px", "18px", "24px", "32px", "1.5em", "1rem"]
+FONT_WEIGHTS = ["400", "500", "700", "normal", "bold"]
+LINE_HEIGHTS = ["1.2", "1.5", "1.6", "normal", "24px"]
+COMMON_TEXTS = ["Главная", "О нас", "Контакты", "Войти", "Отправить", "Подробнее", "Купить",
+                "Назад", "Далее", "Поиск", "Корзина", "Помощь"]
+
+
+def _random_color(rng, palette):
+    return rng.choice(palette)
+
+
+def _make_palette(rng, num_colors):
+    palette = ["rgb(255, 255, 255)", "rgb(33, 37, 41)", "transparent", "rgba(0, 0, 0, 0)"]
+    while len(palette) < num_colors:
+        r, g, b = (rng.randrange(256) for _ in range(3))
+        palette.append(rng.choice([f"rgb({r}, {g}, {b})", f"#{r:02x}{g:02x}{b:02x}",
+                                   f"rgba({r}, {g}, {b}, {rng.choice([0.5, 0.8, 1])})"]))
+    return palette[:max(num_colors, 1)]
+
+
+def _make_text(rng, text_repeat_rate, counter):
+    if rng.random() < text_repeat_rate:
+        return rng.choice(COMMON_TEXTS)
+    return f"Уникальный текст элемента номер {counter}"
+
+
+def _make_element(rng, palette, text_repeat_rate, counter, depth):
+    tag = rng.choice(TAGS)
+    has_text = tag not in ("img", "input", "ul", "form") and rng.random() < 0.7
+    return {
+        "tag": tag,
+        "text": _make_text(rng, text_repeat_rate, counter) if has_text else "",
+        "alt": _make_text(rng, text_repeat_rate, counter) if tag == "img" and rng.random() < 0.8 else None,
+        "title": _make_text(rng, text_repeat_rate, counter) if rng.random() < 0.2 else None,
+        "placeholder": "user@example.com" if tag == "input" and rng.random() < 0.7 else None,
+        "width": f"{rng.randrange(10, 1200)}px",
+        "height": rng.choice(["auto", f"{rng.randrange(10, 600)}px"]),
+        "top": f"{rng.randrange(0, 5000)}px",
+        "left": rng.choice(["auto", f"{rng.randrange(0, 1200)}px", f"-{rng.randrange(1, 50)}px"]),
+        "fontSize": rng.choice(FONT_SIZES),
+        "fontWeight": rng.choice(FONT_WEIGHTS),
+        "lineHeight": rng.choice(LINE_HEIGHTS),
+        "opacity": rng.choice(["1", "0.95", "0.5"]),
+        "letterSpacing": rng.choice(["normal", "0.5px", "1px"]),
+        "color": _random_color(rng, palette),
+        "backgroundColor": _random_color(rng, palette),
+        "position": rng.choice(POSITIONS),
+        "display": rng.choice(DISPLAYS) if rng.random() < 0.3 else "block",
+        "textAlign": rng.choice(TEXT_ALIGNS),
+        "depth": depth,
+        "num_children": 0,
+    }
+
+
+def generate_page(num_elements, max_depth=8, text_repeat_rate=0.5, num_colors=16, seed=0, nest_rate=0.85):
+    """
+    Строит страницу из num_elements элементов.
+
+    Args:
+        num_elements (int): Общее число элементов во всем дереве.
+        max_depth (int): Максимальная глубина вложенности (0 - плоский список).
+        text_repeat_rate (float): Доля текстов из небольшого набора повторяющихся подписей.
+        num_colors (int): Размер палитры цветов страницы.
+        seed (int): Зерно генератора.
+        nest_rate (float): Вероятность вложить элемент в уже созданный узел,
+            а не начать новый корень (ближе к 1 - одно глубокое дерево, как у body).
+
+    Returns:
+        dict: {"elements": [...]} с вложенными списками children.
+    """
+    rng = random.Random(seed)
+    palette = _make_palette(rng, num_colors)
+
+    roots = []
+    # Открытые узлы, к которым можно добавлять детей: (элемент, глубина)
+    open_nodes = []
+    for counter in range(num_elements):
+        parent, depth = None, 0
+        if open_nodes and rng.random() < nest_rate:
+            # Чаще вкладываем в недавно созданные узлы, чтобы дерево было глубоким
+            parent, parent_depth = open_nodes[-1 - min(int(rng.expovariate(0.5)), len(open_nodes) - 1)]
+            depth = parent_depth + 1
+
+        element = _make_element(rng, palette, text_repeat_rate, counter, depth)
+        if parent is None:
+            roots.append(element)
+        else:
+            parent.setdefault("children", []).append(element)
+            parent["num_children"] += 1
+
+        if depth < max_depth:
+            open_nodes.append((element, depth))
+            if len(open_nodes) > 64:
+                open_nodes.pop(0)
+
+    return {"elements": roots}
+
+
+def write_dataset(dataset_dir, num_pages, num_elements, seed=0, **page_kwargs):
+    """
+    Записывает синтетический датасет: page_XXXXX.json и labels.json с оценками.
+
+    Args:
+        num_elements (int | tuple): Число элементов страницы или диапазон (min, max).
+        page_kwargs: Параметры generate_page (max_depth, text_repeat_rate, num_colors, nest_rate).
+
+    Returns:
+        int: Суммарный размер записанных страниц в байтах.
+    """
+    rng = random.Random(seed)
+    os.makedirs(dataset_dir, exist_ok=True)
+    labels = {}
+    total_bytes = 0
+    for i in range(num_pages):
+        size = num_elements if isinstance(num_elements, int) else rng.randint(*num_elements)
+        filename = f"page_{i:05d}.json"
+        path = os.path.join(dataset_dir, filename)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(generate_page(size, seed=seed + i, **page_kwargs), f, ensure_ascii=False)
+        total_bytes += os.path.getsize(path)
+        labels[filename] = round(rng.uniform(0, 100), 1)
+
+    with open(os.path.join(dataset_dir, 'labels.json'), 'w', encoding='utf-8') as f:
+        json.dump(labels, f, ensure_ascii=False, indent=2)
+    return total_bytes
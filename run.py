@@ -1,34 +1,168 @@
+import argparse
 import json
-import numpy as np
+import logging
 import os
-from src.feature_extractor.text_feature_extractor import extract_text_features, setup_model_cache
-from src.models import create_text_head_model
+import sys
 
-def main():
-    PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
-    json_file_path = os.path.join(PROJECT_ROOT, 'dataset', 'example_dom.json')
-    
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(PROJECT_ROOT, 'src'))
+
+# Модули проекта импортируются в _run() после разбора аргументов: --help и ошибки
+# аргументов не ждут numpy, а TensorFlow загружается, только когда нужен
+# энкодеру текста или keras-модели (см. benchmarks/bench_import_time.py)
+DEFAULT_MODEL_PATH = os.path.join(PROJECT_ROOT, 'trained_model.keras')
+LOG_LEVELS = ('DEBUG', 'INFO', 'WARNING', 'ERROR')
+
+logger = logging.getLogger('run')
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Оценка юзабилити страниц по DOM-снимкам")
+    parser.add_argument('files', nargs='*', help="JSON-файлы DOM для оценки")
+    parser.add_argument('--model', default=DEFAULT_MODEL_PATH, help="Путь к trained_model.keras или экспортированной .tflite")
+    parser.add_argument('--serve', action='store_true', help="HTTP-сервис: POST /score")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--stdin', action='store_true', help="JSONL: документ в строке stdin -> оценка в stdout")
+    parser.add_argument('--async', dest='async_mode', action='store_true',
+                        help="Асинхронный HTTP-сервис с ограничением нагрузки (POST /score, GET /metrics)")
+    parser.add_argument('--extract-workers', type=int, default=4, help="Пул извлечения признаков (--async)")
+    parser.add_argument('--extract-processes', action='store_true', help="Извлекать признаки в процессах (--async)")
+    parser.add_argument('--max-in-flight', type=int, default=64, help="Запросов в работе одновременно (--async)")
+    parser.add_argument('--timeout', type=float, default=30.0, help="Таймаут запроса, секунды (--async)")
+    parser.add_argument('--max-batch-pages', type=int, default=None,
+                        help="Предельный размер микро-батча (по умолчанию MAX_BATCH_PAGES)")
+    parser.add_argument('--max-latency-ms', type=float, default=None,
+                        help="Ожидание добора микро-батча, мс (по умолчанию MAX_LATENCY)")
+    parser.add_argument('--incremental', action='store_true',
+                        help="Сервисы: хранить признаки последних снимков страниц и для документов "
+                             "вида {\"id\": ..., \"dom\": ...} пересчитывать только измененные элементы")
+    parser.add_argument('--rule-gate', action='store_true',
+                        help="Страницы с очевидными нарушениями WCAG (контраст, alt, подписи полей) "
+                             "оценивать правилами без текстового энкодера и модели (wcag_rules.py)")
+    parser.add_argument('--rule-gate-max-score', type=float, default=None,
+                        help="Порог оценки правил для --rule-gate (по умолчанию RULE_GATE_MAX_SCORE)")
+    parser.add_argument('--log-level', choices=LOG_LEVELS, default='WARNING', help="Уровень журнала (stderr)")
+    parser.add_argument('--profile', action='store_true',
+                        help="Замеры стадий конвейера; отчет выводится при завершении (сервисы: GET /metrics)")
+    parser.add_argument('--profile-format', choices=('json', 'prometheus'), default='json')
+    parser.add_argument('--profile-output', default=None, help="Файл для отчета замеров (по умолчанию stderr)")
+    return parser.parse_args(argv)
+
+
+def _write_profile(args):
+    from instrumentation import report, to_prometheus
+
+    text = to_prometheus() if args.profile_format == 'prometheus' else json.dumps(report(), ensure_ascii=False, indent=2)
+    if args.profile_output:
+        with open(args.profile_output, 'w', encoding='utf-8') as f:
+            f.write(text)
+    else:
+        print(text, file=sys.stderr)
+
+
+def _load_documents(json_file_paths):
+    """
+    Плоские страницы файлов (load_flat_page: большие снимки разбираются потоково,
+    без дерева объектов); для нечитаемых - None и сообщение в журнале.
+    """
+    from feature_extractor.dom_stream import load_flat_page
+
+    documents = []
+    for file_path in json_file_paths:
+        try:
+            documents.append(load_flat_page(file_path))
+        except Exception as e:
+            logger.error("Не удалось прочитать %s: %s", file_path, e)
+            documents.append(None)
+    return documents
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    # Результаты пишутся в stdout, журнал - в stderr
+    logging.basicConfig(level=args.log_level, stream=sys.stderr, format='%(levelname)s %(name)s: %(message)s')
+
+    from instrumentation import enable_profiling
+    if args.profile:
+        enable_profiling()
     try:
-        setup_model_cache()
-        
-        with open(json_file_path, 'r', encoding='utf-8') as f:
-            dom_data = json.load(f)
-
-        text_vectors = extract_text_features(dom_data)
-        
-        if text_vectors.shape[0] == 0:
-            return
-            
-        text_model = create_text_head_model(input_shape=(text_vectors.shape[0], text_vectors.shape[1]))
-        
-        model_input = np.expand_dims(text_vectors, axis=0)
-        
-        predicted_score = text_model.predict(model_input)
-        
-    except FileNotFoundError:
-        pass
-    except Exception as e:
-        pass
+        return _run(args)
+    finally:
+        if args.profile:
+            _write_profile(args)
+
+
+def _run(args):
+    from feature_extractor.text_feature_extractor import setup_model_cache, get_text_encoder
+    from scoring_service import (
+        load_scoring_model, make_http_server, serve_jsonl, MicroBatcher, MAX_BATCH_PAGES, MAX_LATENCY
+    )
+
+    max_batch_pages = args.max_batch_pages or MAX_BATCH_PAGES
+    max_latency = args.max_latency_ms / 1000 if args.max_latency_ms is not None else MAX_LATENCY
+    long_running = args.serve or args.stdin or args.async_mode
+
+    setup_model_cache()
+    # Прогрев нужен долгоживущему сервису; разовая оценка сразу делает настоящий вызов
+    get_text_encoder(warmup=long_running)
+    model = load_scoring_model(args.model)
+    feature_cache = None
+    if args.incremental:
+        from incremental_features import PageFeatureCache
+        feature_cache = PageFeatureCache()
+    rule_gate = None
+    if args.rule_gate:
+        from wcag_rules import RuleGate
+        rule_gate = RuleGate() if args.rule_gate_max_score is None else RuleGate(max_score=args.rule_gate_max_score)
+
+    if args.async_mode:
+        import asyncio
+        from async_scoring import AsyncScorer, serve_async
+
+        scorer = AsyncScorer(
+            model, extract_workers=args.extract_workers, use_processes=args.extract_processes,
+            max_in_flight=args.max_in_flight, request_timeout=args.timeout,
+            max_batch_pages=max_batch_pages, max_latency=max_latency, feature_cache=feature_cache,
+            rule_gate=rule_gate
+        )
+        print(f"Асинхронный сервис оценки: http://{args.host}:{args.port}/score", file=sys.stderr)
+        try:
+            asyncio.run(serve_async(scorer, args.host, args.port))
+        except KeyboardInterrupt:
+            pass
+        return 0
+
+    batcher = MicroBatcher(model, max_batch_pages=max_batch_pages, max_latency=max_latency,
+                           feature_cache=feature_cache, rule_gate=rule_gate)
+
+    try:
+        if args.serve:
+            server = make_http_server(batcher, args.host, args.port)
+            print(f"Сервис оценки: http://{args.host}:{args.port}/score", file=sys.stderr)
+            try:
+                server.serve_forever()
+            except KeyboardInterrupt:
+                pass
+            finally:
+                server.server_close()
+        elif args.stdin:
+            serve_jsonl(batcher)
+        else:
+            json_file_paths = args.files or [os.path.join(PROJECT_ROOT, 'dataset', 'sample1.json')]
+            documents = _load_documents(json_file_paths)
+            readable = [document for document in documents if document is not None]
+            scores = iter(batcher.score(readable) if readable else [])
+            for file_path, document in zip(json_file_paths, documents):
+                result = {"file": file_path, "error": "не удалось прочитать файл"} if document is None \
+                    else {"file": file_path, "score": next(scores)}
+                print(json.dumps(result, ensure_ascii=False))
+            if len(readable) < len(documents):
+                return 1
+    finally:
+        batcher.close()
+    return 0
+
 
 if __name__ == '__main__':
-    main()
+    sys.exit(main())
@@ -0,0 +1,306 @@
+# -*- coding: utf-8 -*-
+
+"""
+Асинхронный фронтенд сервиса оценки.
+
+Цикл событий только принимает запросы и раздает ответы. Разбор JSON
+и извлечение признаков идут в пуле потоков или процессов, прямой проход
+модели - в отдельном однопоточном исполнителе, поэтому одна огромная
+страница не блокирует остальные. Число запросов в работе ограничено
+(остальные ждут слота), очередь к модели имеет предельную длину,
+а каждый запрос - собственный таймаут. Глубина очереди и время ожидания
+в ней доступны через metrics() и GET /metrics (при включенных замерах -
+вместе с отчетом instrumentation; GET /metrics?format=prometheus - текст
+для Prometheus).
+"""
+
+import asyncio
+import json
+import logging
+import multiprocessing
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+import numpy as np
+
+from feature_extractor.categorical_feature_extractor import get_categorical_vocabulary
+from feature_extractor.text_feature_extractor import get_text_projection
+from feature_extractor.dom_stream import orjson
+from instrumentation import timer, count, report, to_prometheus, profiling_enabled
+from model_artifacts import configure_features
+from scoring_service import (
+    _parse_request, prepare_documents, merge_scores, make_predict_fn, predict_pages,
+    MAX_BATCH_PAGES, MAX_LATENCY, PREDICT_BATCH_SIZE
+)
+
+logger = logging.getLogger(__name__)
+
+# Сколько запросов одновременно разбирается и ждет модели
+MAX_IN_FLIGHT = 64
+# Предельная длина очереди к модели (в запросах)
+MAX_QUEUE = 256
+# Таймаут одного запроса (секунды)
+REQUEST_TIMEOUT = 30.0
+# Сколько последних замеров ожидания хранится для перцентилей
+WAIT_WINDOW = 1024
+
+
+def parse_and_extract(body, feature_cache=None, rule_gate=None):
+    """
+    Задача пула: тело запроса (bytes) -> (признаки страниц, оценки правил),
+    как prepare_documents: None вместо признаков пустых и отсеченных правилами страниц.
+    """
+    count("bytes_read", len(body))
+    with timer("parse_json"):
+        payload = orjson.loads(body) if orjson is not None else json.loads(body)
+    documents, page_keys = _parse_request(payload)
+    return prepare_documents(documents, page_keys, feature_cache, rule_gate)
+
+
+class AsyncScorer:
+    """
+    Асинхронная оценка страниц с ограничением нагрузки.
+
+    Args:
+        model: Загруженная keras-модель или TFLiteScorer (load_scoring_model).
+        extract_workers (int): Размер пула извлечения признаков.
+        use_processes (bool): Пул процессов вместо потоков (извлечение упирается в GIL;
+            каждый процесс загружает собственный текстовый энкодер).
+        max_in_flight (int): Сколько запросов обрабатывается одновременно.
+        max_queue (int): Предельная длина очереди к модели.
+        request_timeout (float): Таймаут запроса по умолчанию (секунды).
+        feature_cache (PageFeatureCache, optional): Инкрементальное извлечение признаков
+            для документов с ключом страницы; только с пулом потоков.
+        rule_gate (RuleGate, optional): Отсечение по правилам WCAG (wcag_rules.py); запрос,
+            все страницы которого решены правилами, не занимает очередь к модели.
+    """
+
+    def __init__(self, model, extract_workers=4, use_processes=False, max_in_flight=MAX_IN_FLIGHT,
+                 max_queue=MAX_QUEUE, request_timeout=REQUEST_TIMEOUT, max_batch_pages=MAX_BATCH_PAGES,
+                 max_latency=MAX_LATENCY, predict_batch_size=PREDICT_BATCH_SIZE, feature_cache=None,
+                 rule_gate=None):
+        if use_processes and feature_cache is not None:
+            raise ValueError("Кэш снимков страниц хранится в памяти процесса и несовместим с пулом процессов")
+        self.feature_cache = feature_cache
+        self.rule_gate = rule_gate
+        self.request_timeout = request_timeout
+        self.max_in_flight = max_in_flight
+        self.max_batch_pages = max_batch_pages
+        self.max_latency = max_latency
+        self.predict_batch_size = predict_batch_size
+
+        self._predict_fn = make_predict_fn(model)
+        if use_processes:
+            # spawn: форк процесса с уже инициализированным TensorFlow небезопасен;
+            # воркеры получают словарь и проекцию модели (load_scoring_model), а не файлы из корня проекта
+            self._extract_executor = ProcessPoolExecutor(
+                max_workers=extract_workers, mp_context=multiprocessing.get_context('spawn'),
+                initializer=configure_features, initargs=(get_categorical_vocabulary(), get_text_projection())
+            )
+        else:
+            self._extract_executor = ThreadPoolExecutor(max_workers=extract_workers,
+                                                        thread_name_prefix="extract")
+        self._model_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="model")
+
+        self._max_queue = max_queue
+        self._queue = None
+        self._slots = None
+        self._batch_task = None
+
+        self._in_flight = 0
+        self._waits = deque(maxlen=WAIT_WINDOW)
+        self._counters = {"requests": 0, "completed": 0, "timeouts": 0, "errors": 0, "pages": 0, "batches": 0}
+
+    async def start(self):
+        """Запускает сборщик микро-батчей в текущем цикле событий."""
+        self._queue = asyncio.Queue(maxsize=self._max_queue)
+        self._slots = asyncio.Semaphore(self.max_in_flight)
+        self._batch_task = asyncio.get_running_loop().create_task(self._batch_loop())
+
+    async def close(self):
+        if self._batch_task is not None:
+            self._batch_task.cancel()
+            try:
+                await self._batch_task
+            except asyncio.CancelledError:
+                pass
+        self._extract_executor.shutdown(wait=False, cancel_futures=True)
+        self._model_executor.shutdown(wait=True)
+
+    async def score(self, body, timeout=None):
+        """
+        Оценки страниц из тела запроса (JSON в bytes).
+
+        Raises:
+            asyncio.TimeoutError: Запрос не уложился в таймаут.
+        """
+        self._counters["requests"] += 1
+        try:
+            return await asyncio.wait_for(self._score(body), timeout or self.request_timeout)
+        except asyncio.TimeoutError:
+            self._counters["timeouts"] += 1
+            raise
+        except Exception:
+            self._counters["errors"] += 1
+            raise
+
+    async def _score(self, body):
+        async with self._slots:
+            self._in_flight += 1
+            try:
+                loop = asyncio.get_running_loop()
+                pages, rule_scores = await loop.run_in_executor(
+                    self._extract_executor, parse_and_extract, body, self.feature_cache, self.rule_gate
+                )
+
+                if any(page is not None for page in pages):
+                    future = loop.create_future()
+                    # При полной очереди ожидание здесь - обратное давление на клиентов
+                    await self._queue.put((pages, future, time.monotonic()))
+                    scores = merge_scores(await future, rule_scores)
+                else:
+                    scores = rule_scores
+            finally:
+                self._in_flight -= 1
+
+        self._counters["completed"] += 1
+        return scores
+
+    async def _collect(self):
+        """Первый запрос очереди плюс те, что успели прийти до дедлайна."""
+        first = await self._queue.get()
+        requests = [first]
+        num_pages = len(first[0])
+        deadline = first[2] + self.max_latency
+
+        while num_pages < self.max_batch_pages:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                request = await asyncio.wait_for(self._queue.get(), timeout)
+            except asyncio.TimeoutError:
+                break
+            requests.append(request)
+            num_pages += len(request[0])
+
+        return requests
+
+    async def _batch_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            requests = await self._collect()
+
+            now = time.monotonic()
+            # Запросы, отмененные по таймауту, в модель не идут
+            requests = [request for request in requests if not request[1].done()]
+            if not requests:
+                continue
+            self._waits.extend(now - enqueued_at for _, _, enqueued_at in requests)
+
+            pages = [page for request_pages, _, _ in requests for page in request_pages]
+            try:
+                scores = await loop.run_in_executor(
+                    self._model_executor, predict_pages, self._predict_fn, pages, self.predict_batch_size
+                )
+            except Exception as e:
+                logger.warning("Батч из %d страниц не оценен", len(pages), exc_info=True)
+                for _, future, _ in requests:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            self._counters["batches"] += 1
+            self._counters["pages"] += len(pages)
+            start = 0
+            for request_pages, future, _ in requests:
+                if not future.done():
+                    future.set_result(scores[start:start + len(request_pages)])
+                start += len(request_pages)
+
+    def metrics(self):
+        """
+        Глубина очереди, запросы в работе и время ожидания в очереди к модели;
+        при включенных замерах - еще и отчет по стадиям (instrumentation.report).
+        """
+        waits_ms = np.array(self._waits) * 1000
+        metrics = {
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "queue_capacity": self._max_queue,
+            "in_flight": self._in_flight,
+            "max_in_flight": self.max_in_flight,
+            "queue_wait_ms": {
+                "p50": float(np.percentile(waits_ms, 50)) if len(waits_ms) else 0.0,
+                "p99": float(np.percentile(waits_ms, 99)) if len(waits_ms) else 0.0,
+                "max": float(waits_ms.max()) if len(waits_ms) else 0.0,
+            },
+            **self._counters,
+        }
+        if profiling_enabled():
+            metrics["profile"] = report()
+        return metrics
+
+
+async def _handle_http(scorer, reader, writer):
+    """Один HTTP/1.1-запрос на соединение: POST /score или GET /metrics."""
+    status, body, content_type = 200, {}, 'application/json; charset=utf-8'
+    try:
+        request_line = (await reader.readline()).decode('latin-1').split()
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        method, target = (request_line + ['', ''])[:2]
+        path, _, query = target.partition('?')
+        if method == 'GET' and path.rstrip('/') == '/metrics':
+            if 'format=prometheus' in query:
+                body, content_type = to_prometheus(), 'text/plain; version=0.0.4'
+            else:
+                body = scorer.metrics()
+        elif method == 'POST' and path.rstrip('/') == '/score':
+            payload = await reader.readexactly(int(headers.get('content-length', 0)))
+            try:
+                body = {"scores": await scorer.score(payload)}
+            except asyncio.TimeoutError:
+                status, body = 504, {"error": "timeout"}
+            except ValueError as e:
+                status, body = 400, {"error": str(e)}
+            except Exception as e:
+                logger.warning("Ошибка оценки запроса", exc_info=True)
+                status, body = 500, {"error": str(e)}
+        else:
+            status, body = 404, {"error": "not found"}
+    except (asyncio.IncompleteReadError, ValueError):
+        status, body = 400, {"error": "bad request"}
+
+    if isinstance(body, str):
+        payload = body.encode('utf-8')
+    else:
+        payload = json.dumps(body, ensure_ascii=False).encode('utf-8')
+    reason = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 500: 'Internal Server Error', 504: 'Gateway Timeout'}
+    writer.write(
+        f"HTTP/1.1 {status} {reason[status]}\r\n"
+        f"Content-Type: {content_type}\r\n"
+        f"Content-Length: {len(payload)}\r\n"
+        f"Connection: close\r\n\r\n".encode('latin-1') + payload
+    )
+    try:
+        await writer.drain()
+    finally:
+        writer.close()
+
+
+async def serve_async(scorer, host='127.0.0.1', port=8080):
+    """Асинхронный HTTP-сервер поверх AsyncScorer; работает до отмены."""
+    await scorer.start()
+    server = await asyncio.start_server(lambda r, w: _handle_http(scorer, r, w), host, port)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await scorer.close()
@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+
+"""
+Варианты самовнимания для длинных последовательностей элементов.
+
+WindowedSelfAttention - локальное внимание по порядку документа: элементы
+делятся на окна по window_size, и каждое окно видит себя и предыдущее.
+При обходе DOM в глубину поддерево идет подряд, поэтому окно покрывает
+родителя, соседей и детей; дополнительно каждая голова штрафует пары
+элементов за разницу глубин (обучаемый наклон). Стоимость O(N * window).
+
+LinearSelfAttention - ядровое линейное внимание (phi(x) = elu(x) + 1):
+softmax(QK^T)V аппроксимируется как phi(Q) (phi(K)^T V). Стоимость O(N * d^2).
+
+Оба слоя учитывают маску паддинга (PaddingMask): замаскированные элементы
+не участвуют как ключи и значения.
+"""
+from tensorflow import keras
+from tensorflow.keras import layers
+
+_NEG_INF = -1e9
+
+
+def _key_mask(mask, inputs):
+    """Маска ключей (B, N) в float; без маски - все элементы настоящие."""
+    if isinstance(mask, (list, tuple)):
+        mask = mask[0]
+    if mask is None:
+        return keras.ops.ones(keras.ops.shape(inputs)[:2], dtype=inputs.dtype)
+    return keras.ops.cast(mask, inputs.dtype)
+
+
+@keras.utils.register_keras_serializable(package="ui_ux_evaluator")
+class WindowedSelfAttention(layers.Layer):
+    """
+    Блочно-локальное самовнимание с поправкой на разницу глубин в DOM.
+
+    Входы: [values (B, N, D), numeric (B, N, F)] - глубина элемента берется
+    из столбца depth_index сырых числовых признаков.
+    """
+
+    def __init__(self, num_heads, key_dim, window_size=64, depth_index=None, **kwargs):
+        super().__init__(**kwargs)
+        self.num_heads = num_heads
+        self.key_dim = key_dim
+        self.window_size = window_size
+        self.depth_index = depth_index
+        self.supports_masking = True
+
+    def build(self, input_shape):
+        model_dim = input_shape[0][-1]
+        projection = (self.num_heads, self.key_dim)
+        self.query_dense = layers.EinsumDense("bnd,dhk->bnhk", output_shape=(None,) + projection, name="query")
+        self.key_dense = layers.EinsumDense("bnd,dhk->bnhk", output_shape=(None,) + projection, name="key")
+        self.value_dense = layers.EinsumDense("bnd,dhk->bnhk", output_shape=(None,) + projection, name="value")
+        self.output_dense = layers.EinsumDense("bnhk,hkd->bnd", output_shape=(None, model_dim), name="attention_output")
+        for dense in (self.query_dense, self.key_dense, self.value_dense):
+            dense.build(input_shape[0])
+        self.output_dense.build((None, None) + projection)
+        if self.depth_index is not None:
+            self.depth_slope = self.add_weight(name="depth_slope", shape=(self.num_heads,), initializer="zeros")
+        super().build(input_shape)
+
+    def _to_windows(self, tensor, num_windows):
+        """(B, Np, ...) -> (B, W_count, window, ...)."""
+        shape = keras.ops.shape(tensor)
+        return keras.ops.reshape(tensor, (shape[0], num_windows, self.window_size) + tuple(tensor.shape[2:]))
+
+    def _with_previous(self, windows):
+        """К каждому окну приписывается предыдущее: (B, W_count, 2 * window, ...)."""
+        previous = keras.ops.pad(windows, [[0, 0], [1, 0]] + [[0, 0]] * (len(windows.shape) - 2))[:, :-1]
+        return keras.ops.concatenate([previous, windows], axis=2)
+
+    def call(self, inputs, mask=None):
+        values, numeric = inputs
+        seq_len = keras.ops.shape(values)[1]
+        pad = (self.window_size - seq_len % self.window_size) % self.window_size
+        num_windows = (seq_len + pad) // self.window_size
+
+        def pad_sequence(tensor):
+            return keras.ops.pad(tensor, [[0, 0], [0, pad]] + [[0, 0]] * (len(tensor.shape) - 2))
+
+        key_mask = pad_sequence(_key_mask(mask, values))
+        padded = pad_sequence(values)
+
+        query = self._to_windows(self.query_dense(padded), num_windows)
+        key = self._with_previous(self._to_windows(self.key_dense(padded), num_windows))
+        value = self._with_previous(self._to_windows(self.value_dense(padded), num_windows))
+        key_mask = self._with_previous(self._to_windows(key_mask, num_windows))
+
+        # (B, W_count, heads, window, 2 * window)
+        scores = keras.ops.einsum("bwqhk,bwchk->bwhqc", query, key) / (self.key_dim ** 0.5)
+        if self.depth_index is not None:
+            depth = self._to_windows(pad_sequence(numeric[..., self.depth_index]), num_windows)
+            depth_gap = keras.ops.abs(
+                keras.ops.expand_dims(depth, -1) - keras.ops.expand_dims(self._with_previous(depth), -2)
+            )
+            scores = scores - keras.ops.reshape(self.depth_slope, (-1, 1, 1)) * keras.ops.expand_dims(depth_gap, 2)
+        scores = scores + (1.0 - keras.ops.expand_dims(keras.ops.expand_dims(key_mask, 2), 2)) * _NEG_INF
+
+        weights = keras.ops.softmax(scores, axis=-1)
+        attended = keras.ops.einsum("bwhqc,bwchk->bwqhk", weights, value)
+        attended = keras.ops.reshape(
+            attended, (keras.ops.shape(values)[0], num_windows * self.window_size, self.num_heads, self.key_dim)
+        )[:, :seq_len]
+        return self.output_dense(attended)
+
+    def compute_mask(self, inputs, mask=None):
+        return mask[0] if isinstance(mask, (list, tuple)) else mask
+
+    def compute_output_shape(self, input_shape):
+        return input_shape[0]
+
+    def get_config(self):
+        return {
+            **super().get_config(),
+            "num_heads": self.num_heads,
+            "key_dim": self.key_dim,
+            "window_size": self.window_size,
+            "depth_index": self.depth_index,
+        }
+
+
+@keras.utils.register_keras_serializable(package="ui_ux_evaluator")
+class LinearSelfAttention(layers.Layer):
+    """Линейное (ядровое) самовнимание по всей странице."""
+
+    def __init__(self, num_heads, key_dim, epsilon=1e-6, **kwargs):
+        super().__init__(**kwargs)
+        self.num_heads = num_heads
+        self.key_dim = key_dim
+        self.epsilon = epsilon
+        self.supports_masking = True
+
+    def build(self, input_shape):
+        model_dim = input_shape[-1]
+        projection = (self.num_heads, self.key_dim)
+        self.query_dense = layers.EinsumDense("bnd,dhk->bnhk", output_shape=(None,) + projection, name="query")
+        self.key_dense = layers.EinsumDense("bnd,dhk->bnhk", output_shape=(None,) + projection, name="key")
+        self.value_dense = layers.EinsumDense("bnd,dhk->bnhk", output_shape=(None,) + projection, name="value")
+        self.output_dense = layers.EinsumDense("bnhk,hkd->bnd", output_shape=(None, model_dim), name="attention_output")
+        for dense in (self.query_dense, self.key_dense, self.value_dense):
+            dense.build(input_shape)
+        self.output_dense.build((None, None) + projection)
+        super().build(input_shape)
+
+    def call(self, inputs, mask=None):
+        key_mask = _key_mask(mask, inputs)
+        # Строки паддинга обнуляются и дальше не участвуют как ключи и значения
+        values = inputs * keras.ops.expand_dims(key_mask, -1)
+        key_mask = keras.ops.expand_dims(keras.ops.expand_dims(key_mask, -1), -1)
+
+        query = keras.ops.elu(self.query_dense(values)) + 1.0
+        key = (keras.ops.elu(self.key_dense(values)) + 1.0) * key_mask
+        value = self.value_dense(values) * key_mask
+
+        key_value = keras.ops.einsum("bnhk,bnhv->bhkv", key, value)
+        normalizer = keras.ops.einsum("bnhk,bhk->bnh", query, keras.ops.sum(key, axis=1))
+        attended = keras.ops.einsum("bnhk,bhkv->bnhv", query, key_value) / (keras.ops.expand_dims(normalizer, -1) + self.epsilon)
+        return self.output_dense(attended)
+
+    def compute_mask(self, inputs, mask=None):
+        return mask
+
+    def compute_output_shape(self, input_shape):
+        return input_shape
+
+    def get_config(self):
+        return {
+            **super().get_config(),
+            "num_heads": self.num_heads,
+            "key_dim": self.key_dim,
+            "epsilon": self.epsilon,
+        }
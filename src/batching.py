@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+
+"""
+Сборка мини-батчей из страниц разной длины.
+Страницы близкой длины группируются в один батч (бакетирование),
+а внутри батча дополняются нулями до общей длины. Строки паддинга
+маскируются в модели слоем PaddingMask.
+"""
+
+import numpy as np
+
+from instrumentation import timer
+
+# Сколько батчей набирается в пул перед сортировкой по длине.
+# Больше пул - меньше паддинга, меньше - больше случайности в составе батчей.
+BUCKET_POOL_BATCHES = 16
+
+
+def pad_batch(samples):
+    """
+    Склеивает страницы в батч, дополняя их нулями до самой длинной.
+
+    Args:
+        samples (list): Словари входов модели (как в load_dataset), по одному на страницу.
+
+    Returns:
+        dict: Тот же набор ключей, массивы формы (B, max_len, ...).
+    """
+    with timer("pad_batch"):
+        max_len = max(len(sample["text_input"]) for sample in samples)
+
+        batch_dict = {}
+        for name, first in samples[0].items():
+            batch = np.zeros((len(samples), max_len) + first.shape[1:], dtype=first.dtype)
+            for i, sample in enumerate(samples):
+                matrix = sample[name]
+                batch[i, :len(matrix)] = matrix
+            batch_dict[name] = batch
+
+    return batch_dict
+
+
+def make_bucketed_batches(lengths, batch_size, shuffle=True, rng=None, pool_batches=BUCKET_POOL_BATCHES):
+    """
+    Разбивает индексы страниц на батчи страниц близкой длины.
+
+    Индексы перемешиваются, делятся на пулы по pool_batches батчей,
+    каждый пул сортируется по длине и режется на батчи; порядок батчей
+    затем снова перемешивается.
+
+    Args:
+        lengths (array-like): Число элементов каждой страницы.
+        batch_size (int): Размер батча.
+        shuffle (bool): Перемешивать страницы и батчи.
+        rng (np.random.Generator, optional): Источник случайности.
+
+    Returns:
+        list: Список массивов индексов страниц.
+    """
+    lengths = np.asarray(lengths)
+    rng = rng or np.random.default_rng()
+
+    indices = np.arange(len(lengths))
+    if shuffle:
+        rng.shuffle(indices)
+
+    pool_size = batch_size * pool_batches
+    batches = []
+    for start in range(0, len(indices), pool_size):
+        pool = indices[start:start + pool_size]
+        pool = pool[np.argsort(lengths[pool], kind='stable')]
+        batches.extend(pool[i:i + batch_size] for i in range(0, len(pool), batch_size))
+
+    if shuffle:
+        rng.shuffle(batches)
+
+    return batches
+
+
+def padding_ratio(lengths, batches):
+    """Доля ячеек паддинга во всех батчах (0 - паддинга нет)."""
+    lengths = np.asarray(lengths)
+    total = sum(len(batch) * lengths[batch].max() for batch in batches)
+    return 1.0 - lengths.sum() / total if total else 0.0
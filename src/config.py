@@ -57,3 +57,48 @@ CATEGORICAL_VOCABULARIES = {
         "left", "right", "center", "justify", "start", "end"
     ]
 }
+
+# Словари категориальных признаков, обучаемые на корпусе (feature_extractor/categorical_vocabulary.py).
+# Значение получает собственный индекс, если встретилось в корпусе не меньше CATEGORICAL_MIN_COUNT раз
+# (значения из CATEGORICAL_VOCABULARIES - всегда), но не больше CATEGORICAL_MAX_VOCABULARY значений
+# на признак. Остальные значения (длинный хвост: пользовательские теги, редкие display)
+# распределяются хешем по CATEGORICAL_HASH_BUCKETS корзинам признака.
+CATEGORICAL_MIN_COUNT = 5
+CATEGORICAL_MAX_VOCABULARY = 256
+CATEGORICAL_HASH_BUCKETS = {
+    "tag": 32,
+    "position": 2,
+    "display": 8,
+    "textAlign": 2
+}
+
+# Политика длины страницы: сколько элементов максимум подается в модель.
+# Внимание в трансформере квадратично по числу элементов, поэтому на гигантских
+# страницах остаются самые важные элементы (см. feature_extractor/element_selection.py).
+# None - без ограничения.
+MAX_PAGE_ELEMENTS = 2048
+
+# Отбрасывать скрытые элементы (display: none, opacity: 0 - свои или у предка)
+# и на страницах в пределах лимита: пользователь их не видит, а в модели они
+# занимают позиции внимания и паддинг батча
+DROP_HIDDEN_ELEMENTS = True
+
+# Интерактивные теги, которые при отборе элементов сохраняются в первую очередь
+INTERACTIVE_TAGS = [
+    "a", "button", "input", "select", "textarea", "option", "label", "form"
+]
+
+# Размерность текстовых признаков: эмбеддинги USE (512) проецируются на первые
+# главные компоненты корпуса (PCA, feature_extractor/text_projection.py) и хранятся
+# во float16. Например, 64 или 128; None - полные 512-мерные векторы float32.
+TEXT_PROJECTION_SIZE = None
+
+# Детерминированные проверки WCAG (wcag_rules.py): минимальный контраст текста
+# (1.4.3: 4.5:1, для крупного текста - 3:1)
+WCAG_MIN_CONTRAST = 4.5
+WCAG_MIN_CONTRAST_LARGE_TEXT = 3.0
+# Отсечение по правилам: страница с оценкой правил не выше RULE_GATE_MAX_SCORE
+# и хотя бы RULE_GATE_MIN_VIOLATIONS элементами с нарушениями получает оценку
+# правил без текстового энкодера и модели (включается явно, см. RuleGate)
+RULE_GATE_MAX_SCORE = 40.0
+RULE_GATE_MIN_VIOLATIONS = 5
@@ -1,78 +1,398 @@
 import json
+import logging
+import multiprocessing
 import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
-from feature_extractor.text_feature_extractor import extract_text_features
+from feature_extractor.dom_stream import load_flat_page
+from feature_extractor.element_selection import apply_length_policy
+from feature_extractor.text_feature_extractor import (
+    extract_text_features, extract_text_features_batch, embed_texts, concatenate_texts,
+    configure_text_projection, TEXT_BATCH_SIZE, VECTOR_SIZE
+)
+from feature_extractor.text_projection import fit_projection, DEFAULT_PROJECTION_PATH
 from feature_extractor.numeric_feature_extractor import extract_numeric_features
 from feature_extractor.color_feature_extractor import extract_color_features
-from feature_extractor.categorical_feature_extractor import extract_categorical_features
-from config import FEATURE_MAPPING
+from feature_extractor.categorical_feature_extractor import (
+    extract_categorical_features, configure_categorical_vocabulary, get_categorical_vocabulary
+)
+from feature_extractor.categorical_vocabulary import VocabularyCounter, DEFAULT_VOCABULARY_PATH
+from config import FEATURE_MAPPING, MAX_PAGE_ELEMENTS, TEXT_PROJECTION_SIZE
+from instrumentation import timer, count
+from normalization import RunningNormalizer
 
+logger = logging.getLogger(__name__)
 
-def load_dataset(dataset_dir=None, labels_file='labels.json'):
-    PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-    if dataset_dir is None:
-        dataset_dir = os.path.join(PROJECT_ROOT, 'dataset')
 
-    labels_path = os.path.join(dataset_dir, labels_file)
+# Сколько страниц векторизуется энкодером за один проход
+TEXT_CHUNK_PAGES = 32
+# Сколько страниц получает процесс-воркер за одну задачу
+WORKER_CHUNK_PAGES = 64
+# Сколько случайных страниц корпуса берется для статистики нормализации числовых признаков
+NORMALIZER_SAMPLE_PAGES = 512
 
-    try:
-        with open(labels_path, 'r', encoding='utf-8') as f:
-            labels = json.load(f)
-    except FileNotFoundError:
-        return [], np.array([])
 
-    X_list = []
-    y_list = []
+def _extract_page_features(flat_page):
+    """Извлекает все признаки страницы, кроме текстовых."""
+    count("pages")
+    count("elements", flat_page["num_elements"])
 
-    for filename, score in labels.items():
-        file_path = os.path.join(dataset_dir, filename)
+    with timer("extract.color"):
+        color_vectors, contrast_vectors = extract_color_features(None, flat_page=flat_page)
 
-        try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                dom_data = json.load(f)
+    with timer("extract.numeric"):
+        numeric_vectors = extract_numeric_features(None, flat_page=flat_page)
+        numeric_vectors = np.concatenate([numeric_vectors, contrast_vectors], axis=1)
 
-            text_vectors = extract_text_features(dom_data)
+    with timer("extract.categorical"):
+        categorical_dict = extract_categorical_features(None, flat_page=flat_page)
 
-            if text_vectors.shape[0] == 0:
-                continue
+    model_input_dict = {
+        "numeric_input": numeric_vectors,
+        "color_input": color_vectors
+    }
+    for cat_name, cat_array in categorical_dict.items():
+        model_input_dict[f"{cat_name}_input"] = cat_array
 
-            num_elements = text_vectors.shape[0]
+    return model_input_dict
 
-            color_vectors, contrast_vectors = extract_color_features(dom_data)
 
-            numeric_vectors = extract_numeric_features(dom_data, normalize=False)
+def _load_page(file_path, max_elements=MAX_PAGE_ELEMENTS):
+    """Читает страницу и применяет к ней политику длины (element_selection)."""
+    flat_page = load_flat_page(file_path)
+    with timer("select_elements"):
+        flat_page = apply_length_policy(flat_page, max_elements)
 
-            if contrast_vectors.shape[0] == numeric_vectors.shape[0]:
-                numeric_vectors = np.concatenate([numeric_vectors, contrast_vectors], axis=1)
+    selection = flat_page.get("selection")
+    if selection is not None:
+        count("elements_dropped", selection["num_source_elements"] - flat_page["num_elements"])
+        # Отбрасывание одних скрытых элементов - обычное дело, о лимите сообщается всегда
+        log = logger.info if selection["dropped_over_limit"] else logger.debug
+        log("%s: оставлено %d из %d элементов (скрытых отброшено: %d, сверх лимита: %d)",
+            os.path.basename(file_path), flat_page["num_elements"], selection["num_source_elements"],
+            selection["dropped_hidden"], selection["dropped_over_limit"])
+    return flat_page
 
-            categorical_dict = extract_categorical_features(dom_data)
 
-            all_shapes_match = True
-            if not (text_vectors.shape[0] == numeric_vectors.shape[0] == color_vectors.shape[0]):
-                all_shapes_match = False
-            for cat_name, cat_array in categorical_dict.items():
-                if cat_array.shape[0] != num_elements:
-                    all_shapes_match = False
+def load_page_features(file_path, text_batch_size=TEXT_BATCH_SIZE, max_elements=MAX_PAGE_ELEMENTS):
+    """
+    Читает одну страницу и извлекает все ее признаки.
 
-            if not all_shapes_match:
-                continue
+    Returns:
+        dict | None: Словарь входов модели или None для страницы без элементов.
+    """
+    flat_page = _load_page(file_path, max_elements)
+    if flat_page["num_elements"] == 0:
+        return None
+
+    text_vectors = extract_text_features(None, flat_page=flat_page, batch_size=text_batch_size)
+    return {"text_input": text_vectors, **_extract_page_features(flat_page)}
+
+
+def iter_page_features(file_paths, text_chunk_pages=TEXT_CHUNK_PAGES, text_batch_size=TEXT_BATCH_SIZE,
+                       num_workers=1, worker_chunk_pages=WORKER_CHUNK_PAGES):
+    """
+    Извлекает признаки страниц из списка файлов.
+    Тексты векторизуются пачками по text_chunk_pages страниц.
+    При num_workers > 1 нетекстовые признаки извлекаются в пуле процессов
+    (см. iter_page_features_parallel).
+
+    Yields:
+        tuple: (позиция файла в file_paths, словарь входов модели).
+               Нечитаемые и пустые страницы пропускаются.
+    """
+    if num_workers > 1:
+        yield from iter_page_features_parallel(file_paths, num_workers, worker_chunk_pages, text_batch_size)
+        return
 
-            model_input_dict = {
-                "text_input": text_vectors,
-                "numeric_input": numeric_vectors,
-                "color_input": color_vectors
-            }
-            for cat_name, cat_array in categorical_dict.items():
-                model_input_dict[f"{cat_name}_input"] = cat_array
+    # Страницы, ожидающие векторизации текста: (позиция, flat_page, признаки)
+    pending = []
 
-            X_list.append(model_input_dict)
-            y_list.append(score)
+    for position, file_path in enumerate(file_paths):
+        try:
+            # Дерево обходится один раз, все экстракторы читают одну плоскую страницу
+            flat_page = _load_page(file_path)
+
+            if flat_page["num_elements"] == 0:
+                continue
+
+            pending.append((position, flat_page, _extract_page_features(flat_page)))
 
         except FileNotFoundError:
+            count("pages_failed")
+            logger.warning("Файл страницы не найден: %s", file_path)
+            continue
+        except Exception:
+            count("pages_failed")
+            logger.warning("Страница пропущена: %s", file_path, exc_info=True)
             continue
-        except Exception as e:
+
+        if len(pending) >= text_chunk_pages:
+            yield from _embed_pending_pages(pending, text_batch_size)
+
+    if pending:
+        yield from _embed_pending_pages(pending, text_batch_size)
+
+
+def _extract_chunk(file_paths, max_elements=MAX_PAGE_ELEMENTS):
+    """
+    Задача процесса-воркера: нетекстовые признаки пачки страниц.
+    Результат возвращается колоночно (по одному склеенному массиву на вход),
+    а не списком словарей, чтобы передача между процессами была дешевой.
+
+    Returns:
+        tuple: (
+            list: позиции успешно прочитанных страниц в file_paths,
+            np.ndarray: смещения границ страниц (P + 1,),
+            dict: {имя входа: склеенный массив},
+            list: строки для текстового энкодера (по одной на элемент)
+        )
+    """
+    positions, pages, texts = [], [], []
+
+    for position, file_path in enumerate(file_paths):
+        try:
+            flat_page = _load_page(file_path, max_elements)
+            if flat_page["num_elements"] == 0:
+                continue
+
+            page_features = _extract_page_features(flat_page)
+        except Exception:
+            count("pages_failed")
+            logger.warning("Страница пропущена: %s", file_path, exc_info=True)
             continue
 
+        positions.append(position)
+        pages.append(page_features)
+        texts.extend(concatenate_texts(flat_page))
+
+    offsets = np.zeros(len(pages) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(page["numeric_input"]) for page in pages])
+    columns = {name: np.concatenate([page[name] for page in pages]) for name in pages[0]} if pages else {}
+
+    return positions, offsets, columns, texts
+
+
+def iter_page_features_parallel(file_paths, num_workers, chunk_pages=WORKER_CHUNK_PAGES,
+                                text_batch_size=TEXT_BATCH_SIZE, max_elements=MAX_PAGE_ELEMENTS):
+    """
+    Извлекает признаки в пуле процессов.
+
+    Числовые, цветовые и категориальные признаки считаются в воркерах
+    (чистый Python, упирается в GIL), а тексты со всех воркеров собираются
+    в главном процессе и векторизуются единственным экземпляром энкодера,
+    пока воркеры обрабатывают следующие пачки.
+
+    Yields:
+        tuple: (позиция файла в file_paths, словарь входов модели) в порядке file_paths.
+    """
+    chunk_starts = range(0, len(file_paths), chunk_pages)
+    # spawn: форк процесса с уже инициализированным TensorFlow небезопасен
+    mp_context = multiprocessing.get_context('spawn')
+
+    # Воркеры индексируют категории тем же словарем, что и главный процесс
+    with ProcessPoolExecutor(max_workers=num_workers, mp_context=mp_context,
+                             initializer=configure_categorical_vocabulary,
+                             initargs=(get_categorical_vocabulary(),)) as executor:
+        pending = deque()
+        chunk_iter = iter(chunk_starts)
+
+        def submit_next():
+            start = next(chunk_iter, None)
+            if start is not None:
+                pending.append((start, executor.submit(_extract_chunk, file_paths[start:start + chunk_pages],
+                                                       max_elements)))
+
+        # Число задач в полете ограничено, чтобы готовые результаты не копились в памяти
+        for _ in range(2 * num_workers):
+            submit_next()
+
+        while pending:
+            start, future = pending.popleft()
+            positions, offsets, columns, texts = future.result()
+            submit_next()
+
+            text_vectors = embed_texts(texts, batch_size=text_batch_size)
+            for i, position in enumerate(positions):
+                page_start, page_end = offsets[i], offsets[i + 1]
+                model_input_dict = {"text_input": text_vectors[page_start:page_end]}
+                for name, column in columns.items():
+                    model_input_dict[name] = column[page_start:page_end]
+                yield start + position, model_input_dict
+
+
+def _embed_pending_pages(pending, text_batch_size):
+    """Векторизует тексты накопленных страниц одним батчем."""
+    flat_pages = [flat_page for _, flat_page, _ in pending]
+    text_matrices = extract_text_features_batch(flat_pages, batch_size=text_batch_size)
+
+    pages = [
+        (position, {"text_input": text_vectors, **page_features})
+        for (position, _, page_features), text_vectors in zip(pending, text_matrices)
+    ]
+    pending.clear()
+    return pages
+
+
+def fit_text_projection(file_paths, size=TEXT_PROJECTION_SIZE, text_batch_size=TEXT_BATCH_SIZE,
+                        max_elements=MAX_PAGE_ELEMENTS):
+    """
+    Обучает PCA-проекцию текстовых эмбеддингов на корпусе.
+    Каждая уникальная непустая строка корпуса учитывается один раз.
+
+    Returns:
+        TextProjection: Проекция на size главных компонент.
+    """
+    seen = set()
+
+    def vector_batches():
+        chunk = []
+        for file_path in file_paths:
+            try:
+                flat_page = _load_page(file_path, max_elements)
+            except Exception:
+                logger.warning("Страница пропущена при обучении проекции: %s", file_path, exc_info=True)
+                continue
+            for text in concatenate_texts(flat_page):
+                if text and text not in seen:
+                    seen.add(text)
+                    chunk.append(text)
+            if len(chunk) >= text_batch_size:
+                yield embed_texts(chunk, batch_size=text_batch_size, project=False)
+                chunk = []
+        if chunk:
+            yield embed_texts(chunk, batch_size=text_batch_size, project=False)
+
+    projection = fit_projection(vector_batches(), size, VECTOR_SIZE)
+    logger.info("Проекция текстов %d -> %d обучена на %d строках, сохранено %.1f%% дисперсии.",
+                VECTOR_SIZE, projection.size, len(seen), 100 * projection.explained_variance_ratio)
+    return projection
+
+
+def ensure_text_projection(dataset_dir=None, labels_file='labels.json', refit=False):
+    """
+    Готовит проекцию текстов для TEXT_PROJECTION_SIZE: загружает сохраненную
+    или обучает на датасете и сохраняет в DEFAULT_PROJECTION_PATH.
+
+    Returns:
+        TextProjection | None: None, если проекция выключена.
+    """
+    if TEXT_PROJECTION_SIZE is None:
+        return None
+
+    if not refit and os.path.exists(DEFAULT_PROJECTION_PATH):
+        return configure_text_projection(DEFAULT_PROJECTION_PATH)
+
+    if dataset_dir is None:
+        dataset_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'dataset')
+    with open(os.path.join(dataset_dir, labels_file), 'r', encoding='utf-8') as f:
+        labels = json.load(f)
+
+    projection = fit_text_projection([os.path.join(dataset_dir, filename) for filename in labels])
+    projection.save(DEFAULT_PROJECTION_PATH)
+    return configure_text_projection(projection)
+
+
+def fit_numeric_normalizer(file_paths, num_features, sample_pages=NORMALIZER_SAMPLE_PAGES, seed=0,
+                           max_elements=MAX_PAGE_ELEMENTS):
+    """
+    Статистика нормализации числовых признаков по случайной выборке страниц корпуса:
+    потоковому обучению не нужен полный проход извлечения до первого батча.
+    Тексты не векторизуются. sample_pages=None - все страницы.
+
+    Returns:
+        RunningNormalizer: Накопленные среднее и дисперсия.
+    """
+    if sample_pages is not None and sample_pages < len(file_paths):
+        sample = np.sort(np.random.default_rng(seed).choice(len(file_paths), size=sample_pages, replace=False))
+        file_paths = [file_paths[i] for i in sample]
+
+    normalizer = RunningNormalizer(num_features)
+    for file_path in file_paths:
+        try:
+            flat_page = _load_page(file_path, max_elements)
+            if flat_page["num_elements"]:
+                normalizer.update(_extract_page_features(flat_page)["numeric_input"])
+        except Exception:
+            logger.warning("Страница пропущена при обучении нормализации: %s", file_path, exc_info=True)
+
+    logger.info("Нормализация числовых признаков: %d элементов с %d страниц.", normalizer.count, len(file_paths))
+    return normalizer
+
+
+def fit_categorical_vocabulary(file_paths, max_elements=MAX_PAGE_ELEMENTS):
+    """
+    Обучает словари категориальных признаков на корпусе: частоты значений
+    по всем отобранным элементам, отсечка CATEGORICAL_MIN_COUNT / CATEGORICAL_MAX_VOCABULARY.
+
+    Returns:
+        CategoricalVocabulary: Словарь с хеш-корзинами CATEGORICAL_HASH_BUCKETS.
+    """
+    counter = VocabularyCounter(FEATURE_MAPPING["categorical"])
+    for file_path in file_paths:
+        try:
+            counter.update(_load_page(file_path, max_elements))
+        except Exception:
+            logger.warning("Страница пропущена при обучении словаря: %s", file_path, exc_info=True)
+
+    vocabulary = counter.to_vocabulary()
+    for name in FEATURE_MAPPING["categorical"]:
+        counts = counter.counts[name]
+        in_vocabulary = sum(frequency for value, frequency in counts.items() if value in vocabulary.values[name])
+        logger.info("Словарь %s: %d значений + %d корзин, покрывает %.1f%% элементов (различных значений: %d).",
+                    name, len(vocabulary.values[name]), vocabulary.num_buckets[name],
+                    100 * in_vocabulary / max(sum(counts.values()), 1), len(counts))
+    return vocabulary
+
+
+def ensure_categorical_vocabulary(dataset_dir=None, labels_file='labels.json', refit=False):
+    """
+    Готовит словари категориальных признаков: загружает сохраненные
+    или обучает на датасете и сохраняет в DEFAULT_VOCABULARY_PATH.
+
+    Returns:
+        CategoricalVocabulary: Словарь, заданный для процесса.
+    """
+    if not refit and os.path.exists(DEFAULT_VOCABULARY_PATH):
+        return configure_categorical_vocabulary(DEFAULT_VOCABULARY_PATH)
+
+    if dataset_dir is None:
+        dataset_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'dataset')
+    with open(os.path.join(dataset_dir, labels_file), 'r', encoding='utf-8') as f:
+        labels = json.load(f)
+
+    vocabulary = fit_categorical_vocabulary([os.path.join(dataset_dir, filename) for filename in labels])
+    vocabulary.save(DEFAULT_VOCABULARY_PATH)
+    return configure_categorical_vocabulary(vocabulary)
+
+
+def load_dataset(dataset_dir=None, labels_file='labels.json',
+                 text_chunk_pages=TEXT_CHUNK_PAGES, text_batch_size=TEXT_BATCH_SIZE, num_workers=1):
+    PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    if dataset_dir is None:
+        dataset_dir = os.path.join(PROJECT_ROOT, 'dataset')
+
+    labels_path = os.path.join(dataset_dir, labels_file)
+
+    try:
+        with open(labels_path, 'r', encoding='utf-8') as f:
+            labels = json.load(f)
+    except FileNotFoundError:
+        logger.warning("Файл разметки не найден: %s", labels_path)
+        return [], np.array([])
+
+    file_paths = [os.path.join(dataset_dir, filename) for filename in labels]
+    scores = list(labels.values())
+
+    X_list = []
+    y_list = []
+
+    for position, model_input_dict in iter_page_features(file_paths, text_chunk_pages, text_batch_size,
+                                                         num_workers=num_workers):
+        X_list.append(model_input_dict)
+        y_list.append(scores[position])
+
     if not X_list:
         return [], np.array([])
 
@@ -82,6 +402,7 @@ def load_dataset(dataset_dir=None, labels_file='labels.json'):
 if __name__ == '__main__':
     from feature_extractor.text_feature_extractor import setup_model_cache
 
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
     setup_model_cache()
 
     X_data, y_data = load_dataset()
@@ -1,5 +1,5 @@
 from tensorflow.keras import layers
-from config import CATEGORICAL_VOCABULARIES
+from feature_extractor.categorical_feature_extractor import get_categorical_vocabulary
 
 EMBEDDING_DIMS = {
     "tag": 16,
@@ -9,11 +9,14 @@ EMBEDDING_DIMS = {
 }
 
 
-def create_embeddings(categorical_inputs):
+def create_embeddings(categorical_inputs, vocabulary=None):
+    # Размер словаря - по сохраненному словарю (значения + хеш-корзины), см. categorical_vocabulary.py
+    if vocabulary is None:
+        vocabulary = get_categorical_vocabulary()
     embedding_vectors = []
 
     for name, input_layer in categorical_inputs.items():
-        vocab_size = len(CATEGORICAL_VOCABULARIES[name]) + 1
+        vocab_size = vocabulary.size(name)
         embedding_dim = EMBEDDING_DIMS.get(name, 8)
 
         embedding = layers.Embedding(
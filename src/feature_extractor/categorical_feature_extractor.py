@@ -4,89 +4,74 @@
 Модуль для извлечения категориальных признаков.
 Преобразует строковые значения ('div', 'block') в числовые индексы
 для последующей подачи в Embedding-слои.
+
+Индексы берутся из словаря процесса (categorical_vocabulary.py): обученного
+на корпусе и сохраненного рядом с моделью, а без него - из config.py.
 """
 
-import numpy as np
+import logging
 import os
-import sys
+import threading
 
-# Добавляем корень проекта в sys.path для импорта config
-PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-if PROJECT_ROOT not in sys.path:
-    sys.path.append(PROJECT_ROOT)
+from config import FEATURE_MAPPING
+from feature_extractor.categorical_vocabulary import CategoricalVocabulary, DEFAULT_VOCABULARY_PATH, PAD_INDEX
+from feature_extractor.dom_flattener import flatten_dom
 
-from src.config import FEATURE_MAPPING, CATEGORICAL_VOCABULARIES
+logger = logging.getLogger(__name__)
 
+# Индекс для 'UNK' (Unknown): пустые значения, а при выключенных корзинах - и значения вне словаря
+UNK_INDEX = PAD_INDEX
 
-def _build_vocab_map(vocab_list):
-    """
-    Создает словарь {'value': index} из списка.
-    Индекс 0 зарезервирован для 'UNK' (неизвестное значение).
-    """
-    return {value: i + 1 for i, value in enumerate(vocab_list)}
+_VOCABULARY = {"vocabulary": None}
+_VOCABULARY_LOCK = threading.Lock()
 
 
-# Создаем словари для всех категориальных признаков
-VOCAB_MAPS = {
-    key: _build_vocab_map(CATEGORICAL_VOCABULARIES[key])
-    for key in FEATURE_MAPPING.get("categorical", [])
-}
-# Индекс для 'UNK' (Unknown)
-UNK_INDEX = 0
+def configure_categorical_vocabulary(vocabulary):
+    """Задает словарь процесса: CategoricalVocabulary или путь к .json."""
+    if isinstance(vocabulary, str):
+        vocabulary = CategoricalVocabulary.load(vocabulary)
+    with _VOCABULARY_LOCK:
+        _VOCABULARY["vocabulary"] = vocabulary
+    return vocabulary
 
 
-def _flatten_and_extract_cats(elements):
+def get_categorical_vocabulary():
     """
-    Рекурсивно обходит DOM-дерево, извлекая категориальные признаки (индексы).
+    Словарь процесса. Без явной настройки загружается из DEFAULT_VOCABULARY_PATH,
+    а если файла нет - строится по CATEGORICAL_VOCABULARIES из config.py.
     """
-    all_features = []
-    categorical_keys = FEATURE_MAPPING.get("categorical", [])
-
-    for element in elements:
-        features = {}
-        for key in categorical_keys:
-            value = str(element.get(key, "")).lower().strip()
-            # Получаем индекс из словаря или UNK_INDEX, если значение не найдено
-            features[key] = VOCAB_MAPS[key].get(value, UNK_INDEX)
-
-        all_features.append(features)
-
-        # Рекурсивный вызов для дочерних элементов
-        children = element.get("children", [])
-        if children:
-            all_features.extend(_flatten_and_extract_cats(children))
+    with _VOCABULARY_LOCK:
+        if _VOCABULARY["vocabulary"] is None:
+            if os.path.exists(DEFAULT_VOCABULARY_PATH):
+                _VOCABULARY["vocabulary"] = CategoricalVocabulary.load(DEFAULT_VOCABULARY_PATH)
+            else:
+                _VOCABULARY["vocabulary"] = CategoricalVocabulary.from_config()
+        return _VOCABULARY["vocabulary"]
 
-    return all_features
 
-
-def extract_categorical_features(json_data):
+def extract_categorical_features(json_data, flat_page=None, vocabulary=None):
     """
     Извлекает и индексирует категориальные признаки из JSON-данных.
 
     Args:
         json_data (dict): Словарь с данными о DOM-дереве.
+        flat_page (dict, optional): Уже развернутая страница (см. flatten_dom).
+        vocabulary (CategoricalVocabulary, optional): Словарь; по умолчанию - словарь процесса.
 
     Returns:
         dict: Словарь, где ключ - имя признака (e.g., 'tag'),
-              а значение - np.ndarray (N, 1) с индексами.
+              а значение - np.ndarray (N, 1) int32 с индексами.
     """
-    elements = json_data.get("elements", [])
-    if not elements:
-        return {}
-
-    print("Извлечение категориальных признаков (индексация)...")
+    if flat_page is None:
+        flat_page = flatten_dom(json_data)
 
-    flat_features_list = _flatten_and_extract_cats(elements)
-
-    # Транспонирование списка словарей в словарь списков
-    feature_dict = {key: [] for key in FEATURE_MAPPING.get("categorical", [])}
-    for item in flat_features_list:
-        for key in feature_dict.keys():
-            feature_dict[key].append(item[key])
+    if flat_page["num_elements"] == 0:
+        return {}
 
-    # Преобразование в numpy-массивы (N, 1)
-    for key in feature_dict.keys():
-        feature_dict[key] = np.array(feature_dict[key], dtype=np.int32).reshape(-1, 1)
+    if vocabulary is None:
+        vocabulary = get_categorical_vocabulary()
 
-    print("Словари категориальных признаков созданы.")
-    return feature_dict
\ No newline at end of file
+    return {
+        key: vocabulary.lookup(key, flat_page["columns"][key])
+        for key in FEATURE_MAPPING.get("categorical", [])
+    }
@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+
+"""
+Словари категориальных признаков, обученные на корпусе.
+
+Раскладка индексов признака:
+    0                     - пустое значение и строки паддинга;
+    1 .. V                - значения словаря (сначала из CATEGORICAL_VOCABULARIES,
+                            затем выученные на корпусе по убыванию частоты);
+    V + 1 .. V + B        - хеш-корзины для значений вне словаря.
+
+Корзина выбирается по crc32 нормализованной строки, а не по hash(): индекс
+должен совпадать между процессами и запусками. Размер Embedding-слоев
+(embedding_layers.py) берется из словаря, а при сохранении модели словарь
+записывается рядом с ней (model_artifacts.py).
+"""
+
+import hashlib
+import json
+import os
+import zlib
+from collections import Counter
+
+import numpy as np
+
+from config import (
+    CATEGORICAL_VOCABULARIES, CATEGORICAL_MIN_COUNT, CATEGORICAL_MAX_VOCABULARY, CATEGORICAL_HASH_BUCKETS
+)
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+DEFAULT_VOCABULARY_PATH = os.path.join(PROJECT_ROOT, 'categorical_vocabulary.json')
+
+# Индекс пустого значения и паддинга
+PAD_INDEX = 0
+# Сколько различных сырых значений признака запоминается для повторного поиска
+MEMO_LIMIT = 65536
+
+
+def normalize_value(value):
+    """Сырое значение атрибута -> строка словаря ('' для отсутствующего)."""
+    return "" if value is None else str(value).lower().strip()
+
+
+class _IndexMemo(dict):
+    """Сырое значение -> индекс; промах вычисляется один раз через словарь и корзины."""
+
+    def __init__(self, index_of):
+        super().__init__()
+        self._index_of = index_of
+
+    def __missing__(self, value):
+        index = self._index_of(normalize_value(value))
+        if len(self) >= MEMO_LIMIT:
+            self.clear()
+        try:
+            self[value] = index
+        except TypeError:
+            # Нехешируемое значение (список, объект) не запоминается
+            pass
+        return index
+
+
+class CategoricalVocabulary:
+    """
+    Словари и число хеш-корзин для каждого категориального признака.
+
+    Args:
+        values (dict): {признак: список значений}; значение i получает индекс i + 1.
+        num_buckets (dict): {признак: число хеш-корзин}; 0 - значения вне словаря получают PAD_INDEX.
+    """
+
+    def __init__(self, values, num_buckets=None):
+        num_buckets = num_buckets or {}
+        self.values = {name: list(vocabulary) for name, vocabulary in values.items()}
+        self.num_buckets = {name: int(num_buckets.get(name, 0)) for name in self.values}
+        self._index = {
+            name: {value: i + 1 for i, value in enumerate(vocabulary)}
+            for name, vocabulary in self.values.items()
+        }
+        self._memos = {}
+        self._fingerprint = None
+
+    @classmethod
+    def from_config(cls):
+        """Словарь без обучения: списки CATEGORICAL_VOCABULARIES и корзины CATEGORICAL_HASH_BUCKETS."""
+        return cls(CATEGORICAL_VOCABULARIES, CATEGORICAL_HASH_BUCKETS)
+
+    def size(self, name):
+        """Число индексов признака (input_dim Embedding-слоя)."""
+        return 1 + len(self.values[name]) + self.num_buckets[name]
+
+    def index_of(self, name, value):
+        """Индекс нормализованного значения признака name."""
+        index = self._index[name].get(value)
+        if index is not None:
+            return index
+        num_buckets = self.num_buckets[name]
+        if not value or num_buckets == 0:
+            return PAD_INDEX
+        return 1 + len(self.values[name]) + zlib.crc32(value.encode('utf-8')) % num_buckets
+
+    def lookup(self, name, column):
+        """
+        Столбец сырых значений -> индексы (N, 1) int32.
+        Каждое различное значение нормализуется и ищется один раз.
+        """
+        memo = self._memos.get(name)
+        if memo is None:
+            memo = self._memos[name] = _IndexMemo(lambda value: self.index_of(name, value))
+        try:
+            indices = np.fromiter(map(memo.__getitem__, column), dtype=np.int32, count=len(column))
+        except TypeError:
+            # В столбце есть нехешируемые значения: поиск без кэша
+            indices = np.fromiter((self.index_of(name, normalize_value(value)) for value in column),
+                                  dtype=np.int32, count=len(column))
+        return indices.reshape(-1, 1)
+
+    def fingerprint(self):
+        """Короткий хеш словарей и корзин: часть отпечатка хранилища признаков."""
+        if self._fingerprint is None:
+            payload = json.dumps({"values": self.values, "num_buckets": self.num_buckets}, sort_keys=True)
+            self._fingerprint = hashlib.sha1(payload.encode('utf-8')).hexdigest()[:16]
+        return self._fingerprint
+
+    def to_dict(self):
+        return {"values": self.values, "num_buckets": self.num_buckets}
+
+    def save(self, path=DEFAULT_VOCABULARY_PATH):
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["values"], data.get("num_buckets"))
+
+    @classmethod
+    def load(cls, path=DEFAULT_VOCABULARY_PATH):
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls.from_dict(json.load(f))
+
+    def __getstate__(self):
+        # В процессы-воркеры передаются только словари; кэши поиска строятся заново
+        return self.to_dict()
+
+    def __setstate__(self, state):
+        self.__init__(state["values"], state["num_buckets"])
+
+
+class VocabularyCounter:
+    """
+    Частоты нормализованных значений категориальных признаков по корпусу.
+    Частичные счетчики шардов объединяются через merge.
+    """
+
+    def __init__(self, names):
+        self.counts = {name: Counter() for name in names}
+
+    def update(self, flat_page):
+        for name, counter in self.counts.items():
+            counter.update(map(normalize_value, flat_page["columns"][name]))
+        return self
+
+    def merge(self, other):
+        for name, counter in self.counts.items():
+            counter.update(other.counts[name])
+        return self
+
+    def to_vocabulary(self, min_count=CATEGORICAL_MIN_COUNT, max_size=CATEGORICAL_MAX_VOCABULARY,
+                      num_buckets=CATEGORICAL_HASH_BUCKETS):
+        """
+        Словарь по частотам: значения CATEGORICAL_VOCABULARIES, затем значения корпуса
+        с частотой не меньше min_count (по убыванию частоты, при равенстве - по алфавиту),
+        всего не больше max_size на признак.
+        """
+        values = {}
+        for name, counter in self.counts.items():
+            vocabulary = list(CATEGORICAL_VOCABULARIES.get(name, []))[:max_size]
+            known = set(vocabulary)
+            frequent = sorted(
+                (value for value, frequency in counter.items()
+                 if value and value not in known and frequency >= min_count),
+                key=lambda value: (-counter[value], value)
+            )
+            values[name] = vocabulary + frequent[:max_size - len(vocabulary)]
+        return CategoricalVocabulary(values, num_buckets)
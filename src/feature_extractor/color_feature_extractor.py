@@ -3,110 +3,174 @@
 """
 Модуль для извлечения и обработки цветовых признаков (color, backgroundColor)
 и расчета контрастности WCAG.
+
+Строки цветов разбираются через мемоизированную таблицу строка -> RGBA
+(страницы используют небольшой набор цветов), а яркость и контрастность
+считаются сразу для всех элементов страницы операциями над массивами.
 """
 
+import logging
 import numpy as np
 import re
+from functools import lru_cache
+from feature_extractor.dom_flattener import flatten_dom, encode_column
+
+logger = logging.getLogger(__name__)
+
+# Цвет по умолчанию (непрозрачный черный): для отсутствующих и нераспознанных значений
+DEFAULT_RGBA = (0.0, 0.0, 0.0, 1.0)
+
+# Именованные цвета CSS, встречающиеся в вычисленных стилях и разметке
+NAMED_COLORS = {
+    "black": (0, 0, 0), "white": (255, 255, 255), "red": (255, 0, 0),
+    "green": (0, 128, 0), "blue": (0, 0, 255), "yellow": (255, 255, 0),
+    "gray": (128, 128, 128), "grey": (128, 128, 128), "silver": (192, 192, 192),
+    "maroon": (128, 0, 0), "purple": (128, 0, 128), "fuchsia": (255, 0, 255),
+    "magenta": (255, 0, 255), "lime": (0, 255, 0), "olive": (128, 128, 0),
+    "navy": (0, 0, 128), "teal": (0, 128, 128), "aqua": (0, 255, 255),
+    "cyan": (0, 255, 255), "orange": (255, 165, 0), "darkgray": (169, 169, 169),
+    "darkgrey": (169, 169, 169), "lightgray": (211, 211, 211), "lightgrey": (211, 211, 211),
+    "dimgray": (105, 105, 105), "dimgrey": (105, 105, 105), "whitesmoke": (245, 245, 245),
+    "gainsboro": (220, 220, 220), "darkblue": (0, 0, 139), "darkred": (139, 0, 0),
+    "darkgreen": (0, 100, 0), "brown": (165, 42, 42), "pink": (255, 192, 203),
+    "gold": (255, 215, 0), "indigo": (75, 0, 130), "violet": (238, 130, 238),
+}
+
+# Число канала: 12, 12.5, .5 (но не "1..2" или "."), с необязательным %
+_CHANNEL = r'((?:\d+(?:\.\d*)?|\.\d+)%?)'
+_RGB_FUNCTION_RE = re.compile(
+    rf'rgba?\(\s*{_CHANNEL}[\s,]+{_CHANNEL}[\s,]+{_CHANNEL}(?:[\s,/]+{_CHANNEL})?\s*\)'
+)
+_HEX_RE = re.compile(r'#([0-9a-f]{3,8})')
+
+
+def _parse_channel(value, scale):
+    """Разбирает канал rgb()/альфу: число или процент."""
+    if value.endswith('%'):
+        return float(value[:-1]) * scale / 100.0
+    return float(value)
+
+
+def _parse_color(color_str):
+    """
+    Разбирает строку цвета CSS в кортеж (r, g, b, a): r, g, b в [0, 255], a в [0, 1].
+    Поддерживаются rgb()/rgba(), #rgb, #rgba, #rrggbb, #rrggbbaa,
+    'transparent' и именованные цвета. Не строки (None, числа, списки, словари)
+    и нераспознанные строки (в том числе с некорректными числами) дают DEFAULT_RGBA.
+    """
+    if not isinstance(color_str, str):
+        return DEFAULT_RGBA
+    return _parse_color_string(color_str)
 
 
-def _parse_rgb(color_str):
-    """Парсит 'rgb(r, g, b)' или 'rgba(r, g, b, a)' в список [r, g, b]."""
-    if not isinstance(color_str, str):
-        return [0, 0, 0]  # По умолчанию черный
+@lru_cache(maxsize=4096)
+def _parse_color_string(color_str):
+    """Разбор строки цвета; кэшируется только по строкам."""
+    value = color_str.strip().lower()
 
-    match = re.search(r'rgb\((\d+),\s*(\d+),\s*(\d+)\)', color_str.lower())
+    match = _RGB_FUNCTION_RE.search(value)
     if match:
-        return [int(c) for c in match.groups()]
+        r, g, b, alpha = match.groups()
+        return (
+            min(_parse_channel(r, 255.0), 255.0),
+            min(_parse_channel(g, 255.0), 255.0),
+            min(_parse_channel(b, 255.0), 255.0),
+            min(_parse_channel(alpha, 1.0), 1.0) if alpha is not None else 1.0,
+        )
+
+    match = _HEX_RE.fullmatch(value)
+    if match and len(match.group(1)) in (3, 4, 6, 8):
+        digits = match.group(1)
+        if len(digits) in (3, 4):
+            digits = ''.join(c * 2 for c in digits)
+        channels = [int(digits[i:i + 2], 16) for i in range(0, len(digits), 2)]
+        alpha = channels[3] / 255.0 if len(channels) == 4 else 1.0
+        return (float(channels[0]), float(channels[1]), float(channels[2]), alpha)
+
+    if value == 'transparent':
+        return (0.0, 0.0, 0.0, 0.0)
 
-    match_rgba = re.search(r'rgba\((\d+),\s*(\d+),\s*(\d+),.*?\)', color_str.lower())
-    if match_rgba:
-        return [int(c) for c in match_rgba.groups()]
+    if value in NAMED_COLORS:
+        return tuple(float(c) for c in NAMED_COLORS[value]) + (1.0,)
 
-    # Можно добавить обработку hex, 'white', 'black' и т.д.
-    # Для простоты пока оставляем только rgb
-    if color_str == 'transparent':
-        return [0, 0, 0]  # Не совсем корректно, но нужно для расчета
+    return DEFAULT_RGBA
 
-    return [0, 0, 0]  # По умолчанию черный
 
+def _parse_color_column(column):
+    """Колонка строк цветов -> матрица (N, 4) float32 [r, g, b, a]; каждый различный цвет разбирается один раз."""
+    index, values = encode_column(column)
+    table = np.empty((len(values), 4), dtype=np.float32)
+    table[:] = [_parse_color(value) for value in values]
+    return table[index]
 
-def _get_luminance(r, g, b):
-    """Рассчитывает относительную яркость (luminance) для sRGB."""
+
+def _get_luminance(rgb):
+    """Относительная яркость (luminance) sRGB для массива (..., 3) в [0, 255]."""
     # Нормализация [0, 255] -> [0, 1]
-    rgb = np.array([r, g, b]) / 255.0
+    rgb = np.asarray(rgb, dtype=np.float32) / 255.0
 
     # Применение гамма-коррекции
     rgb = np.where(rgb <= 0.03928, rgb / 12.92, ((rgb + 0.055) / 1.055) ** 2.4)
 
     # Формула яркости WCAG
-    return 0.2126 * rgb[0] + 0.7152 * rgb[1] + 0.0722 * rgb[2]
+    return rgb @ np.array([0.2126, 0.7152, 0.0722], dtype=np.float32)
 
 
 def _get_contrast_ratio(rgb1, rgb2):
-    """Рассчитывает коэффициент контрастности WCAG между двумя RGB-цветами."""
-    try:
-        lum1 = _get_luminance(*rgb1)
-        lum2 = _get_luminance(*rgb2)
-
-        if lum1 > lum2:
-            return (lum1 + 0.05) / (lum2 + 0.05)
-        else:
-            return (lum2 + 0.05) / (lum1 + 0.05)
-    except Exception:
-        return 1.0  # Минимальный контраст в случае ошибки
+    """Коэффициент контрастности WCAG между массивами цветов (..., 3)."""
+    lum1 = _get_luminance(rgb1)
+    lum2 = _get_luminance(rgb2)
+    return (np.maximum(lum1, lum2) + 0.05) / (np.minimum(lum1, lum2) + 0.05)
 
 
-def _flatten_and_extract_colors(elements):
-    """Рекурсивно обходит DOM, извлекая цветовые признаки."""
-    all_color_features = []
-    all_contrast_features = []
-
-    for element in elements:
-        color_str = element.get("color")
-        bg_color_str = element.get("backgroundColor")
-
-        rgb_color = _parse_rgb(color_str)
-        rgb_bg_color = _parse_rgb(bg_color_str)
-
-        # 1. Признаки цветов (нормализованные)
-        features = (np.array(rgb_color + rgb_bg_color) / 255.0).tolist()
-        all_color_features.append(features)
-
-        # 2. Признак контрастности
-        contrast = _get_contrast_ratio(rgb_color, rgb_bg_color)
-        all_contrast_features.append([contrast])  # Как отдельный признак
-
-        # 3. Рекурсивный вызов для дочерних элементов
-        children = element.get("children", [])
-        if children:
-            child_colors, child_contrasts = _flatten_and_extract_colors(children)
-            all_color_features.extend(child_colors)
-            all_contrast_features.extend(child_contrasts)
+def _composite_colors(fg_rgba, bg_rgba):
+    """
+    Видимые цвета текста и фона с учетом прозрачности:
+    фон накладывается на белую страницу, текст - на полученный фон.
+    """
+    bg_alpha = bg_rgba[:, 3:]
+    bg_rgb = bg_rgba[:, :3] * bg_alpha + 255.0 * (1.0 - bg_alpha)
 
-    return all_color_features, all_contrast_features
+    fg_alpha = fg_rgba[:, 3:]
+    fg_rgb = fg_rgba[:, :3] * fg_alpha + bg_rgb * (1.0 - fg_alpha)
+    return fg_rgb, bg_rgb
 
 
-def extract_color_features(json_data):
+def extract_color_features(json_data, flat_page=None):
     """
     Извлекает цветовые признаки (6 штук) и признак контрастности (1 штука).
 
+    Args:
+        json_data (dict): Словарь с данными о DOM-дереве.
+        flat_page (dict, optional): Уже развернутая страница (см. flatten_dom).
+
     Returns:
         tuple: (
             np.ndarray: Матрица цветовых признаков (N, 6),
             np.ndarray: Матрица контрастности (N, 1) - пойдет в числовые признаки
         )
     """
-    elements = json_data.get("elements", [])
-    if not elements:
+    if flat_page is None:
+        flat_page = flatten_dom(json_data)
+
+    num_elements = flat_page["num_elements"]
+    if num_elements == 0:
         return np.array([]), np.array([])
 
-    print("Извлечение цветовых признаков...")
-    color_matrix, contrast_matrix = _flatten_and_extract_colors(elements)
+    logger.debug("Извлечение цветовых признаков...")
+    fg_rgba = _parse_color_column(flat_page["columns"]["color"])
+    bg_rgba = _parse_color_column(flat_page["columns"]["backgroundColor"])
+
+    # 1. Признаки цветов (нормализованные)
+    color_matrix = np.empty((num_elements, 6), dtype=np.float32)
+    np.multiply(fg_rgba[:, :3], 1.0 / 255.0, out=color_matrix[:, :3])
+    np.multiply(bg_rgba[:, :3], 1.0 / 255.0, out=color_matrix[:, 3:])
 
-    color_matrix = np.array(color_matrix, dtype=np.float32)
-    contrast_matrix = np.array(contrast_matrix, dtype=np.float32)
+    # 2. Признак контрастности (по видимым цветам)
+    fg_rgb, bg_rgb = _composite_colors(fg_rgba, bg_rgba)
+    contrast_matrix = _get_contrast_ratio(fg_rgb, bg_rgb).astype(np.float32).reshape(-1, 1)
 
-    print(f"Матрица цветовых признаков создана. Форма: {color_matrix.shape}")
-    print(f"Матрица контрастности создана. Форма: {contrast_matrix.shape}")
+    logger.debug("Матрица цветовых признаков создана. Форма: %s", color_matrix.shape)
+    logger.debug("Матрица контрастности создана. Форма: %s", contrast_matrix.shape)
 
-    return color_matrix, contrast_matrix
\ No newline at end of file
+    return color_matrix, contrast_matrix
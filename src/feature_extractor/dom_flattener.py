@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+
+"""
+Однопроходный обход DOM-дерева, общий для всех экстракторов признаков.
+Дерево обходится итеративно (без рекурсии) в порядке документа,
+а значения атрибутов раскладываются по колонкам numpy-массивов.
+"""
+
+import numpy as np
+from config import FEATURE_MAPPING
+
+# Признаки, которые вычисляются при обходе, а не читаются из элемента
+STRUCTURAL_KEYS = ("depth", "num_children")
+
+# Атрибуты элемента, которые собираются в колонки (в порядке групп признаков)
+COLUMN_KEYS = tuple(
+    key
+    for group in ("textual", "numeric_scalar", "color", "categorical")
+    for key in FEATURE_MAPPING.get(group, [])
+    if key not in STRUCTURAL_KEYS
+)
+
+
+def flatten_dom(json_data):
+    """
+    Разворачивает DOM-дерево в плоскую страницу за один проход.
+
+    Args:
+        json_data (dict): Словарь с данными о DOM-дереве.
+
+    Returns:
+        dict: {
+            "num_elements": int,
+            "columns": {атрибут: np.ndarray (N,) dtype=object},
+            "depth": np.ndarray (N,) int32 - уровень вложенности,
+            "num_children": np.ndarray (N,) int32 - длина списка children,
+            "parent": np.ndarray (N,) int32 - индекс родителя (-1 у корневых элементов)
+        }
+    """
+    elements = json_data.get("elements") or []
+
+    nodes = []
+    depths = []
+    num_children = []
+    parents = []
+
+    # Стек вместо рекурсии: глубокие деревья не упираются в лимит рекурсии
+    stack = [(element, 0, -1) for element in reversed(elements)]
+    while stack:
+        element, depth, parent = stack.pop()
+        children = element.get("children") or []
+
+        index = len(nodes)
+        nodes.append(element)
+        depths.append(depth)
+        num_children.append(len(children))
+        parents.append(parent)
+
+        for child in reversed(children):
+            stack.append((child, depth + 1, index))
+
+    columns = {key: [element.get(key) for element in nodes] for key in COLUMN_KEYS}
+    return make_flat_page(columns, depths, num_children, parents)
+
+
+def is_flat_page(value):
+    """Плоская страница (flatten_dom, load_flat_page), а не DOM-документ."""
+    return isinstance(value, dict) and "columns" in value and "num_elements" in value
+
+
+def make_flat_page(columns, depths, num_children, parents):
+    """Собирает плоскую страницу из списков значений по колонкам."""
+    num_elements = len(depths)
+
+    flat_columns = {}
+    for key, values in columns.items():
+        column = np.empty(num_elements, dtype=object)
+        column[:] = values
+        flat_columns[key] = column
+
+    return {
+        "num_elements": num_elements,
+        "columns": flat_columns,
+        "depth": np.array(depths, dtype=np.int32),
+        "num_children": np.array(num_children, dtype=np.int32),
+        "parent": np.array(parents, dtype=np.int32),
+    }
+
+
+class _ValueCodes(dict):
+    """Значение -> код в порядке первого появления."""
+
+    def __missing__(self, value):
+        code = self[value] = len(self)
+        return code
+
+
+def encode_column(column):
+    """
+    Коды значений колонки: значения страницы сильно повторяются (цвета, размеры
+    шрифта, теги), поэтому разбор можно делать один раз на различное значение.
+
+    Returns:
+        tuple: (np.ndarray (N,) intp - код каждого элемента, list - различные значения по кодам).
+               Для колонки с нехешируемыми значениями код каждого элемента - его номер.
+    """
+    codes = _ValueCodes()
+    try:
+        index = np.fromiter(map(codes.__getitem__, column), dtype=np.intp, count=len(column))
+    except TypeError:
+        return np.arange(len(column)), list(column)
+    return index, list(codes)
@@ -0,0 +1,256 @@
+# -*- coding: utf-8 -*-
+
+"""
+Потоковое чтение больших DOM-снимков.
+
+Файл разбирается инкрементально (поток событий JSON), элементы дерева
+elements выдаются в порядке документа вместе с глубиной и сразу
+раскладываются по колонкам плоской страницы (см. flatten_dom).
+Объектное дерево Python целиком не строится, поэтому пиковая память
+определяется размером колонок, а не размером файла.
+
+Если установлен ijson, события берет он (с самым быстрым доступным
+бэкендом, например yajl2_c); иначе используется встроенный токенизатор.
+Для файлов обычного размера load_dom читает документ целиком через orjson,
+если он установлен.
+"""
+
+import json
+import os
+import re
+from json.decoder import scanstring
+
+from feature_extractor.dom_flattener import COLUMN_KEYS, flatten_dom, make_flat_page
+from instrumentation import timer, count
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Файлы больше этого размера разбираются потоково
+STREAMING_THRESHOLD_BYTES = 64 * 1024 * 1024
+# Размер блока чтения встроенного токенизатора (символов)
+CHUNK_SIZE = 1 << 16
+
+_WHITESPACE_RE = re.compile(r'[ \t\n\r]*')
+_NUMBER_RE = re.compile(r'-?(?:0|[1-9]\d*)(\.\d+)?([eE][-+]?\d+)?')
+_LITERALS = {'t': ('true', True), 'f': ('false', False), 'n': ('null', None)}
+
+
+def _iter_tokens(fp, chunk_size=CHUNK_SIZE):
+    """Токены JSON из текстового потока: ('{', None), ('string', 'abc'), ('number', 1) ..."""
+    buf = fp.read(chunk_size)
+    pos = 0
+    eof = not buf
+
+    while True:
+        pos = _WHITESPACE_RE.match(buf, pos).end()
+
+        if pos >= len(buf) - 1 and not eof:
+            # Токен может быть разрезан границей блока: дочитываем
+            more = fp.read(max(chunk_size, len(buf) - pos))
+            buf, pos = buf[pos:] + more, 0
+            eof = not more
+            continue
+        if pos >= len(buf):
+            return
+
+        char = buf[pos]
+        if char in '{}[]:,':
+            yield char, None
+            pos += 1
+            continue
+
+        try:
+            if char == '"':
+                value, end = scanstring(buf, pos + 1, True)
+                yield 'string', value
+            elif char in _LITERALS:
+                literal, value = _LITERALS[char]
+                end = pos + len(literal)
+                if buf[pos:end] != literal:
+                    raise ValueError
+                yield literal if value is None else 'boolean', value
+            else:
+                match = _NUMBER_RE.match(buf, pos)
+                if match is None:
+                    raise json.JSONDecodeError("Некорректный токен", buf, pos)
+                end = match.end()
+                if end == len(buf) and not eof:
+                    raise ValueError
+                text = match.group()
+                yield 'number', float(text) if match.group(1) or match.group(2) else int(text)
+            pos = end
+        except ValueError:
+            if eof:
+                raise json.JSONDecodeError("Неожиданный конец файла", buf, pos)
+            more = fp.read(max(chunk_size, len(buf) - pos))
+            buf, pos = buf[pos:] + more, 0
+            eof = not more
+
+
+def _builtin_events(fp):
+    """События в формате ijson.basic_parse: start_map, map_key, end_map, start_array, ..."""
+    # Состояние открытых контейнеров: 'key' / 'value' для объектов, 'array' для массивов
+    containers = []
+
+    for token, value in _iter_tokens(fp):
+        if token == '{':
+            containers.append('key')
+            yield 'start_map', None
+        elif token == '}':
+            containers.pop()
+            yield 'end_map', None
+        elif token == '[':
+            containers.append('array')
+            yield 'start_array', None
+        elif token == ']':
+            containers.pop()
+            yield 'end_array', None
+        elif token == ':':
+            containers[-1] = 'value'
+        elif token == ',':
+            if containers[-1] == 'value':
+                containers[-1] = 'key'
+        elif token == 'string' and containers and containers[-1] == 'key':
+            yield 'map_key', value
+        else:
+            yield token, value
+
+
+def iter_json_events(fp):
+    """События разбора JSON: через ijson, если он установлен, иначе встроенным токенизатором."""
+    if ijson is not None:
+        return ijson.basic_parse(fp, use_float=True)
+    return _builtin_events(fp)
+
+
+def _skip_value(events, event):
+    """Пропускает значение, начинающееся с события event (вместе с вложенными контейнерами)."""
+    if event not in ('start_map', 'start_array'):
+        return
+    level = 1
+    while level:
+        event, _ = next(events)
+        if event in ('start_map', 'start_array'):
+            level += 1
+        elif event in ('end_map', 'end_array'):
+            level -= 1
+
+
+def _stream_elements(events, columns, depths, num_children, parents):
+    """
+    Разбирает массив elements (событие start_array уже прочитано), дописывая
+    значения элементов в колонки в порядке документа (как flatten_dom).
+    """
+    # Стек кадров: ('array', глубина, индекс родителя) или ('element', индекс)
+    stack = [('array', 0, -1)]
+
+    while stack:
+        frame = stack[-1]
+        event, value = next(events)
+
+        if frame[0] == 'array':
+            if event == 'end_array':
+                stack.pop()
+            elif event == 'start_map':
+                _, depth, parent = frame
+                index = len(depths)
+                depths.append(depth)
+                num_children.append(0)
+                parents.append(parent)
+                for column in columns.values():
+                    column.append(None)
+                if parent >= 0:
+                    num_children[parent] += 1
+                stack.append(('element', index))
+            else:
+                # Не объект внутри массива элементов - пропускаем
+                _skip_value(events, event)
+            continue
+
+        # Кадр элемента: очередной ключ или конец объекта
+        if event == 'end_map':
+            stack.pop()
+            continue
+
+        key, index = value, frame[1]
+        event, value = next(events)
+        if key == 'children' and event == 'start_array':
+            stack.append(('array', depths[index] + 1, index))
+        elif key in columns and event not in ('start_map', 'start_array'):
+            columns[key][index] = value
+        else:
+            _skip_value(events, event)
+
+
+def flatten_dom_stream(fp):
+    """
+    Потоковый аналог flatten_dom: читает DOM-снимок из файла
+    и возвращает плоскую страницу того же формата.
+
+    Args:
+        fp: Файл, открытый в двоичном режиме (ijson) или как текст UTF-8.
+    """
+    events = iter(iter_json_events(fp))
+    columns = {key: [] for key in COLUMN_KEYS}
+    depths = []
+    num_children = []
+    parents = []
+
+    event, _ = next(events, (None, None))
+    if event == 'start_map':
+        while True:
+            event, key = next(events)
+            if event == 'end_map':
+                break
+            event, _ = next(events)
+            if key == 'elements' and event == 'start_array':
+                _stream_elements(events, columns, depths, num_children, parents)
+            else:
+                _skip_value(events, event)
+
+    return make_flat_page(columns, depths, num_children, parents)
+
+
+def load_dom(file_path):
+    """Читает DOM-файл целиком (через orjson, если он установлен)."""
+    with timer("parse_json"):
+        with open(file_path, 'rb') as f:
+            data = f.read()
+        count("bytes_read", len(data))
+        if orjson is not None:
+            return orjson.loads(data)
+        return json.loads(data.decode('utf-8'))
+
+
+def load_flat_page(file_path, streaming=None):
+    """
+    Читает DOM-файл сразу в плоскую страницу.
+
+    Args:
+        file_path (str): Путь к JSON-файлу.
+        streaming (bool, optional): Разбирать потоково. По умолчанию - для файлов
+            больше STREAMING_THRESHOLD_BYTES.
+    """
+    if streaming is None:
+        streaming = os.path.getsize(file_path) > STREAMING_THRESHOLD_BYTES
+
+    if not streaming:
+        document = load_dom(file_path)
+        with timer("flatten"):
+            return flatten_dom(document)
+
+    count("bytes_read", os.path.getsize(file_path))
+    with timer("parse_json_stream"):
+        if ijson is not None:
+            with open(file_path, 'rb') as f:
+                return flatten_dom_stream(f)
+        with open(file_path, 'r', encoding='utf-8') as f:
+            return flatten_dom_stream(f)
@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+
+"""
+Политика длины страницы: отбор элементов гигантских страниц.
+
+Стоимость внимания в трансформере растет квадратично по числу элементов,
+поэтому у страницы длиннее MAX_PAGE_ELEMENTS остаются самые важные элементы:
+сначала интерактивные (INTERACTIVE_TAGS) и несущие текст, затем остальные
+видимые; скрытые (display: none, opacity: 0 - свои или у предка) отбрасываются первыми.
+Внутри последнего попадающего в лимит уровня важности элементы берутся
+равномерно по документу. Отбор детерминирован, порядок документа сохраняется,
+а отброшенные элементы записываются в flat_page["selection"]. Скрытые элементы
+по умолчанию (DROP_HIDDEN_ELEMENTS) отбрасываются и на страницах в пределах лимита.
+"""
+
+import numpy as np
+
+from config import FEATURE_MAPPING, MAX_PAGE_ELEMENTS, INTERACTIVE_TAGS, DROP_HIDDEN_ELEMENTS
+from feature_extractor.dom_flattener import encode_column
+from feature_extractor.numeric_feature_extractor import _parse_css_value
+
+_INTERACTIVE_TAGS = frozenset(INTERACTIVE_TAGS)
+
+# Уровни важности элемента
+HIDDEN_PRIORITY = -1
+INTERACTIVE_WEIGHT = 2
+TEXT_WEIGHT = 1
+
+
+def _is_hidden(display, opacity):
+    if isinstance(display, str) and display.strip().lower() == 'none':
+        return True
+    return opacity is not None and _parse_css_value(opacity, 'opacity') == 0.0
+
+
+def ancestor_or_self(flags, parent):
+    """Для каждого элемента: выставлен ли флаг у него или у кого-то из предков (удвоением указателей)."""
+    flags = flags.copy()
+    ancestor = parent.astype(np.int64)
+    while True:
+        has_ancestor = ancestor >= 0
+        if not has_ancestor.any():
+            return flags
+        safe = np.where(has_ancestor, ancestor, 0)
+        flags |= has_ancestor & flags[safe]
+        ancestor = np.where(has_ancestor, ancestor[safe], -1)
+
+
+def hidden_mask(flat_page):
+    """
+    Скрытые элементы страницы - np.ndarray (N,) bool: display: none или opacity: 0
+    у самого элемента или у кого-то из его предков (потомки скрытого контейнера
+    тоже не видны).
+    """
+    columns = flat_page["columns"]
+    # Значения display и opacity сильно повторяются: каждое различное проверяется один раз
+    display_index, displays = encode_column(columns["display"])
+    opacity_index, opacities = encode_column(columns["opacity"])
+    display_none = np.array([_is_hidden(display, None) for display in displays], dtype=bool)
+    transparent = np.array([_is_hidden(None, opacity) for opacity in opacities], dtype=bool)
+    return ancestor_or_self(display_none[display_index] | transparent[opacity_index], flat_page["parent"])
+
+
+def element_priority(flat_page):
+    """Важность каждого элемента страницы (np.ndarray (N,) int8)."""
+    columns = flat_page["columns"]
+    num_elements = flat_page["num_elements"]
+
+    has_text = np.zeros(num_elements, dtype=bool)
+    for key in FEATURE_MAPPING.get("textual", []):
+        has_text |= np.fromiter(
+            (isinstance(value, str) and bool(value.strip()) for value in columns[key]),
+            dtype=bool, count=num_elements
+        )
+
+    is_interactive = np.fromiter(
+        (isinstance(tag, str) and tag.lower() in _INTERACTIVE_TAGS for tag in columns["tag"]),
+        dtype=bool, count=num_elements
+    )
+    priority = (INTERACTIVE_WEIGHT * is_interactive + TEXT_WEIGHT * has_text).astype(np.int8)
+    priority[hidden_mask(flat_page)] = HIDDEN_PRIORITY
+    return priority
+
+
+def select_elements(priority, max_elements):
+    """
+    Индексы отобранных элементов в порядке документа.
+    Уровни важности берутся по убыванию; последний уровень, который
+    не помещается целиком, прореживается равномерно.
+    """
+    if max_elements is None or len(priority) <= max_elements:
+        return np.arange(len(priority))
+
+    selected = []
+    remaining = max_elements
+    for level in np.unique(priority)[::-1]:
+        level_index = np.flatnonzero(priority == level)
+        if len(level_index) <= remaining:
+            selected.append(level_index)
+            remaining -= len(level_index)
+        else:
+            selected.append(level_index[(np.arange(remaining) * len(level_index)) // remaining])
+            remaining = 0
+        if remaining == 0:
+            break
+
+    return np.sort(np.concatenate(selected))
+
+
+def _remap_parents(parent, keep):
+    """Родители оставленных элементов в новой нумерации: ближайший оставленный предок или -1."""
+    new_index = np.full(len(parent), -1, dtype=np.int32)
+    new_index[keep] = np.arange(len(keep), dtype=np.int32)
+
+    remapped = np.empty(len(keep), dtype=np.int32)
+    for i, element in enumerate(keep):
+        ancestor = parent[element]
+        while ancestor >= 0 and new_index[ancestor] < 0:
+            ancestor = parent[ancestor]
+        remapped[i] = new_index[ancestor] if ancestor >= 0 else -1
+    return remapped
+
+
+def apply_length_policy(flat_page, max_elements=MAX_PAGE_ELEMENTS, drop_hidden=DROP_HIDDEN_ELEMENTS):
+    """
+    Ограничивает плоскую страницу max_elements самыми важными элементами.
+
+    Args:
+        flat_page (dict): Плоская страница (flatten_dom).
+        max_elements (int, optional): Лимит элементов; None - без ограничения.
+        drop_hidden (bool): Отбрасывать скрытые элементы и на страницах в пределах лимита
+            (страница, у которой скрыто все, остается как есть).
+
+    Returns:
+        dict: Та же страница, если ничего не отброшено; иначе новая плоская страница
+              с записью flat_page["selection"] = {
+                  "num_source_elements": int - элементов до отбора,
+                  "source_index": np.ndarray - исходные индексы оставленных элементов,
+                  "dropped_index": np.ndarray - исходные индексы отброшенных,
+                  "dropped_hidden": int, "dropped_over_limit": int
+              }
+    """
+    num_elements = flat_page["num_elements"]
+    over_limit = max_elements is not None and num_elements > max_elements
+    if not over_limit and not drop_hidden:
+        return flat_page
+
+    priority = element_priority(flat_page)
+    candidates = np.arange(num_elements)
+    if drop_hidden and (priority != HIDDEN_PRIORITY).any():
+        candidates = np.flatnonzero(priority != HIDDEN_PRIORITY)
+    keep = candidates[select_elements(priority[candidates], max_elements)]
+    if len(keep) == num_elements:
+        return flat_page
+
+    dropped = np.setdiff1d(np.arange(num_elements), keep, assume_unique=True)
+    dropped_hidden = int(np.count_nonzero(priority[dropped] == HIDDEN_PRIORITY))
+
+    return {
+        "num_elements": len(keep),
+        "columns": {key: column[keep] for key, column in flat_page["columns"].items()},
+        "depth": flat_page["depth"][keep],
+        "num_children": flat_page["num_children"][keep],
+        "parent": _remap_parents(flat_page["parent"], keep),
+        "selection": {
+            "num_source_elements": num_elements,
+            "source_index": keep,
+            "dropped_index": dropped,
+            "dropped_hidden": dropped_hidden,
+            "dropped_over_limit": len(dropped) - dropped_hidden,
+        },
+    }
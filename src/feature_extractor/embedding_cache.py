@@ -0,0 +1,259 @@
+# -*- coding: utf-8 -*-
+
+"""
+Персистентный кэш текстовых эмбеддингов с адресацией по содержимому.
+
+Ключ - хеш нормализованной строки (text/alt/title/placeholder) вместе
+с идентификатором энкодера. Векторы лежат в memory-mapped файле
+(float32 или float16 для спроецированных векторов, см. text_projection.py)
+фиксированной емкости, индекс - компактный массив (хеш, слот, время доступа).
+При переполнении вытесняются давно не использованные записи (LRU).
+Доступ между процессами синхронизируется блокировкой файла, поэтому один
+каталог кэша можно разделять между обучением и инференс-воркерами.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import unicodedata
+from contextlib import contextmanager
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: межпроцессная блокировка недоступна
+    fcntl = None
+
+# Размер кэша по умолчанию (только векторы): 256 МБ ~ 130 тыс. строк по 512 float32
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+INDEX_DTYPE = np.dtype([
+    ("key_hi", "<u8"),
+    ("key_lo", "<u8"),
+    ("slot", "<i4"),
+    ("last_used", "<i8"),
+])
+
+_META_FILE = "meta.json"
+_INDEX_FILE = "index.npy"
+# Файл векторов по типу хранения
+_VECTORS_FILES = {"float32": "vectors.f32", "float16": "vectors.f16"}
+_LOCK_FILE = "lock"
+
+
+def text_cache_key(text, encoder_id):
+    """128-битный ключ строки: хеш от идентификатора энкодера и нормализованного текста."""
+    normalized = " ".join(unicodedata.normalize("NFC", text).split())
+    payload = f"{encoder_id}\0{normalized}".encode("utf-8")
+    return int.from_bytes(hashlib.blake2b(payload, digest_size=16).digest(), "little")
+
+
+class EmbeddingCache:
+    """
+    Дисковый LRU-кэш эмбеддингов.
+
+    Args:
+        cache_dir (str): Каталог кэша (создается при необходимости).
+        dim (int): Размерность векторов.
+        dtype: Тип хранения векторов (float32 или float16).
+        max_bytes (int): Предельный размер файла векторов. Используется только
+            при создании кэша; существующий кэш сохраняет свою емкость.
+    """
+
+    def __init__(self, cache_dir, dim, max_bytes=DEFAULT_MAX_BYTES, dtype=np.float32):
+        dtype = np.dtype(dtype)
+        if dtype.name not in _VECTORS_FILES:
+            raise ValueError(f"Неподдерживаемый тип векторов кэша: {dtype.name}")
+
+        os.makedirs(cache_dir, exist_ok=True)
+        self.cache_dir = cache_dir
+        self._index_path = os.path.join(cache_dir, _INDEX_FILE)
+        self._vectors_path = os.path.join(cache_dir, _VECTORS_FILES[dtype.name])
+
+        self._thread_lock = threading.Lock()
+        self._lock_file = open(os.path.join(cache_dir, _LOCK_FILE), "a+b")
+
+        with self._file_lock(exclusive=True):
+            meta = self._init_storage(dim, dtype, max_bytes)
+
+        if meta["dim"] != dim or meta.get("dtype", "float32") != dtype.name:
+            raise ValueError(
+                f"Кэш в {cache_dir} создан для векторов {meta['dim']} x {meta.get('dtype', 'float32')}, "
+                f"запрошены {dim} x {dtype.name}"
+            )
+
+        self.dim = meta["dim"]
+        self.dtype = dtype
+        self.capacity = meta["capacity"]
+        self._vectors = np.memmap(
+            self._vectors_path, dtype=dtype, mode="r+", shape=(self.capacity, self.dim)
+        )
+
+        self._slots = {}
+        self._slot_keys = [None] * self.capacity
+        self._free_slots = list(range(self.capacity - 1, -1, -1))
+        self._last_used = np.zeros(self.capacity, dtype=np.int64)
+        self._clock = 0
+        self._index_stamp = None
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _init_storage(self, dim, dtype, max_bytes):
+        meta_path = os.path.join(self.cache_dir, _META_FILE)
+        if os.path.exists(meta_path):
+            with open(meta_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+
+        capacity = max(1, int(max_bytes) // (dim * dtype.itemsize))
+        with open(self._vectors_path, "wb") as f:
+            f.truncate(capacity * dim * dtype.itemsize)
+
+        meta = {"dim": dim, "capacity": capacity, "dtype": dtype.name}
+        with open(meta_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        return meta
+
+    @contextmanager
+    def _file_lock(self, exclusive):
+        if fcntl is None:
+            yield
+            return
+        fcntl.flock(self._lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+
+    def _reload_if_changed(self):
+        """Перечитывает индекс, если его обновил другой процесс."""
+        try:
+            st = os.stat(self._index_path)
+        except FileNotFoundError:
+            return
+        stamp = (st.st_ino, st.st_mtime_ns, st.st_size)
+        if stamp == self._index_stamp:
+            return
+
+        index = np.load(self._index_path)
+        local_last_used = {key: self._last_used[slot] for key, slot in self._slots.items()}
+
+        self._slots = {}
+        self._slot_keys = [None] * self.capacity
+        self._last_used = np.zeros(self.capacity, dtype=np.int64)
+        for key_hi, key_lo, slot, last_used in index.tolist():
+            key = (key_hi << 64) | key_lo
+            self._slots[key] = slot
+            self._slot_keys[slot] = key
+            # Время доступа, накопленное в этом процессе, не теряется
+            self._last_used[slot] = max(last_used, local_last_used.get(key, 0))
+        self._free_slots = [slot for slot in range(self.capacity - 1, -1, -1) if self._slot_keys[slot] is None]
+
+        if index.size:
+            self._clock = max(self._clock, int(self._last_used.max()))
+        self._index_stamp = stamp
+
+    def _write_index(self):
+        index = np.empty(len(self._slots), dtype=INDEX_DTYPE)
+        for i, (key, slot) in enumerate(self._slots.items()):
+            index[i] = (key >> 64, key & 0xFFFFFFFFFFFFFFFF, slot, self._last_used[slot])
+
+        tmp_path = f"{self._index_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.save(f, index)
+        os.replace(tmp_path, self._index_path)
+
+        st = os.stat(self._index_path)
+        self._index_stamp = (st.st_ino, st.st_mtime_ns, st.st_size)
+
+    def _allocate_slots(self, count):
+        """Возвращает count слотов: сначала свободные, затем вытесненные по LRU."""
+        free = [self._free_slots.pop() for _ in range(min(count, len(self._free_slots)))]
+        shortage = count - len(free)
+        if shortage <= 0:
+            return free
+
+        shortage = min(shortage, self.capacity)
+        occupied = np.array([slot for slot, key in enumerate(self._slot_keys) if key is not None])
+        order = np.argpartition(self._last_used[occupied], shortage - 1)[:shortage]
+        for slot in occupied[order].tolist():
+            del self._slots[self._slot_keys[slot]]
+            self._slot_keys[slot] = None
+            free.append(slot)
+        self.evictions += shortage
+        return free
+
+    def get_many(self, texts, encoder_id):
+        """
+        Ищет векторы строк в кэше.
+
+        Returns:
+            tuple: (
+                np.ndarray (n, dim) dtype кэша - найденные векторы (нули для промахов),
+                np.ndarray (n,) bool - маска попаданий
+            )
+        """
+        keys = [text_cache_key(text, encoder_id) for text in texts]
+        vectors = np.zeros((len(keys), self.dim), dtype=self.dtype)
+        found = np.zeros(len(keys), dtype=bool)
+
+        with self._thread_lock, self._file_lock(exclusive=False):
+            self._reload_if_changed()
+            rows, slots = [], []
+            for i, key in enumerate(keys):
+                slot = self._slots.get(key)
+                if slot is not None:
+                    rows.append(i)
+                    slots.append(slot)
+
+            if slots:
+                vectors[rows] = self._vectors[slots]
+                found[rows] = True
+                self._clock += 1
+                self._last_used[slots] = self._clock
+
+        self.hits += len(slots)
+        self.misses += len(keys) - len(slots)
+        return vectors, found
+
+    def put_many(self, texts, vectors, encoder_id):
+        """Сохраняет векторы строк; уже закэшированные строки пропускаются."""
+        rows = {text_cache_key(text, encoder_id): i for i, text in enumerate(texts)}
+        if not rows:
+            return
+
+        with self._thread_lock, self._file_lock(exclusive=True):
+            self._reload_if_changed()
+            new_keys = [key for key in rows if key not in self._slots][:self.capacity]
+            if not new_keys:
+                return
+
+            slots = self._allocate_slots(len(new_keys))
+            self._clock += 1
+            for key, slot in zip(new_keys, slots):
+                self._vectors[slot] = vectors[rows[key]]
+                self._slots[key] = slot
+                self._slot_keys[slot] = key
+                self._last_used[slot] = self._clock
+
+            self._vectors.flush()
+            self._write_index()
+
+    def flush(self):
+        """Сохраняет на диск время последнего доступа к записям (для LRU)."""
+        with self._thread_lock, self._file_lock(exclusive=True):
+            self._reload_if_changed()
+            self._write_index()
+
+    def stats(self):
+        """Счетчики попаданий/промахов и заполненность кэша."""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": len(self._slots),
+            "capacity": self.capacity,
+        }
@@ -1,72 +1,118 @@
 import numpy as np
-from sklearn.preprocessing import StandardScaler
 import os
-import json
+import re
+from functools import lru_cache
 from config import FEATURE_MAPPING
-
-
-def _parse_css_value(value):
+from feature_extractor.dom_flattener import flatten_dom, STRUCTURAL_KEYS
+
+
+# Число CSS с необязательным знаком, экспонентой и единицей измерения
+_CSS_SCALAR_RE = re.compile(r'([+-]?(?:\d+\.?\d*|\.\d+)(?:e[+-]?\d+)?)\s*([a-z%]*)')
+
+# Перевод единиц в пиксели; em/rem считаются от базового шрифта 16px,
+# проценты и безразмерные значения (lineHeight: 1.5, opacity) остаются как есть
+BASE_FONT_SIZE_PX = 16.0
+CSS_UNIT_SCALE = {
+    '': 1.0,
+    'px': 1.0,
+    'em': BASE_FONT_SIZE_PX,
+    'rem': BASE_FONT_SIZE_PX,
+    '%': 1.0,
+    'pt': 96.0 / 72.0,
+}
+
+# Ключевые слова, не являющиеся числами; неизвестные значения тоже дают 0.0
+CSS_KEYWORDS = {
+    'auto': 0.0,
+    'normal': 0.0,
+    'none': 0.0,
+}
+# Ключевые слова, значение которых зависит от свойства
+PROPERTY_KEYWORDS = {
+    'fontWeight': {'normal': 400.0, 'bold': 700.0, 'bolder': 700.0, 'lighter': 300.0},
+}
+
+
+def _parse_css_value(value, key=None):
+    """
+    Разбирает скалярное значение CSS ('16px', '-12px', '1.5em', '50%', 'auto') в число.
+    Числа возвращаются как есть, прочие не строки (None, списки, словари) дают 0.0.
+    """
     if isinstance(value, (int, float)):
         return float(value)
-    if isinstance(value, str):
-        value = value.lower().strip()
-        if value == 'auto':
-            return 0.0
-        try:
-            return float(''.join(filter(lambda x: x.isdigit() or x == '.', value)))
-        except (ValueError, TypeError):
-            return 0.0
-    return 0.0
-
-
-def _flatten_and_extract(elements, depth=0):
-    all_features = []
-    numeric_feature_keys = FEATURE_MAPPING.get("numeric_scalar", [])
-
-    for element in elements:
-        features = []
-        for key in numeric_feature_keys:
-            if key in ["depth", "num_children"]:
-                continue
-            value = element.get(key)
-            features.append(_parse_css_value(value))
-
-        children = element.get("children", [])
-        features.append(float(depth))
-        features.append(float(len(children)))
-
-        all_features.append(features)
-
-        if children:
-            all_features.extend(_flatten_and_extract(children, depth + 1))
-
-    return all_features
-
-
-def extract_numeric_features(json_data, normalize=True):
-    elements = json_data.get("elements", [])
-    if not elements:
+    if not isinstance(value, str):
+        return 0.0
+    return _parse_css_string(value, key)
+
+
+@lru_cache(maxsize=8192)
+def _parse_css_string(value, key=None):
+    """
+    Разбор строки CSS. Результат кэшируется по исходной строке:
+    страницы используют небольшой набор значений.
+    """
+    value = value.lower().strip()
+
+    keywords = PROPERTY_KEYWORDS.get(key)
+    if keywords and value in keywords:
+        return keywords[value]
+    if value in CSS_KEYWORDS:
+        return CSS_KEYWORDS[value]
+
+    match = _CSS_SCALAR_RE.fullmatch(value)
+    if match is None:
+        return 0.0
+
+    number, unit = match.groups()
+    scale = CSS_UNIT_SCALE.get(unit)
+    if scale is None:
+        return 0.0
+    return float(number) * scale
+
+
+def extract_numeric_features(json_data, normalizer=None, flat_page=None):
+    """
+    Матрица числовых признаков (N, число признаков) в float32.
+
+    Args:
+        normalizer (RunningNormalizer, optional): Нормализатор, обученный на всем
+            корпусе (normalization.py). Без него возвращаются сырые значения.
+    """
+    if flat_page is None:
+        flat_page = flatten_dom(json_data)
+
+    num_elements = flat_page["num_elements"]
+    if num_elements == 0:
         return np.array([])
 
-    feature_matrix = _flatten_and_extract(elements)
-    feature_matrix = np.array(feature_matrix, dtype=np.float32)
+    columns = flat_page["columns"]
+    value_keys = [
+        key for key in FEATURE_MAPPING.get("numeric_scalar", [])
+        if key not in STRUCTURAL_KEYS
+    ]
+
+    feature_matrix = np.empty((num_elements, len(value_keys) + 2), dtype=np.float32)
+    for j, key in enumerate(value_keys):
+        feature_matrix[:, j] = [_parse_css_value(value, key) for value in columns[key]]
+    feature_matrix[:, -2] = flat_page["depth"]
+    feature_matrix[:, -1] = flat_page["num_children"]
 
-    if normalize and feature_matrix.shape[0] > 0:
-        scaler = StandardScaler()
-        feature_matrix = scaler.fit_transform(feature_matrix)
+    if normalizer is not None:
+        feature_matrix = normalizer.transform(feature_matrix)
 
     return feature_matrix
 
 
 if __name__ == '__main__':
+    from feature_extractor.dom_stream import load_flat_page
+
     PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
     try:
         example_json_path = os.path.join(PROJECT_ROOT, 'dataset', 'sample1.json')
 
-        with open(example_json_path, 'r', encoding='utf-8') as f:
-            dom_data = json.load(f)
+        flat_page = load_flat_page(example_json_path)
 
-        numeric_vectors = extract_numeric_features(dom_data, normalize=True)
+        numeric_vectors = extract_numeric_features(None, flat_page=flat_page)
 
     except FileNotFoundError:
         pass
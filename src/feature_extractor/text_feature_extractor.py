@@ -1,10 +1,33 @@
-import tensorflow_hub as hub
+import hashlib
+import logging
 import numpy as np
 import os
+import threading
+import time
+from config import FEATURE_MAPPING, TEXT_PROJECTION_SIZE
+from feature_extractor.dom_flattener import flatten_dom
+from feature_extractor.embedding_cache import EmbeddingCache, DEFAULT_MAX_BYTES
+from feature_extractor.text_projection import TextProjection, DEFAULT_PROJECTION_PATH, PROJECTED_DTYPE
+from instrumentation import timer, count
+
+logger = logging.getLogger(__name__)
 
 MODELS_DIR = 'models'
 MODEL_URL = "https://tfhub.dev/google/universal-sentence-encoder/4"
 VECTOR_SIZE = 512
+# Размерность и тип текстовых признаков, которые получает модель
+TEXT_FEATURE_SIZE = TEXT_PROJECTION_SIZE or VECTOR_SIZE
+TEXT_FEATURE_DTYPE = PROJECTED_DTYPE if TEXT_PROJECTION_SIZE else np.float32
+
+# Источник энкодера можно переопределить переменной окружения:
+# URL TensorFlow Hub, путь к локальному SavedModel или STAND_IN_ENCODER
+ENCODER_SOURCE_ENV = 'USE_ENCODER_SOURCE'
+# Детерминированный энкодер-заглушка для офлайн-запусков и CI
+STAND_IN_ENCODER = 'hashing'
+# Каталог персистентного кэша эмбеддингов (кэш выключен, если не задан)
+EMBEDDING_CACHE_ENV = 'USE_EMBEDDING_CACHE_DIR'
+# Сколько строк отправляется в энкодер за один вызов
+TEXT_BATCH_SIZE = 256
 
 def setup_model_cache():
     """Настраивает папку для кэширования моделей TensorFlow Hub в корне проекта."""
@@ -13,56 +36,328 @@ def setup_model_cache():
     
     os.makedirs(cache_dir, exist_ok=True)
     os.environ['TFHUB_CACHE_DIR'] = cache_dir
-    print(f"Кэш моделей TensorFlow Hub будет находиться в папке: {os.path.abspath(cache_dir)}")
+    logger.info("Кэш моделей TensorFlow Hub будет находиться в папке: %s", os.path.abspath(cache_dir))
+
+
+class _HashingEncoder:
+    """
+    Детерминированная замена Universal Sentence Encoder: хеширует слова
+    в VECTOR_SIZE корзин и нормирует вектор. Не требует сети и TensorFlow.
+    """
+
+    def __call__(self, texts):
+        vectors = np.zeros((len(texts), VECTOR_SIZE), dtype=np.float32)
+        for i, text in enumerate(texts):
+            for token in text.lower().split():
+                digest = hashlib.blake2b(token.encode('utf-8'), digest_size=8).digest()
+                bucket = int.from_bytes(digest, 'little')
+                sign = 1.0 if bucket & (1 << 63) else -1.0
+                vectors[i, bucket % VECTOR_SIZE] += sign
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        np.divide(vectors, norms, out=vectors, where=norms > 0)
+        return vectors
+
+
+class _TensorFlowEncoder:
+    """Обертка над моделью из TF Hub / SavedModel, возвращающая float32 numpy."""
+
+    def __init__(self, model):
+        self._model = model
+
+    def __call__(self, texts):
+        return np.asarray(self._model(list(texts)), dtype=np.float32)
 
-def extract_text_features(json_data):
+
+def _load_encoder(source):
+    if source == STAND_IN_ENCODER:
+        return _HashingEncoder()
+
+    logger.info("Загрузка модели Universal Sentence Encoder из %s...", source)
+
+    if os.path.isdir(source):
+        import tensorflow as tf
+        model = tf.saved_model.load(source)
+    else:
+        import tensorflow_hub as hub
+        model = hub.load(source)
+
+    logger.info("Модель успешно загружена.")
+    return _TensorFlowEncoder(model)
+
+
+class _EncoderRegistry:
+    """
+    Хранит единственный экземпляр текстового энкодера на процесс.
+    Модель загружается лениво при первом обращении.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._encoder = None
+        self._source = None
+        self._warmed_up = False
+        self._metrics = {
+            "loads": 0,
+            "load_time_sec": 0.0,
+            "warmup_time_sec": 0.0,
+        }
+
+    def configure(self, source=None):
+        with self._lock:
+            if source != self._source:
+                self._source = source
+                self._encoder = None
+                self._warmed_up = False
+
+    def source(self):
+        return self._source or os.environ.get(ENCODER_SOURCE_ENV, MODEL_URL)
+
+    def get(self, warmup=False):
+        with self._lock:
+            if self._encoder is None:
+                start = time.perf_counter()
+                self._encoder = _load_encoder(self.source())
+                self._metrics["loads"] += 1
+                self._metrics["load_time_sec"] += time.perf_counter() - start
+
+            if warmup and not self._warmed_up:
+                start = time.perf_counter()
+                self._encoder(["warmup"] * 8)
+                self._warmed_up = True
+                self._metrics["warmup_time_sec"] += time.perf_counter() - start
+
+            return self._encoder
+
+    def metrics(self):
+        with self._lock:
+            return dict(self._metrics, source=self.source(), loaded=self._encoder is not None)
+
+
+_ENCODER_REGISTRY = _EncoderRegistry()
+
+
+def configure_text_encoder(source=None, warmup=False):
+    """
+    Задает источник текстового энкодера для процесса.
+
+    Args:
+        source (str, optional): URL TF Hub, путь к локальному SavedModel
+            или STAND_IN_ENCODER. None - значение из USE_ENCODER_SOURCE или MODEL_URL.
+        warmup (bool): Сразу загрузить модель и прогнать пробный батч.
+    """
+    _ENCODER_REGISTRY.configure(source)
+    if warmup:
+        _ENCODER_REGISTRY.get(warmup=True)
+
+
+def get_text_encoder(warmup=False):
+    """Возвращает общий для процесса энкодер: callable(list[str]) -> np.ndarray (n, 512)."""
+    return _ENCODER_REGISTRY.get(warmup=warmup)
+
+
+def get_encoder_metrics():
+    """Число загрузок модели, суммарное время загрузки и прогрева."""
+    return _ENCODER_REGISTRY.metrics()
+
+
+_EMBEDDING_CACHE = {"cache": None, "configured": False}
+_EMBEDDING_CACHE_LOCK = threading.Lock()
+
+
+def configure_embedding_cache(cache_dir=None, max_bytes=DEFAULT_MAX_BYTES):
+    """
+    Включает (cache_dir) или выключает (None) персистентный кэш эмбеддингов.
+    Без явной настройки используется каталог из USE_EMBEDDING_CACHE_DIR.
+    """
+    with _EMBEDDING_CACHE_LOCK:
+        _EMBEDDING_CACHE["cache"] = (
+            EmbeddingCache(cache_dir, TEXT_FEATURE_SIZE, max_bytes, dtype=TEXT_FEATURE_DTYPE) if cache_dir else None
+        )
+        _EMBEDDING_CACHE["configured"] = True
+        return _EMBEDDING_CACHE["cache"]
+
+
+def get_embedding_cache():
+    """Возвращает кэш эмбеддингов процесса или None, если кэш выключен."""
+    with _EMBEDDING_CACHE_LOCK:
+        if not _EMBEDDING_CACHE["configured"]:
+            cache_dir = os.environ.get(EMBEDDING_CACHE_ENV)
+            _EMBEDDING_CACHE["cache"] = (
+                EmbeddingCache(cache_dir, TEXT_FEATURE_SIZE, dtype=TEXT_FEATURE_DTYPE) if cache_dir else None
+            )
+            _EMBEDDING_CACHE["configured"] = True
+        return _EMBEDDING_CACHE["cache"]
+
+
+_TEXT_PROJECTION = {"projection": None, "configured": False}
+_TEXT_PROJECTION_LOCK = threading.Lock()
+
+
+def configure_text_projection(projection):
+    """
+    Задает проекцию эмбеддингов процесса: TextProjection или путь к .npz.
+    Размер проекции должен совпадать с TEXT_PROJECTION_SIZE.
+    """
+    if isinstance(projection, str):
+        projection = TextProjection.load(projection)
+    if TEXT_PROJECTION_SIZE is None or projection.size != TEXT_PROJECTION_SIZE:
+        raise ValueError(f"Размер проекции {projection.size} не совпадает с TEXT_PROJECTION_SIZE={TEXT_PROJECTION_SIZE}")
+
+    with _TEXT_PROJECTION_LOCK:
+        _TEXT_PROJECTION["projection"] = projection
+        _TEXT_PROJECTION["configured"] = True
+    return projection
+
+
+def get_text_projection():
+    """
+    Проекция эмбеддингов процесса или None, если TEXT_PROJECTION_SIZE не задан.
+    Без явной настройки загружается из DEFAULT_PROJECTION_PATH.
+    """
+    if TEXT_PROJECTION_SIZE is None:
+        return None
+
+    with _TEXT_PROJECTION_LOCK:
+        if not _TEXT_PROJECTION["configured"]:
+            if not os.path.exists(DEFAULT_PROJECTION_PATH):
+                raise FileNotFoundError(
+                    f"Проекция текстовых эмбеддингов не найдена: {DEFAULT_PROJECTION_PATH}. "
+                    f"Обучите ее на корпусе (data_loader.ensure_text_projection)"
+                )
+            projection = TextProjection.load(DEFAULT_PROJECTION_PATH)
+            if projection.size != TEXT_PROJECTION_SIZE:
+                raise ValueError(f"Проекция в {DEFAULT_PROJECTION_PATH} имеет размер {projection.size}, "
+                                 f"а TEXT_PROJECTION_SIZE={TEXT_PROJECTION_SIZE}")
+            _TEXT_PROJECTION["projection"] = projection
+            _TEXT_PROJECTION["configured"] = True
+        return _TEXT_PROJECTION["projection"]
+
+
+def concatenate_texts(flat_page):
+    """Склеивает поля text/alt/title/placeholder каждого элемента в одну строку."""
+    text_columns = [flat_page["columns"][key] for key in FEATURE_MAPPING.get("textual", [])]
+    return [
+        " ".join(filter(None, text_parts)).strip()
+        for text_parts in zip(*text_columns)
+    ]
+
+
+def embed_texts(texts, batch_size=TEXT_BATCH_SIZE, project=True):
+    """
+    Векторизует список строк батчами.
+    Пустые строки в энкодер не отправляются и остаются нулевыми векторами,
+    повторяющиеся строки векторизуются один раз, а при включенном кэше
+    в энкодер уходят только промахи кэша.
+
+    Args:
+        project (bool): Применить проекцию TEXT_PROJECTION_SIZE (если она задана);
+            False - сырые эмбеддинги энкодера (например, для обучения проекции).
+
+    Returns:
+        np.ndarray: Матрица (N, TEXT_FEATURE_SIZE) TEXT_FEATURE_DTYPE
+                    (при project=False - (N, VECTOR_SIZE) float32).
+    """
+    projection = get_text_projection() if project else None
+    if projection is not None:
+        vector_size, dtype = projection.size, PROJECTED_DTYPE
+    else:
+        vector_size, dtype = VECTOR_SIZE, np.float32
+    text_features = np.zeros((len(texts), vector_size), dtype=dtype)
+
+    # Уникальная строка -> номер строки в unique_vectors
+    unique_ids = {}
+    rows, row_ids = [], []
+    for i, text in enumerate(texts):
+        if text:
+            rows.append(i)
+            row_ids.append(unique_ids.setdefault(text, len(unique_ids)))
+
+    if not unique_ids:
+        return text_features
+
+    unique_texts = list(unique_ids)
+    encoder_id = _ENCODER_REGISTRY.source()
+    if projection is not None:
+        # Спроецированные векторы кэшируются под ключом конкретной проекции
+        encoder_id = f"{encoder_id}|pca:{projection.fingerprint()}"
+    # Кэш хранит векторы одной размерности - TEXT_FEATURE_SIZE
+    cache = get_embedding_cache() if vector_size == TEXT_FEATURE_SIZE else None
+
+    if cache is not None:
+        with timer("text.cache_lookup"):
+            unique_vectors, found = cache.get_many(unique_texts, encoder_id)
+        missing = np.flatnonzero(~found)
+        count("text.cache_hits", len(unique_texts) - missing.size)
+        count("text.cache_misses", missing.size)
+    else:
+        unique_vectors = np.empty((len(unique_texts), vector_size), dtype=dtype)
+        missing = np.arange(len(unique_texts))
+    count("text.strings", len(rows))
+    count("text.encoded", missing.size)
+
+    if missing.size:
+        embed = get_text_encoder()
+        for start in range(0, missing.size, batch_size):
+            batch_indices = missing[start:start + batch_size]
+            with timer("text.encode"):
+                vectors = embed([unique_texts[i] for i in batch_indices])
+                unique_vectors[batch_indices] = projection.transform(vectors) if projection is not None else vectors
+
+        if cache is not None:
+            cache.put_many([unique_texts[i] for i in missing], unique_vectors[missing], encoder_id)
+
+    text_features[rows] = unique_vectors[row_ids]
+    return text_features
+
+
+def extract_text_features(json_data, flat_page=None, batch_size=TEXT_BATCH_SIZE):
     """
     Извлекает и векторизует текстовые признаки из JSON-данных.
     """
-    elements = json_data.get("elements", [])
-    if not elements:
+    if flat_page is None:
+        flat_page = flatten_dom(json_data)
+
+    if flat_page["num_elements"] == 0:
         return np.array([])
 
-    print("\nЗагрузка модели Universal Sentence Encoder...")
-    print(f"URL: {MODEL_URL}")
-    
-    embed = hub.load(MODEL_URL)
-    
-    print("Модель успешно загружена.")
-
-    text_features = []
-    for element in elements:
-        text_parts = [
-            element.get("text", ""),
-            element.get("alt", ""),
-            element.get("title", ""),
-            element.get("placeholder", "")
-        ]
-        concatenated_text = " ".join(filter(None, text_parts)).strip()
-
-        if concatenated_text:
-            vector = embed([concatenated_text])[0].numpy()
-        else:
-            vector = np.zeros(VECTOR_SIZE)
-        
-        text_features.append(vector)
+    return embed_texts(concatenate_texts(flat_page), batch_size=batch_size)
+
+
+def extract_text_features_batch(flat_pages, batch_size=TEXT_BATCH_SIZE):
+    """
+    Векторизует тексты сразу нескольких страниц одним потоком батчей.
+
+    Args:
+        flat_pages (list): Развернутые страницы (см. flatten_dom).
+
+    Returns:
+        list: Матрицы (N_i, TEXT_FEATURE_SIZE) для каждой страницы
+              (представления одной общей матрицы).
+    """
+    texts = []
+    offsets = [0]
+    for flat_page in flat_pages:
+        texts.extend(concatenate_texts(flat_page))
+        offsets.append(len(texts))
+
+    text_features = embed_texts(texts, batch_size=batch_size)
+    return [text_features[start:end] for start, end in zip(offsets[:-1], offsets[1:])]
 
-    return np.array(text_features)
 
 if __name__ == '__main__':
-    import json
     import sys
     sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from feature_extractor.dom_stream import load_flat_page
 
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
     try:
         setup_model_cache()
         
         example_json_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'dataset', 'example_dom.json')
         
-        with open(example_json_path, 'r', encoding='utf-8') as f:
-            dom_data = json.load(f)
+        flat_page = load_flat_page(example_json_path)
         
-        text_vectors = extract_text_features(dom_data)
+        text_vectors = extract_text_features(None, flat_page=flat_page)
         
         print("\nМатрица текстовых признаков успешно создана.")
         print(f"Форма матрицы: {text_vectors.shape}")
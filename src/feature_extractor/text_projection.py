@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+
+"""
+Понижение размерности текстовых эмбеддингов: PCA, обученный на корпусе.
+
+Эмбеддинги USE занимают 512 из ~530 столбцов вектора элемента, поэтому
+основная доля памяти, размера хранилища признаков и стоимости проекций
+внимания приходится на текст. Проекция на первые TEXT_PROJECTION_SIZE
+главных компонент (config.py) сохраняет большую часть дисперсии, а
+результат хранится во float16 - в кэше эмбеддингов и в хранилище признаков.
+
+Ковариация накапливается потоково (сумма и матрица X^T X во float64),
+поэтому корпус проходится один раз батчами эмбеддингов.
+"""
+
+import hashlib
+import os
+
+import numpy as np
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+DEFAULT_PROJECTION_PATH = os.path.join(PROJECT_ROOT, 'text_projection.npz')
+
+# Тип хранения спроецированных векторов
+PROJECTED_DTYPE = np.float16
+
+
+class TextProjection:
+    """
+    Линейная проекция x -> (x - mean) @ components.T.
+
+    Args:
+        mean (np.ndarray): Среднее эмбеддингов корпуса (D,).
+        components (np.ndarray): Главные компоненты (size, D) по убыванию дисперсии.
+        explained_variance_ratio (float): Доля дисперсии корпуса, которую сохраняет проекция.
+    """
+
+    def __init__(self, mean, components, explained_variance_ratio=None):
+        self.mean = np.asarray(mean, dtype=np.float32)
+        self.components = np.asarray(components, dtype=np.float32)
+        self.explained_variance_ratio = explained_variance_ratio
+        self._fingerprint = None
+
+    @property
+    def size(self):
+        return self.components.shape[0]
+
+    @property
+    def input_size(self):
+        return self.components.shape[1]
+
+    def fingerprint(self):
+        """Короткий хеш параметров: ключ кэша эмбеддингов и часть отпечатка хранилища."""
+        if self._fingerprint is None:
+            sha1 = hashlib.sha1()
+            sha1.update(self.mean.tobytes())
+            sha1.update(self.components.tobytes())
+            self._fingerprint = sha1.hexdigest()[:16]
+        return self._fingerprint
+
+    def transform(self, vectors):
+        """(N, D) float32 -> (N, size) float16."""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        return ((vectors - self.mean) @ self.components.T).astype(PROJECTED_DTYPE)
+
+    def save(self, path=DEFAULT_PROJECTION_PATH):
+        tmp_path = path + '.tmp.npz'
+        np.savez(tmp_path, mean=self.mean, components=self.components,
+                 explained_variance_ratio=np.float64(self.explained_variance_ratio or 0.0))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path=DEFAULT_PROJECTION_PATH):
+        with np.load(path) as data:
+            return cls(data["mean"], data["components"], float(data["explained_variance_ratio"]))
+
+
+class CovarianceAccumulator:
+    """
+    Потоковая ковариация строк матрицы: число строк, сумма и X^T X.
+    Частичные накопители шардов объединяются через merge.
+    """
+
+    def __init__(self, num_features):
+        self.num_features = num_features
+        self.count = 0
+        self.total = np.zeros(num_features, dtype=np.float64)
+        self.gram = np.zeros((num_features, num_features), dtype=np.float64)
+
+    def update(self, matrix):
+        matrix = np.asarray(matrix, dtype=np.float64).reshape(-1, self.num_features)
+        self.count += len(matrix)
+        self.total += matrix.sum(axis=0)
+        self.gram += matrix.T @ matrix
+        return self
+
+    def merge(self, other):
+        self.count += other.count
+        self.total += other.total
+        self.gram += other.gram
+        return self
+
+    def to_projection(self, size):
+        """Первые size главных компонент накопленной ковариации."""
+        if self.count < 2:
+            raise ValueError("Для PCA нужно хотя бы два непустых текста")
+        size = min(size, self.num_features)
+
+        mean = self.total / self.count
+        covariance = self.gram / self.count - np.outer(mean, mean)
+        eigenvalues, eigenvectors = np.linalg.eigh(covariance)
+        order = np.argsort(eigenvalues)[::-1][:size]
+        components = eigenvectors[:, order].T
+        # Знак компоненты произволен; фиксируем его, чтобы проекция была воспроизводимой
+        signs = np.sign(components[np.arange(size), np.argmax(np.abs(components), axis=1)])
+        components *= np.where(signs == 0, 1.0, signs)[:, None]
+
+        total_variance = np.clip(eigenvalues, 0, None).sum()
+        explained = float(np.clip(eigenvalues[order], 0, None).sum() / total_variance) if total_variance > 0 else 1.0
+        return TextProjection(mean, components, explained)
+
+
+def fit_projection(vector_batches, size, num_features):
+    """Один проход по батчам эмбеддингов (N_i, num_features) -> TextProjection."""
+    accumulator = CovarianceAccumulator(num_features)
+    for vectors in vector_batches:
+        accumulator.update(vectors)
+    return accumulator.to_projection(size)
@@ -0,0 +1,253 @@
+# -*- coding: utf-8 -*-
+
+"""
+Предвычисленное хранилище признаков.
+
+Все модальности извлекаются один раз и складываются в колоночные .npy-файлы:
+по одному склеенному массиву на каждый вход модели (text_input, numeric_input,
+color_input, *_input), массив смещений границ страниц и массив оценок.
+Массивы хранятся в типе извлеченных признаков (text_input - во float16
+при включенной проекции текстов, см. TEXT_PROJECTION_SIZE).
+Читатель открывает файлы через memory map и отдает страницы как представления
+без копирования. При пересборке заново извлекаются только страницы, чей
+исходный файл изменился; смена конфигурации признаков пересобирает все.
+"""
+
+import hashlib
+import json
+import logging
+import os
+
+import numpy as np
+
+from config import FEATURE_MAPPING, MAX_PAGE_ELEMENTS, INTERACTIVE_TAGS, DROP_HIDDEN_ELEMENTS
+from data_loader import iter_page_features, TEXT_CHUNK_PAGES
+from feature_extractor.categorical_feature_extractor import get_categorical_vocabulary
+from feature_extractor.text_feature_extractor import (
+    get_encoder_metrics, get_text_projection, TEXT_FEATURE_SIZE, TEXT_BATCH_SIZE
+)
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_STORE_DIR = os.path.join(PROJECT_ROOT, 'feature_store')
+
+logger = logging.getLogger(__name__)
+
+# Версия формата; увеличивается при несовместимых изменениях
+STORE_VERSION = 1
+
+_MANIFEST_FILE = 'manifest.json'
+_OFFSETS_FILE = 'offsets.npy'
+_LABELS_FILE = 'labels.npy'
+
+
+def feature_config_fingerprint():
+    """Хеш всего, от чего зависят значения признаков."""
+    projection = get_text_projection()
+    config = {
+        "version": STORE_VERSION,
+        "feature_mapping": FEATURE_MAPPING,
+        "categorical_vocabulary": get_categorical_vocabulary().fingerprint(),
+        "text_encoder": get_encoder_metrics()["source"],
+        "text_vector_size": TEXT_FEATURE_SIZE,
+        "text_projection": projection.fingerprint() if projection is not None else None,
+        "max_page_elements": MAX_PAGE_ELEMENTS,
+        "drop_hidden_elements": DROP_HIDDEN_ELEMENTS,
+        "interactive_tags": INTERACTIVE_TAGS,
+    }
+    payload = json.dumps(config, sort_keys=True).encode('utf-8')
+    return hashlib.sha1(payload).hexdigest()
+
+
+def _file_sha1(file_path):
+    sha1 = hashlib.sha1()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            sha1.update(chunk)
+    return sha1.hexdigest()
+
+
+def _source_signature(file_path, previous=None):
+    """
+    Подпись исходного файла: mtime, размер и sha1.
+    Хеш пересчитывается, только если изменились mtime или размер.
+    """
+    try:
+        st = os.stat(file_path)
+    except FileNotFoundError:
+        return None
+
+    signature = {"mtime_ns": st.st_mtime_ns, "size": st.st_size}
+    if previous and previous["mtime_ns"] == st.st_mtime_ns and previous["size"] == st.st_size:
+        signature["sha1"] = previous["sha1"]
+    else:
+        signature["sha1"] = _file_sha1(file_path)
+    return signature
+
+
+class FeatureStore:
+    """
+    Читатель хранилища признаков.
+
+    Args:
+        store_dir (str): Каталог, созданный build_feature_store.
+    """
+
+    def __init__(self, store_dir=DEFAULT_STORE_DIR):
+        self.store_dir = store_dir
+        with open(os.path.join(store_dir, _MANIFEST_FILE), 'r', encoding='utf-8') as f:
+            self.manifest = json.load(f)
+
+        self.offsets = np.load(os.path.join(store_dir, _OFFSETS_FILE))
+        self.labels = np.load(os.path.join(store_dir, _LABELS_FILE))
+        self.arrays = {
+            name: np.load(os.path.join(store_dir, f"{name}.npy"), mmap_mode='r')
+            for name in self.manifest["inputs"]
+        }
+
+    def __len__(self):
+        return len(self.labels)
+
+    def page(self, index):
+        """Словарь входов модели для страницы index (представления memmap)."""
+        start, end = self.offsets[index], self.offsets[index + 1]
+        return {name: array[start:end] for name, array in self.arrays.items()}
+
+    def page_filenames(self):
+        """Имена исходных файлов в порядке страниц хранилища."""
+        return [entry["filename"] for entry in self.manifest["pages"] if entry["stored"]]
+
+    def to_lists(self):
+        """Возвращает (X_list, y) в том же формате, что и load_dataset."""
+        return [self.page(i) for i in range(len(self))], self.labels
+
+
+def _load_previous_store(store_dir, config_hash):
+    """Открывает существующее хранилище, если оно собрано с той же конфигурацией."""
+    try:
+        store = FeatureStore(store_dir)
+    except (FileNotFoundError, ValueError, KeyError):
+        return None, {}
+
+    if store.manifest.get("config_hash") != config_hash:
+        return None, {}
+
+    # filename -> (запись манифеста, номер страницы в хранилище или None)
+    previous = {}
+    page_index = 0
+    for entry in store.manifest["pages"]:
+        previous[entry["filename"]] = (entry, page_index if entry["stored"] else None)
+        if entry["stored"]:
+            page_index += 1
+    return store, previous
+
+
+def build_feature_store(dataset_dir=None, store_dir=DEFAULT_STORE_DIR, labels_file='labels.json',
+                        text_chunk_pages=TEXT_CHUNK_PAGES, text_batch_size=TEXT_BATCH_SIZE, num_workers=1):
+    """
+    Собирает (или обновляет) хранилище признаков для датасета.
+    При num_workers > 1 страницы извлекаются в пуле процессов.
+
+    Returns:
+        FeatureStore: Читатель собранного хранилища.
+    """
+    if dataset_dir is None:
+        dataset_dir = os.path.join(PROJECT_ROOT, 'dataset')
+
+    with open(os.path.join(dataset_dir, labels_file), 'r', encoding='utf-8') as f:
+        labels = json.load(f)
+
+    os.makedirs(store_dir, exist_ok=True)
+    config_hash = feature_config_fingerprint()
+    previous_store, previous = _load_previous_store(store_dir, config_hash)
+
+    filenames = list(labels)
+    signatures = []
+    pages = [None] * len(filenames)
+    changed = []
+
+    for position, filename in enumerate(filenames):
+        old_entry, old_index = previous.get(filename, (None, None))
+        signature = _source_signature(os.path.join(dataset_dir, filename), old_entry)
+        signatures.append(signature)
+
+        if signature is None:
+            continue
+        if old_entry is not None and old_entry["sha1"] == signature["sha1"]:
+            if old_index is not None:
+                pages[position] = previous_store.page(old_index)
+            continue
+        changed.append(position)
+
+    logger.info("Хранилище признаков: %d страниц без изменений, %d к извлечению.",
+                len(filenames) - len(changed), len(changed))
+
+    changed_paths = [os.path.join(dataset_dir, filenames[position]) for position in changed]
+    for i, model_input_dict in iter_page_features(changed_paths, text_chunk_pages, text_batch_size,
+                                                  num_workers=num_workers):
+        pages[changed[i]] = model_input_dict
+
+    stored = [position for position, page in enumerate(pages) if page is not None]
+    offsets = np.zeros(len(stored) + 1, dtype=np.int64)
+    if stored:
+        offsets[1:] = np.cumsum([len(pages[position]["text_input"]) for position in stored])
+    input_names = list(pages[stored[0]]) if stored else []
+
+    # Новые файлы пишутся рядом и подменяют старые только после записи всех данных,
+    # поскольку неизмененные страницы читаются из старых memmap-массивов
+    tmp_suffix = f".{os.getpid()}.tmp"
+    written = []
+    for name in input_names:
+        first = pages[stored[0]][name]
+        array = np.lib.format.open_memmap(
+            os.path.join(store_dir, f"{name}.npy{tmp_suffix}"), mode='w+',
+            dtype=first.dtype, shape=(int(offsets[-1]),) + first.shape[1:]
+        )
+        for page_index, position in enumerate(stored):
+            array[offsets[page_index]:offsets[page_index + 1]] = pages[position][name]
+        array.flush()
+        del array
+        written.append(f"{name}.npy")
+
+    with open(os.path.join(store_dir, _OFFSETS_FILE + tmp_suffix), 'wb') as f:
+        np.save(f, offsets, allow_pickle=False)
+    with open(os.path.join(store_dir, _LABELS_FILE + tmp_suffix), 'wb') as f:
+        np.save(f, np.array([labels[filenames[position]] for position in stored], dtype=np.float32),
+                allow_pickle=False)
+    written += [_OFFSETS_FILE, _LABELS_FILE]
+
+    manifest = {
+        "version": STORE_VERSION,
+        "config_hash": config_hash,
+        "inputs": input_names,
+        "pages": [
+            {
+                "filename": filename,
+                "stored": pages[position] is not None,
+                **(signatures[position] or {"mtime_ns": None, "size": None, "sha1": None}),
+            }
+            for position, filename in enumerate(filenames)
+        ],
+    }
+
+    del pages, previous_store
+    # Пока массивы подменяются, манифеста нет: прерванная сборка приведет к полной пересборке
+    manifest_path = os.path.join(store_dir, _MANIFEST_FILE)
+    if os.path.exists(manifest_path):
+        os.remove(manifest_path)
+    for file_name in written:
+        os.replace(os.path.join(store_dir, file_name + tmp_suffix), os.path.join(store_dir, file_name))
+    with open(manifest_path + tmp_suffix, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(manifest_path + tmp_suffix, manifest_path)
+
+    return FeatureStore(store_dir)
+
+
+if __name__ == '__main__':
+    from feature_extractor.text_feature_extractor import setup_model_cache
+
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    setup_model_cache()
+
+    store = build_feature_store()
+    print(f"Страниц в хранилище: {len(store)}, элементов: {store.offsets[-1]}")
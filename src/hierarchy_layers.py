@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+
+"""
+Иерархическое кодирование страницы: поддеревья сворачиваются снизу вверх в секции.
+
+Элементы плоской страницы идут в порядке обхода в глубину, поэтому родитель
+элемента - ближайший предыдущий элемент меньшей глубины (на полной странице
+это ровно массив parent плоской страницы). Родители восстанавливаются в графе
+по столбцу глубины numeric_input, и входы модели не меняются.
+
+Сводка поддерева определяется снизу вверх: сводка листа - его вектор,
+сводка узла - среднее его вектора и среднего сводок его детей, так что
+каждый уровень передает родителям уже свернутые поддеревья, а не плоское
+среднее всех потомков. Сводка линейна по векторам элементов, поэтому в графе
+по уровням глубины считаются только скалярные веса элементов, а векторы
+суммируются в секции один раз. Поддеревья глубже max_depth сворачиваются
+в своего предка на глубине max_depth - 1 одним уровнем.
+
+Секция - поддерево, корень которого лежит на глубине не больше section_depth
+(или у которого на странице нет предков, например, если политика длины их
+отбросила). Внимание дальше работает по короткой последовательности секций
+вместо всех элементов.
+"""
+from tensorflow import keras
+from tensorflow.keras import layers
+
+
+@keras.utils.register_keras_serializable(package="ui_ux_evaluator")
+class SectionPooling(layers.Layer):
+    """
+    Входы: [values (B, N, D) с маской паддинга, numeric (B, N, F) - сырые
+    числовые признаки, глубина в столбце depth_index].
+    Выход: (B, S, 2 * D + 1) - [вектор корня секции, сводка секции снизу вверх,
+    log(1 + размер)]; S - наибольшее число секций на странице батча. Строки
+    несуществующих секций нулевые и маскируются следующим PaddingMask
+    (у настоящей секции размер > 0).
+    """
+
+    def __init__(self, depth_index, section_depth=2, max_depth=16, **kwargs):
+        super().__init__(**kwargs)
+        if max_depth <= section_depth:
+            raise ValueError(f"max_depth={max_depth} должен быть больше section_depth={section_depth}")
+        self.depth_index = depth_index
+        self.section_depth = section_depth
+        self.max_depth = max_depth
+
+    @staticmethod
+    def _last_flagged(flags):
+        """Для каждого элемента - индекс последнего элемента с флагом не правее него (-1, если такого нет)."""
+        batch_size, length = keras.ops.shape(flags)[0], keras.ops.shape(flags)[1]
+        rank = keras.ops.cumsum(keras.ops.cast(flags, "int32"), axis=1)
+        positions = keras.ops.expand_dims(keras.ops.arange(length, dtype="int32"), 0)
+        # Номер отмеченного элемента -> его индекс, отдельно для каждой страницы батча
+        offsets = keras.ops.expand_dims(keras.ops.arange(batch_size, dtype="int32"), 1) * (length + 1)
+        table = keras.ops.segment_max(
+            keras.ops.reshape(keras.ops.where(flags, positions, -1), (-1,)),
+            keras.ops.reshape(rank + offsets, (-1,)),
+            num_segments=batch_size * (length + 1)
+        )
+        last = keras.ops.take(table, rank + offsets)
+        return keras.ops.where(rank > 0, last, -1)
+
+    def _tree(self, inputs, mask):
+        """Маска настоящих элементов, глубины, родители по уровням и признак корня секции."""
+        values, numeric = inputs
+        if isinstance(mask, (list, tuple)):
+            mask = mask[0]
+        if mask is None:
+            valid = keras.ops.ones(keras.ops.shape(values)[:2], dtype="bool")
+        else:
+            valid = keras.ops.cast(mask, "bool")
+
+        depth = keras.ops.cast(keras.ops.round(numeric[..., self.depth_index]), "int32")
+        depth = keras.ops.clip(depth, 0, self.max_depth)
+
+        starts = keras.ops.logical_and(valid, depth <= self.section_depth)
+        parents = {}
+        for level in range(self.section_depth + 1, self.max_depth + 1):
+            at_level = keras.ops.logical_and(valid, keras.ops.equal(depth, level))
+            parents[level] = self._last_flagged(keras.ops.logical_and(valid, depth < level))
+            # Элемент без предков на странице сам открывает секцию
+            starts = keras.ops.logical_or(starts, keras.ops.logical_and(at_level, parents[level] < 0))
+        return valid, depth, parents, starts
+
+    def _summary_weights(self, valid, depth, parents, starts):
+        """
+        Вес вектора каждого элемента в сводке его секции. Сводка линейна по векторам:
+        у узла с детьми собственный вектор входит с весом 1/2, а каждый ребенок -
+        с весом 1 / (2 * число детей), поэтому веса считаются по скалярам сверху вниз.
+        """
+        batch_size, length = keras.ops.shape(depth)[0], keras.ops.shape(depth)[1]
+        parent = keras.ops.full_like(depth, -1)
+        for level, level_parents in parents.items():
+            parent = keras.ops.where(keras.ops.equal(depth, level), level_parents, parent)
+        # Корни секций остаются в своей секции, остальные - дети своего родителя
+        children = keras.ops.logical_and(valid, keras.ops.logical_not(starts))
+
+        offsets = keras.ops.expand_dims(keras.ops.arange(batch_size, dtype="int32"), 1) * length
+        segment = keras.ops.reshape(keras.ops.where(children, parent + offsets, batch_size * length), (-1,))
+        num_children = keras.ops.segment_sum(
+            keras.ops.reshape(keras.ops.cast(children, "float32"), (-1,)), segment,
+            num_segments=batch_size * length + 1
+        )[:-1]
+        num_children = keras.ops.reshape(num_children, (batch_size, length))
+        own_weight = keras.ops.where(num_children > 0, 0.5, 1.0)
+        child_weight = 0.5 / keras.ops.maximum(num_children, 1.0)
+
+        # Вес пути до корня секции: произведение весов детей по предкам
+        path_weight = keras.ops.ones_like(own_weight)
+        safe_parent = keras.ops.maximum(parent, 0)
+        for level in range(self.section_depth + 1, self.max_depth + 1):
+            at_level = keras.ops.logical_and(children, keras.ops.equal(depth, level))
+            inherited = keras.ops.take_along_axis(path_weight * child_weight, safe_parent, axis=1)
+            path_weight = keras.ops.where(at_level, inherited, path_weight)
+        return own_weight * path_weight
+
+    def call(self, inputs, mask=None):
+        values = inputs[0]
+        valid, depth, parents, starts = self._tree(inputs, mask)
+        weights = self._summary_weights(valid, depth, parents, starts)
+
+        section = keras.ops.cumsum(keras.ops.cast(starts, "int32"), axis=1) - 1
+        section = keras.ops.where(valid, section, -1)
+
+        batch_size = keras.ops.shape(values)[0]
+        num_sections = keras.ops.maximum(keras.ops.max(section) + 1, 1)
+        # Сквозные номера секций по батчу; паддинг уходит в лишнюю секцию-свалку
+        offsets = keras.ops.expand_dims(keras.ops.arange(batch_size), 1) * num_sections
+        segment = keras.ops.reshape(keras.ops.where(section >= 0, section + offsets, batch_size * num_sections), (-1,))
+        num_segments = batch_size * num_sections + 1
+
+        def pool(tensor):
+            flat = keras.ops.reshape(tensor, (-1, tensor.shape[-1]))
+            summed = keras.ops.segment_sum(flat, segment, num_segments=num_segments)[:-1]
+            return keras.ops.reshape(summed, (batch_size, num_sections, tensor.shape[-1]))
+
+        starts = keras.ops.expand_dims(keras.ops.cast(starts, values.dtype), -1)
+        counts = pool(keras.ops.ones_like(starts))
+        roots = pool(values * starts)
+        summaries = pool(values * keras.ops.expand_dims(keras.ops.cast(weights, values.dtype), -1))
+        return keras.ops.concatenate([roots, summaries, keras.ops.log1p(counts)], axis=-1)
+
+    def compute_mask(self, inputs, mask=None):
+        return None
+
+    def compute_output_shape(self, input_shape):
+        values_shape = input_shape[0]
+        return (values_shape[0], None, 2 * values_shape[-1] + 1)
+
+    def get_config(self):
+        return {
+            **super().get_config(),
+            "depth_index": self.depth_index,
+            "section_depth": self.section_depth,
+            "max_depth": self.max_depth,
+        }
@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+
+"""
+Инкрементальное извлечение признаков для повторной оценки страниц.
+
+Для каждой страницы (по ключу - URL или id) хранятся признаки последнего
+снимка и индекс "подпись элемента -> строка". Подпись - кортеж всех входов
+построчных признаков элемента: значения колонок (COLUMN_KEYS), глубина и число
+детей. Все экстракторы (текст, числа, цвета, категории) считают строку только
+по этим значениям, поэтому строка с совпавшей подписью берется из кэша
+без пересчета, где бы элемент ни оказался после вставок и удалений соседей.
+Заново извлекаются и векторизуются только измененные и новые элементы,
+после чего строки склеиваются в массивы новой страницы в порядке документа.
+
+Разбор JSON и обход дерева по-прежнему линейны по размеру страницы, а прямой
+проход модели идет по всей странице (внимание связывает все элементы);
+пропорциональной размеру изменения становится стоимость экстракторов
+и текстового энкодера.
+"""
+
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from data_loader import _extract_page_features
+from feature_extractor.dom_flattener import COLUMN_KEYS, flatten_dom
+from feature_extractor.element_selection import apply_length_policy, _remap_parents
+from feature_extractor.text_feature_extractor import extract_text_features_batch, TEXT_BATCH_SIZE
+from instrumentation import timer, count
+
+# Предельный объем признаков в кэше; при превышении вытесняются давно не оценивавшиеся страницы
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+
+def element_signatures(flat_page):
+    """Подписи элементов плоской страницы: кортеж (значения COLUMN_KEYS..., depth, num_children)."""
+    columns = [flat_page["columns"][key] for key in COLUMN_KEYS]
+    return list(zip(*columns, flat_page["depth"].tolist(), flat_page["num_children"].tolist()))
+
+
+def take_elements(flat_page, index):
+    """Плоская страница из элементов index (в порядке index)."""
+    return {
+        "num_elements": len(index),
+        "columns": {key: column[index] for key, column in flat_page["columns"].items()},
+        "depth": flat_page["depth"][index],
+        "num_children": flat_page["num_children"][index],
+        "parent": _remap_parents(flat_page["parent"], index),
+    }
+
+
+class _PageEntry:
+    __slots__ = ("index", "features", "nbytes")
+
+    def __init__(self, signatures, features):
+        # Повторяющиеся элементы дают одинаковые строки, поэтому достаточно любой из них
+        self.index = dict(zip(signatures, range(len(signatures))))
+        self.features = features
+        self.nbytes = sum(array.nbytes for array in features.values())
+
+
+class PageFeatureCache:
+    """
+    Признаки последних снимков страниц в памяти процесса (LRU по объему).
+
+    Args:
+        max_bytes (int): Предельный суммарный объем массивов признаков.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._pages = OrderedDict()
+        self._nbytes = 0
+        self._lock = threading.Lock()
+        self._stats = {"pages": 0, "cached_pages": 0, "elements": 0, "reused_elements": 0}
+
+    def __len__(self):
+        return len(self._pages)
+
+    def stats(self):
+        """Счетчики: страницы, страницы с прошлым снимком, элементы и сколько из них взято из кэша."""
+        with self._lock:
+            return {**self._stats, "entries": len(self._pages), "bytes": self._nbytes}
+
+    def clear(self):
+        with self._lock:
+            self._pages.clear()
+            self._nbytes = 0
+
+    def _get(self, page_key):
+        with self._lock:
+            entry = self._pages.get(page_key)
+            if entry is not None:
+                self._pages.move_to_end(page_key)
+            return entry
+
+    def _put(self, page_key, entry):
+        with self._lock:
+            previous = self._pages.pop(page_key, None)
+            if previous is not None:
+                self._nbytes -= previous.nbytes
+            self._pages[page_key] = entry
+            self._nbytes += entry.nbytes
+            while self._nbytes > self.max_bytes and len(self._pages) > 1:
+                _, evicted = self._pages.popitem(last=False)
+                self._nbytes -= evicted.nbytes
+
+    def _plan(self, page_key, flat_page):
+        """Строки прошлого снимка для элементов страницы (-1 - пересчитать) и подписи."""
+        num_elements = flat_page["num_elements"]
+        signatures = element_signatures(flat_page)
+        entry = self._get(page_key) if page_key is not None else None
+        if entry is None:
+            return signatures, None, np.full(num_elements, -1, dtype=np.int64)
+        try:
+            rows = np.fromiter((entry.index.get(signature, -1) for signature in signatures),
+                               dtype=np.int64, count=num_elements)
+        except TypeError:
+            # Нехешируемое значение атрибута (список, объект): страница пересчитывается целиком
+            return None, None, np.full(num_elements, -1, dtype=np.int64)
+        return signatures, entry, rows
+
+    def extract(self, documents, page_keys=None, text_batch_size=TEXT_BATCH_SIZE, flat_pages=None):
+        """
+        Признаки DOM-документов с переиспользованием строк прошлых снимков тех же страниц.
+
+        Args:
+            documents (list): DOM-документы (словари).
+            page_keys (list, optional): Ключ страницы (URL, id) на каждый документ;
+                None - без кэша для этого документа.
+            flat_pages (list, optional): Уже развернутые страницы документов после политики длины.
+
+        Returns:
+            list: Словарь входов модели на каждый документ (как extract_documents);
+                  None для пустой страницы.
+        """
+        page_keys = list(page_keys) if page_keys is not None else [None] * len(documents)
+        if flat_pages is None:
+            with timer("flatten"):
+                flat_pages = [flatten_dom(document) for document in documents]
+            with timer("select_elements"):
+                flat_pages = [apply_length_policy(flat_page) for flat_page in flat_pages]
+
+        with timer("incremental.diff"):
+            plans = [
+                self._plan(page_key, flat_page) if flat_page["num_elements"] else None
+                for page_key, flat_page in zip(page_keys, flat_pages)
+            ]
+        changed_pages = [
+            take_elements(flat_page, np.flatnonzero(plan[2] < 0))
+            for flat_page, plan in zip(flat_pages, plans)
+            if plan is not None and np.any(plan[2] < 0)
+        ]
+        text_matrices = iter(extract_text_features_batch(changed_pages, batch_size=text_batch_size))
+        changed_pages = iter(changed_pages)
+
+        pages = []
+        for page_key, flat_page, plan in zip(page_keys, flat_pages, plans):
+            if plan is None:
+                pages.append(None)
+                continue
+            signatures, entry, rows = plan
+            changed = np.flatnonzero(rows < 0)
+            new_features = None
+            if changed.size:
+                changed_page = next(changed_pages)
+                new_features = {"text_input": next(text_matrices), **_extract_page_features(changed_page)}
+
+            with timer("incremental.splice"):
+                features = self._splice(entry, rows, changed, new_features)
+            if page_key is not None and signatures is not None:
+                try:
+                    unchanged = entry is not None and features is entry.features
+                    self._put(page_key, entry if unchanged else _PageEntry(signatures, features))
+                except TypeError:
+                    # Нехешируемое значение атрибута: страница не кэшируется
+                    pass
+
+            reused = len(rows) - changed.size
+            with self._lock:
+                self._stats["pages"] += 1
+                self._stats["cached_pages"] += entry is not None
+                self._stats["elements"] += len(rows)
+                self._stats["reused_elements"] += reused
+            count("incremental.reused_elements", reused)
+            count("incremental.recomputed_elements", changed.size)
+            pages.append(features)
+        return pages
+
+    @staticmethod
+    def _splice(entry, rows, changed, new_features):
+        """Массивы новой страницы: строки из кэша плюс пересчитанные строки changed."""
+        if entry is None or changed.size == len(rows):
+            return new_features
+        if changed.size == 0 and len(rows) == len(next(iter(entry.features.values()))) \
+                and np.array_equal(rows, np.arange(len(rows))):
+            # Снимок не изменился: массивы прошлого снимка используются как есть
+            return entry.features
+
+        reused = np.flatnonzero(rows >= 0)
+        features = {}
+        for name, cached in entry.features.items():
+            array = np.empty((len(rows),) + cached.shape[1:], dtype=cached.dtype)
+            array[reused] = cached[rows[reused]]
+            if changed.size:
+                array[changed] = new_features[name]
+            features[name] = array
+        return features
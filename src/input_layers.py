@@ -4,15 +4,8 @@
 Определяет все входные слои (keras.Input) для мультимодальной модели.
 """
 from tensorflow.keras import layers
-import os
-import sys
 
-# Добавляем корень проекта в sys.path для импорта config
-PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-if PROJECT_ROOT not in sys.path:
-    sys.path.append(PROJECT_ROOT)
-
-from src.config import FEATURE_MAPPING
+from config import FEATURE_MAPPING
 
 
 def create_model_inputs(text_vector_size, numeric_vector_size, color_vector_size):
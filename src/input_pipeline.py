@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+
+"""
+Потоковый входной конвейер на tf.data.
+
+Страницы читаются по списку из labels.json, перемешиваются (перемешиваются
+только пути к файлам), страницы близкой длины собираются в дополненные
+нулями батчи, а готовые батчи подгружаются заранее (prefetch).
+Весь корпус в памяти не держится, поэтому обучение начинается сразу
+и работает на корпусах больше объема RAM.
+
+Извлечение признаков - чистый Python. При num_workers > 1 оно идет в пуле
+процессов (data_loader.iter_page_features_parallel, тексты векторизуются
+одним энкодером в главном процессе), и конвейер читает готовые страницы
+через from_generator. При num_workers = 1 страницы извлекаются в map
+с num_parallel_calls: это потоки одного процесса, они держат GIL
+и перекрывают только чтение файлов, а не сам разбор.
+"""
+
+import functools
+import json
+import logging
+import os
+
+import numpy as np
+import tensorflow as tf
+
+from config import FEATURE_MAPPING, MAX_PAGE_ELEMENTS
+from data_loader import load_page_features, iter_page_features_parallel
+from instrumentation import count
+from models import TEXT_VECTOR_SIZE, NUMERIC_VECTOR_SIZE, COLOR_VECTOR_SIZE
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+logger = logging.getLogger(__name__)
+
+# Имена входов модели и форма одной строки (элемента) каждого входа
+INPUT_SPECS = {
+    "text_input": ((TEXT_VECTOR_SIZE,), tf.float32),
+    "numeric_input": ((NUMERIC_VECTOR_SIZE,), tf.float32),
+    "color_input": ((COLOR_VECTOR_SIZE,), tf.float32),
+    **{f"{name}_input": ((1,), tf.int32) for name in FEATURE_MAPPING.get("categorical", [])},
+}
+
+# Границы бакетов по числу элементов страницы
+DEFAULT_BUCKET_BOUNDARIES = [32, 64, 128, 256, 512, 1024, 2048, 4096]
+
+
+def _empty_page():
+    return tuple(
+        np.zeros((0,) + row_shape, dtype=dtype.as_numpy_dtype)
+        for row_shape, dtype in INPUT_SPECS.values()
+    )
+
+
+def _load_page_arrays(file_path, max_elements=MAX_PAGE_ELEMENTS):
+    """Признаки одной страницы в порядке INPUT_SPECS; пустые массивы при ошибке."""
+    try:
+        model_input_dict = load_page_features(file_path.decode('utf-8'), max_elements=max_elements)
+    except Exception:
+        count("pages_failed")
+        logger.warning("Страница пропущена: %s", file_path.decode('utf-8'), exc_info=True)
+        return _empty_page()
+
+    if model_input_dict is None:
+        return _empty_page()
+
+    return tuple(
+        np.asarray(model_input_dict[name], dtype=dtype.as_numpy_dtype)
+        for name, (_, dtype) in INPUT_SPECS.items()
+    )
+
+
+def _extract_page(file_path, score, max_elements):
+    arrays = tf.numpy_function(
+        functools.partial(_load_page_arrays, max_elements=max_elements), [file_path],
+        Tout=[dtype for _, dtype in INPUT_SPECS.values()],
+        stateful=False
+    )
+    features = {
+        name: tf.ensure_shape(array, (None,) + row_shape)
+        for (name, (row_shape, _)), array in zip(INPUT_SPECS.items(), arrays)
+    }
+    return features, score
+
+
+def _pool_page_dataset(file_paths, scores, num_workers, shuffle, seed, max_elements):
+    """Страницы из пула процессов; при shuffle порядок файлов новый на каждой эпохе."""
+    rng = np.random.default_rng(seed)
+
+    def generate():
+        order = rng.permutation(len(file_paths)) if shuffle else np.arange(len(file_paths))
+        pages = iter_page_features_parallel([file_paths[i] for i in order], num_workers, max_elements=max_elements)
+        for position, model_input_dict in pages:
+            features = {
+                name: np.asarray(model_input_dict[name], dtype=dtype.as_numpy_dtype)
+                for name, (_, dtype) in INPUT_SPECS.items()
+            }
+            yield features, scores[order[position]]
+
+    output_signature = (
+        {name: tf.TensorSpec((None,) + row_shape, dtype) for name, (row_shape, dtype) in INPUT_SPECS.items()},
+        tf.TensorSpec((), tf.float32),
+    )
+    return tf.data.Dataset.from_generator(generate, output_signature=output_signature)
+
+
+def read_labels(dataset_dir=None, labels_file='labels.json'):
+    """Пути к файлам страниц и их оценки (np.ndarray float32) из labels.json."""
+    if dataset_dir is None:
+        dataset_dir = os.path.join(PROJECT_ROOT, 'dataset')
+
+    with open(os.path.join(dataset_dir, labels_file), 'r', encoding='utf-8') as f:
+        labels = json.load(f)
+
+    file_paths = [os.path.join(dataset_dir, filename) for filename in labels]
+    return file_paths, np.array(list(labels.values()), dtype=np.float32)
+
+
+def make_page_dataset(dataset_dir=None, labels_file='labels.json', batch_size=8,
+                      num_parallel_calls=tf.data.AUTOTUNE, shuffle_buffer=1024,
+                      bucket_boundaries=DEFAULT_BUCKET_BOUNDARIES, prefetch=tf.data.AUTOTUNE,
+                      seed=None, max_elements=MAX_PAGE_ELEMENTS, num_workers=1):
+    """
+    Строит tf.data.Dataset батчей (словарь входов модели, оценки).
+
+    Args:
+        dataset_dir (str, optional): Каталог датасета (по умолчанию dataset/).
+        batch_size (int): Размер батча.
+        num_parallel_calls (int): Сколько страниц извлекается параллельно потоками
+            при num_workers = 1 (разбор упирается в GIL, см. описание модуля).
+        shuffle_buffer (int): Размер буфера перемешивания (в файлах). 0 - без перемешивания.
+            В пуле процессов перемешивается весь список путей.
+        bucket_boundaries (list): Границы бакетов по числу элементов страницы.
+        prefetch (int): Сколько батчей готовить заранее.
+        seed (int, optional): Зерно перемешивания.
+        max_elements (int, optional): Лимит элементов страницы (политика длины); None - без лимита.
+        num_workers (int): Процессов извлечения признаков; 1 - без пула процессов.
+    """
+    file_paths, scores = read_labels(dataset_dir, labels_file)
+
+    if num_workers > 1:
+        dataset = _pool_page_dataset(file_paths, scores, num_workers, bool(shuffle_buffer), seed, max_elements)
+    else:
+        dataset = tf.data.Dataset.from_tensor_slices((file_paths, scores))
+        if shuffle_buffer:
+            # Перемешиваются только пути к файлам, поэтому буфер почти не занимает памяти
+            dataset = dataset.shuffle(shuffle_buffer, seed=seed, reshuffle_each_iteration=True)
+
+        dataset = dataset.map(lambda file_path, score: _extract_page(file_path, score, max_elements),
+                              num_parallel_calls=num_parallel_calls, deterministic=False)
+        dataset = dataset.filter(lambda features, score: tf.shape(features["text_input"])[0] > 0)
+
+    dataset = dataset.bucket_by_sequence_length(
+        element_length_func=lambda features, score: tf.shape(features["text_input"])[0],
+        bucket_boundaries=bucket_boundaries,
+        bucket_batch_sizes=[batch_size] * (len(bucket_boundaries) + 1),
+        pad_to_bucket_boundary=False
+    )
+
+    return dataset.prefetch(prefetch)
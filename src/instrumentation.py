@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+
+"""
+Легковесные замеры по стадиям конвейера.
+
+Стадии (разбор JSON, каждый экстрактор, кодирование текста, паддинг,
+predict и train_on_batch) оборачиваются в timer(name), а объемы
+(элементы, прочитанные байты, попадания кэша) считаются через count(name).
+Отчет - JSON-совместимый словарь с p50/p95/p99 (report) или текст в формате
+Prometheus (to_prometheus).
+
+По умолчанию замеры выключены: timer возвращает общий пустой контекст,
+count сразу выходит, поэтому стоимость в горячих циклах - одна проверка флага.
+Включаются enable_profiling() или переменной окружения UI_UX_PROFILE=1.
+Замеры ведутся в пределах процесса: воркеры пула процессов считают свои.
+"""
+
+import os
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+PROFILE_ENV = 'UI_UX_PROFILE'
+# Сколько последних замеров стадии хранится для перцентилей
+TIMER_WINDOW = 4096
+PROMETHEUS_PREFIX = 'ui_ux'
+
+_STATE = {"enabled": os.environ.get(PROFILE_ENV, '') not in ('', '0')}
+_LOCK = threading.Lock()
+# Имя стадии -> [число вызовов, суммарное время, deque последних длительностей]
+_TIMERS = {}
+_COUNTERS = {}
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class _Timer:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        record_time(self.name, time.perf_counter() - self.start)
+        return False
+
+
+def enable_profiling(enabled=True):
+    """Включает или выключает замеры в процессе."""
+    _STATE["enabled"] = enabled
+
+
+def profiling_enabled():
+    return _STATE["enabled"]
+
+
+def timer(name):
+    """Контекст, замеряющий длительность стадии name (пустой, если замеры выключены)."""
+    if not _STATE["enabled"]:
+        return _NULL_TIMER
+    return _Timer(name)
+
+
+def record_time(name, seconds):
+    """Добавляет готовый замер длительности стадии."""
+    if not _STATE["enabled"]:
+        return
+    with _LOCK:
+        stats = _TIMERS.get(name)
+        if stats is None:
+            stats = _TIMERS[name] = [0, 0.0, deque(maxlen=TIMER_WINDOW)]
+        stats[0] += 1
+        stats[1] += seconds
+        stats[2].append(seconds)
+
+
+def count(name, value=1):
+    """Увеличивает счетчик name на value."""
+    if not _STATE["enabled"]:
+        return
+    with _LOCK:
+        _COUNTERS[name] = _COUNTERS.get(name, 0) + value
+
+
+def reset():
+    with _LOCK:
+        _TIMERS.clear()
+        _COUNTERS.clear()
+
+
+def report():
+    """
+    Снимок замеров.
+
+    Returns:
+        dict: {
+            "enabled": bool,
+            "stages": {имя: {"count", "total_sec", "p50_ms", "p95_ms", "p99_ms", "max_ms"}},
+            "counters": {имя: значение}
+        }
+        Перцентили считаются по последним TIMER_WINDOW замерам стадии.
+    """
+    with _LOCK:
+        timers = {name: (calls, total, np.array(window)) for name, (calls, total, window) in _TIMERS.items()}
+        counters = dict(_COUNTERS)
+
+    stages = {}
+    for name, (calls, total, window) in sorted(timers.items()):
+        p50, p95, p99 = np.percentile(window, [50, 95, 99]) * 1000
+        stages[name] = {
+            "count": calls,
+            "total_sec": total,
+            "p50_ms": float(p50),
+            "p95_ms": float(p95),
+            "p99_ms": float(p99),
+            "max_ms": float(window.max() * 1000),
+        }
+    return {"enabled": _STATE["enabled"], "stages": stages, "counters": dict(sorted(counters.items()))}
+
+
+def _metric_name(name):
+    return ''.join(char if char.isalnum() else '_' for char in name)
+
+
+def to_prometheus(snapshot=None):
+    """Отчет в текстовом формате Prometheus (summary по стадиям и счетчики)."""
+    snapshot = snapshot or report()
+    stage_metric = f"{PROMETHEUS_PREFIX}_stage_seconds"
+    lines = [f"# TYPE {stage_metric} summary"]
+    for name, stats in snapshot["stages"].items():
+        for quantile, key in (("0.5", "p50_ms"), ("0.95", "p95_ms"), ("0.99", "p99_ms")):
+            lines.append(f'{stage_metric}{{stage="{name}",quantile="{quantile}"}} {stats[key] / 1000:.6g}')
+        lines.append(f'{stage_metric}_sum{{stage="{name}"}} {stats["total_sec"]:.6g}')
+        lines.append(f'{stage_metric}_count{{stage="{name}"}} {stats["count"]}')
+
+    for name, value in snapshot["counters"].items():
+        metric = f"{PROMETHEUS_PREFIX}_{_metric_name(name)}_total"
+        lines.append(f"# TYPE {metric} counter")
+        lines.append(f"{metric} {value}")
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+
+"""
+Слои маскирования элементов-заглушек, добавленных при паддинге батча.
+"""
+from tensorflow import keras
+from tensorflow.keras import layers
+
+
+@keras.utils.register_keras_serializable(package="ui_ux_evaluator")
+class PaddingMask(layers.Layer):
+    """
+    Навешивает на values маску по опорному тензору reference:
+    позиция замаскирована, если все признаки reference равны mask_value.
+
+    Обычный Masking здесь не подходит: после склейки с эмбеддингами
+    категорий строка паддинга уже не нулевая (эмбеддинг индекса 0 обучается).
+    """
+
+    def __init__(self, mask_value=0.0, **kwargs):
+        super().__init__(**kwargs)
+        self.mask_value = mask_value
+        self.supports_masking = True
+
+    def compute_mask(self, inputs, mask=None):
+        _, reference = inputs
+        return keras.ops.any(keras.ops.not_equal(reference, self.mask_value), axis=-1)
+
+    def call(self, inputs):
+        values, reference = inputs
+        boolean_mask = keras.ops.any(
+            keras.ops.not_equal(reference, self.mask_value), axis=-1, keepdims=True
+        )
+        return keras.ops.where(boolean_mask, values, 0.0)
+
+    def compute_output_shape(self, input_shape):
+        return input_shape[0]
+
+    def get_config(self):
+        return {**super().get_config(), "mask_value": self.mask_value}
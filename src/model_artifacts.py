@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+
+"""
+Артефакты признаков, сохраняемые вместе с моделью.
+
+Значения входов модели зависят от словаря категорий (тот же тег с другим
+словарем попадет в другую строку Embedding-слоя) и от проекции текстов
+(другой PCA - другие оси text_input). Поэтому при сохранении модели рядом
+с ней пишется манифест <модель без расширения>.features.json со словарем
+и отпечатками, а проекция - в <модель без расширения>.projection.npz.
+При загрузке для оценки признаки процесса берутся отсюда, а не из общих
+файлов в корне проекта. .keras и экспортированная из нее .tflite с тем же
+именем делят одни артефакты.
+"""
+
+import json
+import logging
+import os
+import shutil
+
+from config import TEXT_PROJECTION_SIZE
+from feature_extractor.categorical_feature_extractor import (
+    configure_categorical_vocabulary, get_categorical_vocabulary
+)
+from feature_extractor.categorical_vocabulary import CategoricalVocabulary
+from feature_extractor.text_feature_extractor import configure_text_projection, get_text_projection
+from feature_extractor.text_projection import TextProjection
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_SUFFIX = '.features.json'
+PROJECTION_SUFFIX = '.projection.npz'
+
+
+def manifest_path(model_path):
+    """Путь манифеста признаков модели: trained_model.keras -> trained_model.features.json."""
+    return os.path.splitext(model_path)[0] + MANIFEST_SUFFIX
+
+
+def projection_path(model_path):
+    """Путь проекции текстов модели: trained_model.keras -> trained_model.projection.npz."""
+    return os.path.splitext(model_path)[0] + PROJECTION_SUFFIX
+
+
+def configure_features(vocabulary, projection=None):
+    """Задает словарь и проекцию процесса (инициализатор процессов-воркеров)."""
+    configure_categorical_vocabulary(vocabulary)
+    if projection is not None:
+        configure_text_projection(projection)
+
+
+def save_model_artifacts(model_path):
+    """Записывает рядом с моделью признаки, с которыми она обучалась (словарь и проекция процесса)."""
+    vocabulary = get_categorical_vocabulary()
+    projection = get_text_projection()
+    manifest = {
+        "categorical_vocabulary": vocabulary.to_dict(),
+        "categorical_vocabulary_fingerprint": vocabulary.fingerprint(),
+        "text_projection_fingerprint": projection.fingerprint() if projection is not None else None,
+    }
+    if projection is not None:
+        projection.save(projection_path(model_path))
+    path = manifest_path(model_path)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+    return path
+
+
+def copy_model_artifacts(source_model_path, target_model_path):
+    """
+    Переносит манифест при экспорте модели в другой файл (например, в .tflite).
+    Returns: путь манифеста экспортированной модели или None, если у исходной его нет.
+    """
+    source, target = manifest_path(source_model_path), manifest_path(target_model_path)
+    if not os.path.exists(source):
+        return None
+    if os.path.abspath(source) != os.path.abspath(target):
+        shutil.copyfile(source, target)
+        if os.path.exists(projection_path(source_model_path)):
+            shutil.copyfile(projection_path(source_model_path), projection_path(target_model_path))
+    return target
+
+
+def load_model_artifacts(model_path):
+    """
+    Настраивает признаки процесса по манифесту модели.
+
+    Returns:
+        dict | None: Манифест; None, если модель сохранена без него (признаки
+                     процесса остаются прежними, совпадение проверяется только по размерам).
+
+    Raises:
+        ValueError: Словарь или проекция рядом с моделью не совпадают с отпечатками манифеста,
+            либо модель обучена с другой настройкой TEXT_PROJECTION_SIZE.
+        FileNotFoundError: Проекция модели не найдена рядом с ней.
+    """
+    path = manifest_path(model_path)
+    if not os.path.exists(path):
+        logger.warning("Рядом с моделью %s нет манифеста признаков %s: используются словари процесса",
+                       model_path, path)
+        return None
+
+    with open(path, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    vocabulary = CategoricalVocabulary.from_dict(manifest["categorical_vocabulary"])
+    if vocabulary.fingerprint() != manifest["categorical_vocabulary_fingerprint"]:
+        raise ValueError(f"Словарь категорий в {path} изменен после сохранения модели")
+    configure_categorical_vocabulary(vocabulary)
+
+    if "text_projection_fingerprint" in manifest:
+        _configure_model_projection(model_path, manifest["text_projection_fingerprint"])
+    return manifest
+
+
+def _configure_model_projection(model_path, expected_fingerprint):
+    """Проекция текстов модели: из файла рядом с ней, с проверкой отпечатка."""
+    if expected_fingerprint is None:
+        if TEXT_PROJECTION_SIZE is not None:
+            raise ValueError(f"Модель {model_path} обучена без проекции текстов, а TEXT_PROJECTION_SIZE задан")
+        return
+
+    path = projection_path(model_path)
+    if TEXT_PROJECTION_SIZE is None:
+        raise ValueError(f"Модель {model_path} обучена с проекцией текстов, а TEXT_PROJECTION_SIZE не задан")
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Модель {model_path} обучена с проекцией текстов, но {path} не найден")
+    projection = TextProjection.load(path)
+    if projection.fingerprint() != expected_fingerprint:
+        raise ValueError(f"Проекция текстов в {path} не совпадает с той, с которой обучалась модель")
+    configure_text_projection(projection)
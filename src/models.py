@@ -4,38 +4,87 @@ import os
 from input_layers import create_model_inputs
 from embedding_layers import create_embeddings
 from transformer_block import create_transformer_block
+from masking_layers import PaddingMask
+from hierarchy_layers import SectionPooling
 from config import FEATURE_MAPPING
+from feature_extractor.dom_flattener import STRUCTURAL_KEYS
+from feature_extractor.text_feature_extractor import TEXT_FEATURE_SIZE
 
-TEXT_VECTOR_SIZE = 512
+# Следует за TEXT_PROJECTION_SIZE в config.py (512 без проекции)
+TEXT_VECTOR_SIZE = TEXT_FEATURE_SIZE
 NUMERIC_VECTOR_SIZE = len(FEATURE_MAPPING["numeric_scalar"]) + 1
 COLOR_VECTOR_SIZE = len(FEATURE_MAPPING["color"]) * 3
+# Столбец глубины в numeric_input: после значений CSS (см. extract_numeric_features)
+DEPTH_FEATURE_INDEX = len([key for key in FEATURE_MAPPING["numeric_scalar"] if key not in STRUCTURAL_KEYS])
+
+
+def create_usability_model(transformer_num_heads=8, transformer_key_dim=64, transformer_ffn_dim=128,
+                           numeric_normalizer=None, attention="dense", attention_window=64,
+                           page_encoder="flat", section_depth=2, text_vector_size=TEXT_VECTOR_SIZE,
+                           categorical_vocabulary=None):
+    """
+    Args:
+        numeric_normalizer (RunningNormalizer, optional): Нормализация числовых признаков.
+        attention (str): Режим внимания: "dense" (полное), "windowed" (локальное по окнам
+            документа с учетом глубины DOM) или "linear" (линейное приближение).
+        attention_window (int): Размер окна для attention="windowed".
+        page_encoder (str): "flat" - внимание по всем элементам; "hierarchical" - элементы
+            сворачиваются в секции-поддеревья (hierarchy_layers.py), внимание идет по секциям.
+        section_depth (int): Наибольшая глубина корня секции для page_encoder="hierarchical".
+        text_vector_size (int): Размерность text_input (по умолчанию - по TEXT_PROJECTION_SIZE).
+        categorical_vocabulary (CategoricalVocabulary, optional): Словарь категориальных
+            признаков, по которому задаются размеры Embedding-слоев (по умолчанию - словарь процесса).
+    """
+    if page_encoder not in ("flat", "hierarchical"):
+        raise ValueError(f"Неизвестный кодировщик страницы: {page_encoder}. Доступны: flat, hierarchical")
 
-
-def create_usability_model(transformer_num_heads=8, transformer_key_dim=64, transformer_ffn_dim=128):
     all_inputs = create_model_inputs(
-        text_vector_size=TEXT_VECTOR_SIZE,
+        text_vector_size=text_vector_size,
         numeric_vector_size=NUMERIC_VECTOR_SIZE,
         color_vector_size=COLOR_VECTOR_SIZE
     )
 
     categorical_inputs = {k: v for k, v in all_inputs.items() if k not in ["text", "numeric", "color"]}
-    embedding_vectors = create_embeddings(categorical_inputs)
+    embedding_vectors = create_embeddings(categorical_inputs, categorical_vocabulary)
+
+    numeric_features = all_inputs["numeric"]
+    if numeric_normalizer is not None:
+        # Нормализация по статистике корпуса - часть графа и сохраняется с моделью
+        numeric_features = numeric_normalizer.to_keras_layer()(numeric_features)
 
     element_feature_tensors = [
                                   all_inputs["text"],
-                                  all_inputs["numeric"],
+                                  numeric_features,
                                   all_inputs["color"]
                               ] + embedding_vectors
 
     mega_vector = layers.Concatenate(axis=-1, name="mega_vector_concat")(element_feature_tensors)
 
-    masked_vector = layers.Masking(mask_value=0.0)(mega_vector)
+    # Маска паддинга строится по числовым признакам: у реального элемента они
+    # не нулевые (контрастность >= 1), а у строки-заглушки батча - нулевые.
+    # Берется сырой вход: после нормализации строка паддинга уже не нулевая
+    masked_vector = PaddingMask(mask_value=0.0, name="padding_mask")([mega_vector, all_inputs["numeric"]])
+
+    sequence = masked_vector
+    # Глубина элементов для внимания по окнам; у секций ее нет
+    numeric_inputs = all_inputs["numeric"]
+    if page_encoder == "hierarchical":
+        sections = SectionPooling(
+            depth_index=DEPTH_FEATURE_INDEX, section_depth=section_depth, name="section_pooling"
+        )([masked_vector, all_inputs["numeric"]])
+        sections = PaddingMask(mask_value=0.0, name="section_mask")([sections, sections])
+        sequence = layers.Dense(masked_vector.shape[-1], activation="relu", name="section_projection")(sections)
+        numeric_inputs = None
 
     transformer_output = create_transformer_block(
-        inputs=masked_vector,
+        inputs=sequence,
         num_heads=transformer_num_heads,
         key_dim=transformer_key_dim,
-        ffn_dim=transformer_ffn_dim
+        ffn_dim=transformer_ffn_dim,
+        attention=attention,
+        window_size=attention_window,
+        numeric_inputs=numeric_inputs,
+        depth_index=DEPTH_FEATURE_INDEX
     )
 
     page_vector = layers.GlobalAveragePooling1D(name="page_vector")(transformer_output)
@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+
+"""
+Нормализация числовых признаков по статистике всего обучающего корпуса.
+
+Среднее и дисперсия накапливаются потоково (алгоритм Уэлфорда в блочной
+форме Чана): корпус проходится один раз, а частичные статистики шардов
+и воркеров объединяются через merge. Готовые параметры сохраняются рядом
+с trained_model.keras и применяются одним аффинным преобразованием
+(numpy или слой keras Normalization внутри графа модели).
+"""
+
+import json
+import os
+
+import numpy as np
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_NORMALIZER_PATH = os.path.join(PROJECT_ROOT, 'numeric_normalizer.json')
+
+
+class RunningNormalizer:
+    """
+    Накопитель среднего и дисперсии по столбцам матрицы признаков.
+
+    Args:
+        num_features (int): Число столбцов (признаков).
+    """
+
+    def __init__(self, num_features):
+        self.num_features = num_features
+        self.count = 0
+        self.mean = np.zeros(num_features, dtype=np.float64)
+        self.m2 = np.zeros(num_features, dtype=np.float64)
+
+    def _combine(self, count, mean, m2):
+        """Объединяет текущую статистику с (count, mean, m2) другой части корпуса."""
+        if count == 0:
+            return
+        total = self.count + count
+        delta = mean - self.mean
+        self.mean = self.mean + delta * (count / total)
+        self.m2 = self.m2 + m2 + delta ** 2 * (self.count * count / total)
+        self.count = total
+
+    def update(self, matrix):
+        """Добавляет строки матрицы (N, num_features) к статистике."""
+        matrix = np.asarray(matrix, dtype=np.float64).reshape(-1, self.num_features)
+        if len(matrix) == 0:
+            return self
+        batch_mean = matrix.mean(axis=0)
+        batch_m2 = ((matrix - batch_mean) ** 2).sum(axis=0)
+        self._combine(len(matrix), batch_mean, batch_m2)
+        return self
+
+    def merge(self, other):
+        """Добавляет статистику другого накопителя (шарда или воркера)."""
+        if other.num_features != self.num_features:
+            raise ValueError(f"Число признаков не совпадает: {self.num_features} и {other.num_features}")
+        self._combine(other.count, other.mean, other.m2)
+        return self
+
+    @property
+    def variance(self):
+        """Дисперсия по столбцам (смещенная, как у StandardScaler)."""
+        if self.count == 0:
+            return np.ones(self.num_features, dtype=np.float64)
+        return self.m2 / self.count
+
+    @property
+    def scale(self):
+        """Стандартное отклонение; постоянные столбцы не масштабируются."""
+        std = np.sqrt(self.variance)
+        return np.where(std > 0, std, 1.0)
+
+    def transform(self, matrix):
+        """(matrix - mean) / scale в float32."""
+        matrix = np.asarray(matrix, dtype=np.float32)
+        return (matrix - self.mean.astype(np.float32)) / self.scale.astype(np.float32)
+
+    def to_keras_layer(self, name="numeric_normalization"):
+        """
+        Слой keras Normalization с теми же параметрами: нормализация
+        сохраняется вместе с моделью и выполняется внутри графа.
+        """
+        from tensorflow.keras import layers
+
+        return layers.Normalization(
+            axis=-1, mean=self.mean.tolist(), variance=(self.scale ** 2).tolist(), name=name
+        )
+
+    def get_config(self):
+        return {
+            "num_features": self.num_features,
+            "count": self.count,
+            "mean": self.mean.tolist(),
+            "m2": self.m2.tolist(),
+        }
+
+    @classmethod
+    def from_config(cls, config):
+        normalizer = cls(config["num_features"])
+        normalizer.count = int(config["count"])
+        normalizer.mean = np.asarray(config["mean"], dtype=np.float64)
+        normalizer.m2 = np.asarray(config["m2"], dtype=np.float64)
+        return normalizer
+
+    def save(self, path=DEFAULT_NORMALIZER_PATH):
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.get_config(), f, indent=2)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path=DEFAULT_NORMALIZER_PATH):
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls.from_config(json.load(f))
+
+
+def fit_normalizer(matrices, num_features):
+    """Один проход по матрицам признаков (например, numeric_input всех страниц)."""
+    normalizer = RunningNormalizer(num_features)
+    for matrix in matrices:
+        normalizer.update(matrix)
+    return normalizer
@@ -0,0 +1,476 @@
+# -*- coding: utf-8 -*-
+
+"""
+Долгоживущий сервис оценки страниц обученной моделью.
+
+Документы всех одновременных запросов собираются в микро-батчи: батч
+отправляется в модель, как только набралось max_batch_pages страниц или
+истек max_latency с момента поступления самого старого запроса. Внутри
+микро-батча тексты всех страниц векторизуются одним вызовом энкодера,
+а страницы близкой длины склеиваются в дополненные нулями батчи.
+С отсечением по правилам (wcag_rules.RuleGate) страницы с очевидными
+нарушениями WCAG оцениваются правилами и в энкодер и модель не попадают.
+
+Интерфейсы: локальный HTTP (POST /score, GET /metrics) и JSONL через stdin/stdout.
+"""
+
+import json
+import logging
+import os
+import queue
+import sys
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+from batching import pad_batch
+from data_loader import _extract_page_features
+from config import FEATURE_MAPPING
+from feature_extractor.categorical_feature_extractor import get_categorical_vocabulary
+from feature_extractor.dom_flattener import flatten_dom, is_flat_page
+from feature_extractor.element_selection import apply_length_policy
+from feature_extractor.text_feature_extractor import extract_text_features_batch, TEXT_BATCH_SIZE
+from instrumentation import timer, count, report, to_prometheus
+from model_artifacts import load_model_artifacts
+
+logger = logging.getLogger(__name__)
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_MODEL_PATH = os.path.join(PROJECT_ROOT, 'trained_model.keras')
+
+# Сколько страниц максимум уходит в один микро-батч
+MAX_BATCH_PAGES = 64
+# Сколько самый старый запрос может ждать добора микро-батча (секунды)
+MAX_LATENCY = 0.02
+# Размер батча одного прямого прохода модели
+PREDICT_BATCH_SIZE = 16
+# Во сколько раз самая длинная страница батча может превосходить самую короткую:
+# внимание квадратично по длине, и паддинг обходится дороже, чем лишний проход
+MAX_LENGTH_SPREAD = 1.5
+
+
+def load_scoring_model(model_path=DEFAULT_MODEL_PATH):
+    """
+    Загружает обученную модель вместе с пользовательскими слоями и настраивает
+    признаки процесса по ее манифесту (model_artifacts.py).
+    Для .tflite (tflite_export.py) возвращается TFLiteScorer.
+    """
+    manifest = load_model_artifacts(model_path)
+
+    if model_path.endswith('.tflite'):
+        from tflite_export import TFLiteScorer
+        model = TFLiteScorer(model_path)
+    else:
+        from tensorflow import keras
+        import masking_layers, attention_layers, hierarchy_layers  # регистрируют пользовательские слои для десериализации
+        model = keras.models.load_model(model_path)
+
+    check_categorical_vocabulary(model, manifest)
+    return model
+
+
+def check_categorical_vocabulary(model, manifest=None, vocabulary=None):
+    """
+    Проверяет, что словарь категорий процесса - тот, с которым обучалась модель:
+    по отпечатку из манифеста (другой словарь тех же размеров молча перепутал бы
+    строки эмбеддингов) и, для keras-модели, по размерам Embedding-слоев
+    (индекс за пределами слоя на CPU дает ошибку, а на GPU - нулевой вектор).
+    """
+    vocabulary = vocabulary or get_categorical_vocabulary()
+    if manifest is not None and vocabulary.fingerprint() != manifest["categorical_vocabulary_fingerprint"]:
+        raise ValueError(
+            f"Словарь категорий процесса ({vocabulary.fingerprint()}) не совпадает со словарем модели "
+            f"({manifest['categorical_vocabulary_fingerprint']})"
+        )
+    if not hasattr(model, "get_layer"):
+        return
+
+    for name in FEATURE_MAPPING["categorical"]:
+        input_dim = model.get_layer(f"{name}_embedding").input_dim
+        if input_dim != vocabulary.size(name):
+            raise ValueError(
+                f"Embedding-слой {name} модели рассчитан на {input_dim} индексов, а словарь категорий "
+                f"дает {vocabulary.size(name)}. Положите рядом с моделью манифест признаков "
+                f"(model_artifacts.py), с которым она обучалась, или переобучите модель"
+            )
+
+
+def flatten_documents(documents):
+    """
+    Плоские страницы DOM-документов после политики длины. Уже развернутые
+    страницы (load_flat_page - потоковое чтение больших файлов) берутся как есть.
+    """
+    with timer("flatten"):
+        flat_pages = [document if is_flat_page(document) else flatten_dom(document) for document in documents]
+    with timer("select_elements"):
+        return [apply_length_policy(flat_page) for flat_page in flat_pages]
+
+
+def extract_documents(documents, text_batch_size=TEXT_BATCH_SIZE, page_keys=None, feature_cache=None,
+                      flat_pages=None):
+    """
+    Признаки для списка DOM-документов (словарей или плоских страниц).
+
+    Args:
+        page_keys (list, optional): Ключи страниц (URL, id) для feature_cache.
+        feature_cache (PageFeatureCache, optional): Кэш прошлых снимков страниц
+            (incremental_features.py): пересчитываются только измененные элементы.
+        flat_pages (list, optional): Уже развернутые страницы документов (flatten_documents).
+
+    Returns:
+        list: Словарь входов модели на каждый документ; None для пустой страницы.
+    """
+    if flat_pages is None:
+        flat_pages = flatten_documents(documents)
+    if feature_cache is not None:
+        return feature_cache.extract(documents, page_keys, text_batch_size, flat_pages=flat_pages)
+
+    non_empty = [flat_page for flat_page in flat_pages if flat_page["num_elements"] > 0]
+    text_matrices = iter(extract_text_features_batch(non_empty, batch_size=text_batch_size))
+
+    pages = []
+    for flat_page in flat_pages:
+        if flat_page["num_elements"] == 0:
+            pages.append(None)
+            continue
+        pages.append({"text_input": next(text_matrices), **_extract_page_features(flat_page)})
+    return pages
+
+
+def prepare_documents(documents, page_keys=None, feature_cache=None, rule_gate=None,
+                      text_batch_size=TEXT_BATCH_SIZE):
+    """
+    Признаки документов с отсечением по правилам WCAG (wcag_rules.RuleGate):
+    страницы, исход которых решен правилами, не векторизуются и в модель не идут.
+
+    Returns:
+        tuple: (
+            list: словарь входов модели на каждый документ; None для пустых и отсеченных страниц,
+            list: оценка правил для отсеченных страниц, иначе None
+        )
+    """
+    flat_pages = flatten_documents(documents)
+    rule_scores = [rule_gate.settle(flat_page) for flat_page in flat_pages] if rule_gate is not None \
+        else [None] * len(documents)
+    remaining = [i for i, rule_score in enumerate(rule_scores) if rule_score is None]
+
+    pages = [None] * len(documents)
+    if remaining:
+        extracted = extract_documents(
+            [documents[i] for i in remaining], text_batch_size,
+            page_keys=[page_keys[i] for i in remaining] if page_keys is not None else None,
+            feature_cache=feature_cache, flat_pages=[flat_pages[i] for i in remaining]
+        )
+        for i, page in zip(remaining, extracted):
+            pages[i] = page
+    return pages, rule_scores
+
+
+def merge_scores(model_scores, rule_scores):
+    """Оценки модели, где вместо отсеченных страниц - оценки правил."""
+    return [model_score if rule_score is None else rule_score
+            for model_score, rule_score in zip(model_scores, rule_scores)]
+
+
+def make_predict_fn(model):
+    """
+    Прямой проход модели как tf.function с динамическими размерами батча
+    и длины страницы: граф трассируется один раз, а не на каждую новую форму.
+    TFLiteScorer уже является функцией прямого прохода и возвращается как есть.
+    """
+    from tflite_export import TFLiteScorer
+    if isinstance(model, TFLiteScorer):
+        return model
+
+    import tensorflow as tf
+
+    input_signature = {
+        model_input.name: tf.TensorSpec((None, None) + tuple(model_input.shape[2:]), model_input.dtype)
+        for model_input in model.inputs
+    }
+
+    @tf.function(input_signature=[input_signature])
+    def predict_fn(inputs):
+        return model(inputs, training=False)
+
+    return predict_fn
+
+
+def _split_by_length(lengths, batch_size, max_length_spread=MAX_LENGTH_SPREAD):
+    """Индексы, отсортированные по длине и разрезанные на батчи страниц близкой длины."""
+    batches, current = [], []
+    for i in np.argsort(lengths, kind='stable'):
+        if current and (len(current) == batch_size or lengths[i] > max_length_spread * lengths[current[0]]):
+            batches.append(current)
+            current = []
+        current.append(i)
+    if current:
+        batches.append(current)
+    return batches
+
+
+def predict_pages(predict_fn, pages, batch_size=PREDICT_BATCH_SIZE):
+    """
+    Оценки страниц; страницы близкой длины идут в один батч.
+
+    Args:
+        predict_fn: Функция прямого прохода (make_predict_fn).
+
+    Returns:
+        list: float на каждую страницу; None для пустой страницы.
+    """
+    scores = [None] * len(pages)
+    indices = [i for i, page in enumerate(pages) if page is not None]
+    if not indices:
+        return scores
+
+    lengths = np.array([len(pages[i]["text_input"]) for i in indices])
+    for batch in _split_by_length(lengths, batch_size):
+        x_batch = pad_batch([pages[indices[j]] for j in batch])
+        with timer("predict"):
+            predictions = np.asarray(predict_fn(x_batch)).reshape(-1)
+        count("predict.pages", len(batch))
+        for j, score in zip(batch, predictions):
+            scores[indices[j]] = float(score)
+    return scores
+
+
+class MicroBatcher:
+    """
+    Собирает документы одновременных запросов в микро-батчи
+    и оценивает их в отдельном потоке.
+
+    Args:
+        model: Загруженная keras-модель или TFLiteScorer (load_scoring_model).
+        max_batch_pages (int): Предельный размер микро-батча в страницах.
+        max_latency (float): Сколько ждать добора батча после первого запроса (секунды).
+        feature_cache (PageFeatureCache, optional): Инкрементальное извлечение признаков
+            для документов, переданных с ключом страницы (submit(..., page_keys)).
+        rule_gate (RuleGate, optional): Отсечение по правилам WCAG: страницы с очевидным
+            провалом получают оценку правил без энкодера и модели (wcag_rules.py).
+    """
+
+    def __init__(self, model, max_batch_pages=MAX_BATCH_PAGES, max_latency=MAX_LATENCY,
+                 predict_batch_size=PREDICT_BATCH_SIZE, feature_cache=None, rule_gate=None):
+        self.model = model
+        self.feature_cache = feature_cache
+        self.rule_gate = rule_gate
+        self._predict_fn = make_predict_fn(model)
+        self.max_batch_pages = max_batch_pages
+        self.max_latency = max_latency
+        self.predict_batch_size = predict_batch_size
+
+        self._queue = queue.Queue()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="micro-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, documents, page_keys=None):
+        """
+        Ставит документы (DOM или плоские страницы) в очередь; Future вернет список оценок в том же порядке.
+        page_keys - ключи страниц (URL, id) для feature_cache; None - без кэша.
+        """
+        future = Future()
+        if self._stopped.is_set():
+            future.set_exception(RuntimeError("Сервис оценки остановлен"))
+            return future
+        documents = list(documents)
+        page_keys = list(page_keys) if page_keys is not None else [None] * len(documents)
+        self._queue.put((documents, page_keys, future, time.monotonic()))
+        return future
+
+    def score(self, documents, timeout=None, page_keys=None):
+        return self.submit(documents, page_keys).result(timeout)
+
+    def close(self):
+        self._stopped.set()
+        self._queue.put(None)
+        self._thread.join()
+
+    def _collect(self):
+        """Ждет первый запрос и добирает следующие до дедлайна или предела страниц."""
+        first = self._queue.get()
+        if first is None:
+            return None
+
+        requests = [first]
+        num_pages = len(first[0])
+        deadline = first[3] + self.max_latency
+
+        while num_pages < self.max_batch_pages:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                request = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if request is None:
+                self._queue.put(None)
+                break
+            requests.append(request)
+            num_pages += len(request[0])
+
+        return requests
+
+    def _run(self):
+        while True:
+            requests = self._collect()
+            if requests is None:
+                return
+
+            documents = [document for request_documents, _, _, _ in requests for document in request_documents]
+            page_keys = [page_key for _, request_keys, _, _ in requests for page_key in request_keys]
+            try:
+                scores = self._score_documents(documents, page_keys)
+            except Exception:
+                # Некорректный документ не должен ронять чужие запросы микро-батча
+                logger.warning("Микро-батч из %d документов не оценен, запросы оцениваются по отдельности",
+                               len(documents), exc_info=True)
+                for request_documents, request_keys, future, _ in requests:
+                    self._resolve(future, request_documents, request_keys)
+                continue
+
+            start = 0
+            for request_documents, _, future, _ in requests:
+                future.set_result(scores[start:start + len(request_documents)])
+                start += len(request_documents)
+
+    def _score_documents(self, documents, page_keys):
+        pages, rule_scores = prepare_documents(documents, page_keys, self.feature_cache, self.rule_gate)
+        return merge_scores(predict_pages(self._predict_fn, pages, self.predict_batch_size), rule_scores)
+
+    def _resolve(self, future, documents, page_keys):
+        try:
+            future.set_result(self._score_documents(documents, page_keys))
+        except Exception as e:
+            future.set_exception(e)
+
+
+def _parse_documents(payload):
+    """Документы запроса: список DOM, {"pages": [...]} или один DOM."""
+    if isinstance(payload, list):
+        return payload
+    if isinstance(payload, dict) and isinstance(payload.get("pages"), list):
+        return payload["pages"]
+    if isinstance(payload, dict):
+        return [payload]
+    raise ValueError("Ожидается DOM-документ, список документов или {\"pages\": [...]}")
+
+
+def _parse_request(payload):
+    """
+    Документы запроса и ключи страниц. Документ можно передать как {"id": ..., "dom": {...}}:
+    id - ключ страницы для инкрементальной оценки (PageFeatureCache), у остальных ключ None.
+    """
+    documents, page_keys = [], []
+    for document in _parse_documents(payload):
+        if isinstance(document, dict) and "dom" in document:
+            documents.append(document["dom"])
+            page_keys.append(document.get("id"))
+        else:
+            documents.append(document)
+            page_keys.append(None)
+    return documents, page_keys
+
+
+def make_http_server(batcher, host='127.0.0.1', port=8080, request_timeout=30.0):
+    """
+    HTTP-сервер: POST /score с JSON-телом (см. _parse_request), ответ {"scores": [...]};
+    GET /metrics - замеры стадий (report), GET /metrics?format=prometheus - то же для Prometheus.
+    """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class ScoreHandler(BaseHTTPRequestHandler):
+        def _reply(self, status, body):
+            self._send(status, json.dumps(body, ensure_ascii=False).encode('utf-8'),
+                       'application/json; charset=utf-8')
+
+        def _send(self, status, payload, content_type):
+            self.send_response(status)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_GET(self):
+            path, _, query = self.path.partition('?')
+            if path.rstrip('/') != '/metrics':
+                self._reply(404, {"error": "not found"})
+                return
+            if 'format=prometheus' in query:
+                self._send(200, to_prometheus().encode('utf-8'), 'text/plain; version=0.0.4')
+            else:
+                self._reply(200, report())
+
+        def do_POST(self):
+            if self.path.rstrip('/') != '/score':
+                self._reply(404, {"error": "not found"})
+                return
+            try:
+                length = int(self.headers.get('Content-Length', 0))
+                count("bytes_read", length)
+                with timer("parse_json"):
+                    documents, page_keys = _parse_request(json.loads(self.rfile.read(length)))
+            except ValueError as e:
+                self._reply(400, {"error": str(e)})
+                return
+            try:
+                scores = batcher.score(documents, timeout=request_timeout, page_keys=page_keys)
+            except Exception as e:
+                logger.warning("Ошибка оценки запроса", exc_info=True)
+                self._reply(500, {"error": str(e)})
+                return
+            self._reply(200, {"scores": scores})
+
+        def log_message(self, format, *args):
+            pass
+
+    return ThreadingHTTPServer((host, port), ScoreHandler)
+
+
+def serve_jsonl(batcher, input_stream=None, output_stream=None, max_in_flight=256):
+    """
+    JSONL через потоки: на входе по документу (или {"id": ..., "dom": ...}) в строке,
+    на выходе {"id": ..., "score": ...} в том же порядке.
+    """
+    input_stream = input_stream or sys.stdin
+    output_stream = output_stream or sys.stdout
+    in_flight = []
+
+    def flush(limit):
+        # Выводятся готовые ответы по порядку; при переполнении ждем самый старый
+        while in_flight and (len(in_flight) > limit or in_flight[0][1].done()):
+            request_id, future = in_flight.pop(0)
+            try:
+                result = {"id": request_id, "score": future.result()[0]}
+            except Exception as e:
+                result = {"id": request_id, "error": str(e)}
+            output_stream.write(json.dumps(result, ensure_ascii=False) + '\n')
+        output_stream.flush()
+
+    for line_number, line in enumerate(input_stream):
+        line = line.strip()
+        if not line:
+            continue
+        count("bytes_read", len(line))
+        try:
+            with timer("parse_json"):
+                record = json.loads(line)
+        except ValueError as e:
+            failed = Future()
+            failed.set_exception(e)
+            in_flight.append((line_number, failed))
+            continue
+
+        if isinstance(record, dict) and "dom" in record:
+            # Явный id - еще и ключ страницы для инкрементальной оценки
+            request_id, document, page_key = record.get("id", line_number), record["dom"], record.get("id")
+        else:
+            request_id, document, page_key = line_number, record, None
+        in_flight.append((request_id, batcher.submit([document], [page_key])))
+        flush(max_in_flight)
+
+    flush(0)
@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+
+"""
+Экспорт обученной модели в TFLite для инференса на CPU.
+
+В граф попадает вся модель (нормализация, эмбеддинги категорий, трансформер,
+пулинг секций) с динамическими размерами батча и длины страницы. Веса
+квантуются: "dynamic" - int8-веса с вычислениями во float32 (по умолчанию),
+"float16" - веса во float16, "none" - без квантования.
+
+TFLiteScorer принимает тот же словарь входов, что собирают экстракторы
+(pad_batch), и подставляется вместо make_predict_fn в predict_pages,
+MicroBatcher и AsyncScorer. Интерпретатор берется из ai_edge_litert или
+tflite_runtime, если они установлены (без импорта TensorFlow), иначе из tf.lite.
+"""
+
+import os
+import shutil
+import tempfile
+import threading
+
+import numpy as np
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_TFLITE_PATH = os.path.join(PROJECT_ROOT, 'trained_model.tflite')
+
+QUANTIZATION_MODES = ("dynamic", "float16", "none")
+# Допустимое расхождение оценок с keras-моделью (в пунктах шкалы оценки)
+PARITY_TOLERANCE = 0.5
+_SIGNATURE_KEY = "serving_default"
+
+
+def _interpreter_class():
+    try:
+        from ai_edge_litert.interpreter import Interpreter
+    except ImportError:
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            import tensorflow as tf
+            Interpreter = tf.lite.Interpreter
+    return Interpreter
+
+
+def export_tflite(model, output_path=DEFAULT_TFLITE_PATH, quantization="dynamic"):
+    """
+    Конвертирует keras-модель в TFLite.
+
+    Args:
+        model: Обученная модель (create_usability_model / load_scoring_model).
+        output_path (str): Куда записать .tflite.
+        quantization (str): "dynamic", "float16" или "none".
+
+    Returns:
+        int: Размер модели в байтах.
+    """
+    if quantization not in QUANTIZATION_MODES:
+        raise ValueError(f"Неизвестный режим квантования: {quantization}. Доступны: {', '.join(QUANTIZATION_MODES)}")
+
+    import tensorflow as tf
+    from tensorflow import keras
+
+    input_signature = {
+        model_input.name: tf.TensorSpec((None, None) + tuple(model_input.shape[2:]), model_input.dtype,
+                                        name=model_input.name)
+        for model_input in model.inputs
+    }
+
+    # Конвертер читает веса только из SavedModel: переменные keras 3
+    # не замораживаются при конвертации конкретной функции
+    saved_model_dir = tempfile.mkdtemp(prefix="tflite_export_")
+    try:
+        archive = keras.export.ExportArchive()
+        archive.track(model)
+        archive.add_endpoint(
+            name=_SIGNATURE_KEY,
+            fn=lambda inputs: {"score": model(inputs, training=False)},
+            input_signature=[input_signature],
+        )
+        archive.write_out(saved_model_dir, verbose=False)
+
+        converter = tf.lite.TFLiteConverter.from_saved_model(saved_model_dir)
+        if quantization != "none":
+            converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        if quantization == "float16":
+            converter.target_spec.supported_types = [tf.float16]
+        tflite_model = converter.convert()
+    finally:
+        shutil.rmtree(saved_model_dir, ignore_errors=True)
+
+    tmp_path = output_path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(tflite_model)
+    os.replace(tmp_path, output_path)
+    return len(tflite_model)
+
+
+class TFLiteScorer:
+    """
+    Прямой проход TFLite-модели: callable(dict входов (B, N, ...)) -> np.ndarray (B, 1).
+
+    Args:
+        model_path (str): Путь к .tflite (export_tflite).
+        num_threads (int, optional): Потоки интерпретатора; None - по умолчанию рантайма.
+    """
+
+    def __init__(self, model_path=DEFAULT_TFLITE_PATH, num_threads=None):
+        self.model_path = model_path
+        self._interpreter = _interpreter_class()(model_path=model_path, num_threads=num_threads)
+        self._runner = self._interpreter.get_signature_runner(_SIGNATURE_KEY)
+        self._input_dtypes = {
+            name: details["dtype"] for name, details in self._runner.get_input_details().items()
+        }
+        # Интерпретатор не потокобезопасен
+        self._lock = threading.Lock()
+
+    @property
+    def input_names(self):
+        return list(self._input_dtypes)
+
+    def __call__(self, inputs):
+        feeds = {name: np.asarray(inputs[name], dtype=dtype) for name, dtype in self._input_dtypes.items()}
+        with self._lock:
+            # Входы другой формы переразмечаются раннером автоматически
+            return self._runner(**feeds)["score"]
+
+
+def check_parity(model, scorer, pages, batch_size=8, tolerance=PARITY_TOLERANCE):
+    """
+    Сравнивает оценки TFLite-модели с keras-моделью на одних и тех же страницах.
+
+    Args:
+        pages (list): Словари входов модели (load_dataset, FeatureStore, extract_documents).
+
+    Returns:
+        dict: {"num_pages", "max_abs_diff", "mean_abs_diff", "tolerance", "passed"}.
+    """
+    from scoring_service import make_predict_fn, predict_pages
+
+    reference = np.array(predict_pages(make_predict_fn(model), pages, batch_size), dtype=np.float64)
+    exported = np.array(predict_pages(scorer, pages, batch_size), dtype=np.float64)
+    diff = np.abs(reference - exported)
+    return {
+        "num_pages": len(pages),
+        "max_abs_diff": float(diff.max()) if len(diff) else 0.0,
+        "mean_abs_diff": float(diff.mean()) if len(diff) else 0.0,
+        "tolerance": tolerance,
+        "passed": bool(np.all(diff <= tolerance)),
+    }
+
+
+if __name__ == '__main__':
+    import argparse
+    import logging
+    import sys
+
+    from data_loader import load_dataset
+    from model_artifacts import copy_model_artifacts
+    from feature_extractor.text_feature_extractor import setup_model_cache
+    from scoring_service import load_scoring_model, DEFAULT_MODEL_PATH
+
+    parser = argparse.ArgumentParser(description="Экспорт trained_model.keras в TFLite с проверкой оценок")
+    parser.add_argument('--model', default=DEFAULT_MODEL_PATH)
+    parser.add_argument('--output', default=DEFAULT_TFLITE_PATH)
+    parser.add_argument('--quantization', choices=QUANTIZATION_MODES, default="dynamic")
+    parser.add_argument('--tolerance', type=float, default=PARITY_TOLERANCE)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    setup_model_cache()
+    model = load_scoring_model(args.model)
+    size = export_tflite(model, args.output, args.quantization)
+    copy_model_artifacts(args.model, args.output)
+    print(f"TFLite-модель ({args.quantization}) сохранена в: {args.output}, {size / 2**20:.2f} МБ")
+
+    pages, _ = load_dataset()
+    parity = check_parity(model, TFLiteScorer(args.output), pages, tolerance=args.tolerance)
+    print(f"Сверка с keras на {parity['num_pages']} страницах: наибольшее расхождение "
+          f"{parity['max_abs_diff']:.4f}, среднее {parity['mean_abs_diff']:.4f} (допуск {parity['tolerance']})")
+    if not parity["passed"]:
+        sys.exit(1)
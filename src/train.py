@@ -1,72 +1,138 @@
+import logging
 import numpy as np
 from tensorflow import keras
 import os
-from data_loader import load_dataset
-from models import create_usability_model
+import time
+from batching import pad_batch, make_bucketed_batches, padding_ratio
+from data_loader import (
+    load_dataset, ensure_text_projection, ensure_categorical_vocabulary,
+    fit_numeric_normalizer, NORMALIZER_SAMPLE_PAGES
+)
+from feature_store import build_feature_store, DEFAULT_STORE_DIR
+from models import create_usability_model, NUMERIC_VECTOR_SIZE
+from normalization import fit_normalizer
 from feature_extractor.text_feature_extractor import setup_model_cache
+from instrumentation import timer
+from model_artifacts import save_model_artifacts
 
+logger = logging.getLogger(__name__)
 
-def _prepare_batch_input(sample_x):
-    batch_dict = {}
-    for key, matrix in sample_x.items():
-        batch_dict[key] = np.expand_dims(matrix, axis=0)
-    return batch_dict
 
+def _save_model(model, normalizer):
+    logger.info("--- Этап 4: Сохранение модели ---")
+    PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    model_save_path = os.path.join(PROJECT_ROOT, 'trained_model.keras')
+    model.save(model_save_path)
+    logger.info("Модель сохранена в: %s", model_save_path)
+    # Словарь категорий и проекция текстов, с которыми обучалась модель, - рядом с ней
+    logger.info("Манифест признаков сохранен в: %s", save_model_artifacts(model_save_path))
 
-def train_model(epochs=100, batch_size=1):
-    print("--- Этап 1: Настройка и загрузка данных ---")
+    # Параметры нормализации уже внутри модели; отдельный файл - для сервисов,
+    # которые нормализуют признаки сами
+    normalizer_save_path = os.path.join(PROJECT_ROOT, 'numeric_normalizer.json')
+    normalizer.save(normalizer_save_path)
+    logger.info("Нормализатор сохранен в: %s", normalizer_save_path)
+
+
+def train_model(epochs=100, batch_size=8, feature_store_dir=DEFAULT_STORE_DIR):
+    logger.info("--- Этап 1: Настройка и загрузка данных ---")
     setup_model_cache()
+    # Проекция текстов (если включена) и словари категорий обучаются на корпусе до извлечения признаков
+    ensure_text_projection()
+    ensure_categorical_vocabulary()
 
-    X_train, y_train = load_dataset()
+    if feature_store_dir:
+        # Признаки извлекаются только для новых и измененных страниц
+        X_train, y_train = build_feature_store(store_dir=feature_store_dir).to_lists()
+    else:
+        X_train, y_train = load_dataset()
 
     if len(X_train) == 0:
-        print("Датасет пуст. Обучение прервано.")
+        logger.warning("Датасет пуст. Обучение прервано.")
         return
 
-    print(f"Загружено {len(X_train)} примеров для обучения.")
+    logger.info("Загружено %d примеров для обучения.", len(X_train))
+
+    lengths = np.array([len(x["text_input"]) for x in X_train])
+    rng = np.random.default_rng()
 
-    if batch_size > 1:
-        print(f"Размер батча был > 1, но для данного режима он установлен в 1.")
-        batch_size = 1
+    normalizer = fit_normalizer((x["numeric_input"] for x in X_train), NUMERIC_VECTOR_SIZE)
 
-    print("\n--- Этап 2: Создание модели ---")
-    model = create_usability_model()
+    logger.info("--- Этап 2: Создание модели ---")
+    model = create_usability_model(numeric_normalizer=normalizer)
     model.summary()
 
-    print("\n--- Этап 3: Обучение модели ---")
+    logger.info("--- Этап 3: Обучение модели ---")
     for epoch in range(epochs):
         total_loss = 0
         total_mae = 0
 
-        indices = np.arange(len(X_train))
-        np.random.shuffle(indices)
+        # Страницы близкой длины попадают в один батч, чтобы паддинга было меньше
+        batches = make_bucketed_batches(lengths, batch_size, rng=rng)
+        epoch_start = time.perf_counter()
 
-        for i, data_index in enumerate(indices):
-            x_sample_dict = X_train[data_index]
-            y_sample = y_train[data_index]
+        for batch_indices in batches:
+            x_batch = pad_batch([X_train[i] for i in batch_indices])
+            y_batch = y_train[batch_indices]
 
-            x_batch = _prepare_batch_input(x_sample_dict)
-            y_batch = np.array([y_sample])
-
-            results = model.train_on_batch(x_batch, y_batch)
+            with timer("train_on_batch"):
+                results = model.train_on_batch(x_batch, y_batch)
 
             loss = results[0]
             mae = results[1]
 
-            total_loss += loss
-            total_mae += mae
+            total_loss += loss * len(batch_indices)
+            total_mae += mae * len(batch_indices)
 
+        epoch_time = time.perf_counter() - epoch_start
         avg_loss = total_loss / len(X_train)
         avg_mae = total_mae / len(X_train)
         
-        print(f"Эпоха {epoch + 1}/{epochs} - Loss: {avg_loss:.4f}, MAE: {avg_mae:.4f}")
+        logger.info("Эпоха %d/%d - Loss: %.4f, MAE: %.4f, %.1f стр/с, паддинг %.1f%%",
+                    epoch + 1, epochs, avg_loss, avg_mae, len(X_train) / epoch_time,
+                    100 * padding_ratio(lengths, batches))
 
-    print("\n--- Этап 4: Сохранение модели ---")
-    PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-    model_save_path = os.path.join(PROJECT_ROOT, 'trained_model.keras')
-    model.save(model_save_path)
-    print(f"Модель сохранена в: {model_save_path}")
+    _save_model(model, normalizer)
+
+
+def train_model_streaming(epochs=100, batch_size=8, num_parallel_calls=None, shuffle_buffer=1024,
+                          num_workers=None, normalizer_sample_pages=NORMALIZER_SAMPLE_PAGES):
+    """
+    Обучение на потоковом tf.data-конвейере: страницы извлекаются на лету
+    в пуле процессов, корпус целиком в памяти не хранится.
+
+    Args:
+        num_workers (int, optional): Процессов извлечения признаков (по умолчанию - число ядер).
+        normalizer_sample_pages (int, optional): Сколько случайных страниц берется для
+            статистики нормализации (None - весь корпус, отдельным проходом до обучения).
+    """
+    from input_pipeline import make_page_dataset, read_labels
+
+    logger.info("--- Этап 1: Настройка потокового конвейера ---")
+    setup_model_cache()
+    ensure_text_projection()
+    ensure_categorical_vocabulary()
+
+    if num_workers is None:
+        num_workers = os.cpu_count() or 1
+    dataset_kwargs = {"batch_size": batch_size, "shuffle_buffer": shuffle_buffer, "num_workers": num_workers}
+    if num_parallel_calls is not None:
+        dataset_kwargs["num_parallel_calls"] = num_parallel_calls
+    dataset = make_page_dataset(**dataset_kwargs)
+
+    file_paths, _ = read_labels()
+    normalizer = fit_numeric_normalizer(file_paths, NUMERIC_VECTOR_SIZE, sample_pages=normalizer_sample_pages)
+
+    logger.info("--- Этап 2: Создание модели ---")
+    model = create_usability_model(numeric_normalizer=normalizer)
+    model.summary()
+
+    logger.info("--- Этап 3: Обучение модели ---")
+    model.fit(dataset, epochs=epochs)
+
+    _save_model(model, normalizer)
 
 
 if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
     train_model(epochs=100)
@@ -1,18 +1,40 @@
 from tensorflow.keras import layers
+from attention_layers import WindowedSelfAttention, LinearSelfAttention
 
+# Режимы внимания: dense - полное O(N^2), windowed - локальное по окнам DOM,
+# linear - линейное приближение (см. attention_layers.py)
+ATTENTION_MODES = ("dense", "windowed", "linear")
 
-def create_transformer_block(inputs, num_heads, key_dim, ffn_dim, dropout_rate=0.1):
-    attention_output = layers.MultiHeadAttention(
-        num_heads=num_heads, key_dim=key_dim
-    )(query=inputs, value=inputs, key=inputs)
+
+def create_attention(inputs, num_heads, key_dim, attention="dense", window_size=64,
+                     numeric_inputs=None, depth_index=None):
+    if attention == "dense":
+        return layers.MultiHeadAttention(
+            num_heads=num_heads, key_dim=key_dim
+        )(query=inputs, value=inputs, key=inputs)
+    if attention == "windowed":
+        return WindowedSelfAttention(
+            num_heads=num_heads, key_dim=key_dim, window_size=window_size,
+            depth_index=depth_index if numeric_inputs is not None else None
+        )([inputs, inputs if numeric_inputs is None else numeric_inputs])
+    if attention == "linear":
+        return LinearSelfAttention(num_heads=num_heads, key_dim=key_dim)(inputs)
+    raise ValueError(f"Неизвестный режим внимания: {attention}. Доступны: {', '.join(ATTENTION_MODES)}")
+
+
+def create_transformer_block(inputs, num_heads, key_dim, ffn_dim, dropout_rate=0.1, attention="dense",
+                             window_size=64, numeric_inputs=None, depth_index=None):
+    attention_output = create_attention(
+        inputs, num_heads, key_dim, attention, window_size, numeric_inputs, depth_index
+    )
     attention_output = layers.Dropout(dropout_rate)(attention_output)
 
-    norm_output_1 = layers.LayerNormalization(epsilon=1e-6)(inputs + attention_output)
+    norm_output_1 = layers.LayerNormalization(epsilon=1e-6)(layers.Add()([inputs, attention_output]))
 
     ffn_output = layers.Dense(ffn_dim, activation="relu")(norm_output_1)
     ffn_output = layers.Dense(inputs.shape[-1])(ffn_output)
     ffn_output = layers.Dropout(dropout_rate)(ffn_output)
 
-    norm_output_2 = layers.LayerNormalization(epsilon=1e-6)(norm_output_1 + ffn_output)
+    norm_output_2 = layers.LayerNormalization(epsilon=1e-6)(layers.Add()([norm_output_1, ffn_output]))
 
     return norm_output_2
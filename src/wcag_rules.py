@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+
+"""
+Детерминированные проверки WCAG по плоской странице.
+
+Правила считаются сразу для всех элементов страницы операциями над массивами
+и дают флаги нарушений по элементам:
+    contrast    - 1.4.3: контраст текста ниже WCAG_MIN_CONTRAST
+                  (WCAG_MIN_CONTRAST_LARGE_TEXT для крупного текста);
+    img_alt     - 1.1.1: у img нет атрибута alt (пустой alt="" допустим
+                  для декоративных изображений);
+    form_label  - 1.3.1 / 3.3.2: у поля ввода нет placeholder, title или alt,
+                  и оно не вложено в label и не соседствует с label.
+Скрытые элементы (display: none, opacity: 0 - свои или у предка) не проверяются.
+Прозрачный или не заданный фон наследуется от ближайшего предка с фоном.
+
+Оценка правил страницы - доля проверенных элементов без нарушений по шкале
+0..100. RuleGate использует ее, чтобы не отправлять в текстовый энкодер
+и модель страницы, провал которых уже очевиден по правилам.
+"""
+
+import logging
+import os
+
+import numpy as np
+
+from config import (
+    WCAG_MIN_CONTRAST, WCAG_MIN_CONTRAST_LARGE_TEXT, RULE_GATE_MAX_SCORE, RULE_GATE_MIN_VIOLATIONS
+)
+from feature_extractor.color_feature_extractor import _parse_color_column, _composite_colors, _get_contrast_ratio
+from feature_extractor.dom_flattener import encode_column
+from feature_extractor.element_selection import ancestor_or_self, hidden_mask
+from feature_extractor.numeric_feature_extractor import _parse_css_value
+from instrumentation import timer, count
+
+logger = logging.getLogger(__name__)
+
+RULES = ("contrast", "img_alt", "form_label")
+
+# Крупный текст по WCAG: от 18pt (24px) или от 14pt (~18.66px) полужирный
+LARGE_TEXT_PX = 24.0
+LARGE_BOLD_TEXT_PX = 18.66
+BOLD_FONT_WEIGHT = 700.0
+
+FORM_CONTROL_TAGS = ("input", "select", "textarea")
+
+
+def _nearest_opaque(has_background, parent):
+    """Индекс ближайшего элемента с фоном среди самого элемента и его предков (или корня)."""
+    source = np.where(has_background | (parent < 0), np.arange(len(parent)), parent).astype(np.int64)
+    while True:
+        next_source = source[source]
+        if np.array_equal(next_source, source):
+            return source
+        source = next_source
+
+
+def _map_column(func, column, dtype):
+    """func над каждым различным значением колонки -> массив (N,) dtype."""
+    index, values = encode_column(column)
+    return np.array([func(value) for value in values], dtype=dtype).reshape(-1)[index]
+
+
+def _non_empty(column):
+    return _map_column(lambda value: isinstance(value, str) and bool(value.strip()), column, bool)
+
+
+def _lower_tags(column):
+    return _map_column(lambda tag: tag.strip().lower() if isinstance(tag, str) else "", column, object)
+
+
+def contrast_violations(flat_page, visible):
+    """Флаги 1.4.3 и маска проверенных элементов (видимые с собственным текстом)."""
+    columns = flat_page["columns"]
+    checked = visible & _non_empty(columns["text"])
+
+    fg_rgba = _parse_color_column(columns["color"])
+    bg_rgba = _parse_color_column(columns["backgroundColor"])
+    # Не заданный фон - прозрачный (а не черный по умолчанию экстрактора цветов)
+    bg_rgba[_map_column(lambda value: value is None, columns["backgroundColor"], bool), 3] = 0.0
+    bg_rgba = bg_rgba[_nearest_opaque(bg_rgba[:, 3] > 0, flat_page["parent"])]
+
+    fg_rgb, bg_rgb = _composite_colors(fg_rgba, bg_rgba)
+    contrast = _get_contrast_ratio(fg_rgb, bg_rgb)
+
+    font_size = _map_column(lambda value: _parse_css_value(value, 'fontSize'), columns["fontSize"], np.float32)
+    font_weight = _map_column(lambda value: _parse_css_value(value, 'fontWeight'), columns["fontWeight"], np.float32)
+    large = (font_size >= LARGE_TEXT_PX) | ((font_size >= LARGE_BOLD_TEXT_PX) & (font_weight >= BOLD_FONT_WEIGHT))
+    threshold = np.where(large, WCAG_MIN_CONTRAST_LARGE_TEXT, WCAG_MIN_CONTRAST)
+    return checked & (contrast < threshold), checked
+
+
+def img_alt_violations(flat_page, visible, tags):
+    """Флаги 1.1.1: видимые img без атрибута alt."""
+    checked = visible & (tags == "img")
+    missing_alt = _map_column(lambda value: value is None, flat_page["columns"]["alt"], bool)
+    return checked & missing_alt, checked
+
+
+def form_label_violations(flat_page, visible, tags):
+    """Флаги 1.3.1 / 3.3.2: видимые поля ввода без подписи."""
+    columns = flat_page["columns"]
+    parent = flat_page["parent"]
+    checked = visible & np.isin(tags, FORM_CONTROL_TAGS)
+
+    named = _non_empty(columns["placeholder"]) | _non_empty(columns["title"]) | _non_empty(columns["alt"])
+    is_label = tags == "label"
+    inside_label = ancestor_or_self(is_label, parent) & ~is_label
+    next_to_label = np.isin(parent, parent[is_label]) if is_label.any() else np.zeros(len(tags), dtype=bool)
+    return checked & ~(named | inside_label | next_to_label), checked
+
+
+def evaluate_rules(flat_page):
+    """
+    Проверяет правила на плоской странице.
+
+    Returns:
+        dict: {
+            "violations": {правило: np.ndarray (N,) bool},
+            "checked": {правило: число проверенных элементов},
+            "num_checked": int - элементов, к которым применимо хотя бы одно правило,
+            "num_violating": int - элементов хотя бы с одним нарушением,
+            "rule_score": float - 100 * доля проверенных элементов без нарушений
+                                  (100 для страницы без проверяемых элементов)
+        }
+    """
+    num_elements = flat_page["num_elements"]
+    if num_elements == 0:
+        return {"violations": {rule: np.zeros(0, dtype=bool) for rule in RULES},
+                "checked": {rule: 0 for rule in RULES}, "num_checked": 0, "num_violating": 0, "rule_score": 100.0}
+
+    visible = ~hidden_mask(flat_page)
+    tags = _lower_tags(flat_page["columns"]["tag"])
+
+    results = {
+        "contrast": contrast_violations(flat_page, visible),
+        "img_alt": img_alt_violations(flat_page, visible, tags),
+        "form_label": form_label_violations(flat_page, visible, tags),
+    }
+    checked = np.zeros(num_elements, dtype=bool)
+    violating = np.zeros(num_elements, dtype=bool)
+    for rule_violations, rule_checked in results.values():
+        checked |= rule_checked
+        violating |= rule_violations
+
+    num_checked = int(checked.sum())
+    num_violating = int(violating.sum())
+    return {
+        "violations": {rule: rule_violations for rule, (rule_violations, _) in results.items()},
+        "checked": {rule: int(rule_checked.sum()) for rule, (_, rule_checked) in results.items()},
+        "num_checked": num_checked,
+        "num_violating": num_violating,
+        "rule_score": 100.0 * (1.0 - num_violating / num_checked) if num_checked else 100.0,
+    }
+
+
+def summarize(result):
+    """JSON-совместимая сводка evaluate_rules: число нарушений по правилам и оценка."""
+    return {
+        "rule_score": result["rule_score"],
+        "num_checked": result["num_checked"],
+        "num_violating": result["num_violating"],
+        "violations": {rule: int(flags.sum()) for rule, flags in result["violations"].items()},
+        "checked": dict(result["checked"]),
+    }
+
+
+class RuleGate:
+    """
+    Отсечение страниц, исход которых решен правилами: оценка правил не выше
+    max_score и не меньше min_violations элементов с нарушениями. Такие страницы
+    получают оценку правил вместо оценки модели.
+
+    Args:
+        max_score (float): Порог оценки правил (шкала 0..100).
+        min_violations (int): Сколько нарушающих элементов нужно, чтобы решение
+            не зависело от одной-двух случайных находок.
+    """
+
+    def __init__(self, max_score=RULE_GATE_MAX_SCORE, min_violations=RULE_GATE_MIN_VIOLATIONS):
+        self.max_score = max_score
+        self.min_violations = min_violations
+
+    def settle(self, flat_page):
+        """Оценка правил, если она решает исход страницы, иначе None (нужна модель)."""
+        if flat_page["num_elements"] == 0:
+            return None
+        with timer("rules"):
+            result = evaluate_rules(flat_page)
+        count("rules.pages")
+        for rule, flags in result["violations"].items():
+            count(f"rules.violations.{rule}", int(flags.sum()))
+
+        if result["num_violating"] >= self.min_violations and result["rule_score"] <= self.max_score:
+            count("rules.gated_pages")
+            return result["rule_score"]
+        return None
+
+
+if __name__ == '__main__':
+    import json
+    import sys
+    from feature_extractor.dom_stream import load_flat_page
+
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    for file_path in sys.argv[1:] or [os.path.join(PROJECT_ROOT, 'dataset', 'sample1.json')]:
+        summary = summarize(evaluate_rules(load_flat_page(file_path)))
+        print(json.dumps({"file": file_path, **summary}, ensure_ascii=False))